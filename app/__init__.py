@@ -1,5 +1,22 @@
 from flask import Flask
+from app.database import release_db_connection
+from app.tenants import init_tenants
+from app.cache_sync import init_cache_sync
+from app.metrics import init_metrics
+from app.query_guard import init_query_guard
+from app.units import format_fraction, convert_from_base
 
 app = Flask(__name__)
+app.teardown_appcontext(release_db_connection)
+# First, so every other hook and view already runs against the request's household
+init_tenants(app)
+# Then, so the request's household is known and nothing has read a stale cache yet
+init_cache_sync(app)
+init_metrics(app)
+init_query_guard(app)
+
+# {{ 1.5|fraction }} -> "1 1/2"; {{ item.base_quantity|quantity(item.base_unit, item.density_g_ml) }} -> "1 1/2 cup"
+app.add_template_filter(format_fraction, 'fraction')
+app.add_template_filter(convert_from_base, 'quantity')
 
 from app import routes
@@ -0,0 +1,205 @@
+import csv
+import io
+import json
+
+from app.database import get_db_connection
+from app.units import normalize_quantity
+from app.search import invalidate_search_index
+from app.feasibility import invalidate_requirement_matrix
+from app.write_behind import flush_pending
+
+# Rows sent to SQLite per executemany call during an import.
+IMPORT_BATCH_SIZE = 5000
+# Rows written per chunk of a streamed export.
+EXPORT_CHUNK_SIZE = 1000
+# How many row errors an import reports back in full.
+MAX_REPORTED_ERRORS = 20
+
+FORMATS = ('csv', 'jsonl')
+EXPORT_COLUMNS = ('name', 'quantity', 'base_unit', 'base_unit_type', 'density_g_ml')
+
+def guess_format(filename, default='csv'):
+    """Picks an import/export format from a file name such as 'pantry.jsonl'."""
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension in ('jsonl', 'ndjson', 'json'):
+            return 'jsonl'
+        if extension == 'csv':
+            return 'csv'
+        if extension == 'txt':
+            return 'txt'
+    return default
+
+def read_rows(text_stream, fmt):
+    """
+    Lazily yields one record at a time from a CSV (with a header row) or JSON Lines text
+    stream: a dict per CSV row, or the text of each JSON line, which parse_record() turns
+    into a dict. Parsing later means a malformed line fails on its own, like any bad row.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(text_stream)
+    elif fmt == 'jsonl':
+        for line in text_stream:
+            line = line.strip()
+            if line:
+                yield line
+    else:
+        raise ValueError(f"Unsupported format '{fmt}'")
+
+def parse_record(record):
+    """Returns a record from read_rows() as a dict; raises ValueError for malformed JSON."""
+    if isinstance(record, str):
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValueError("Expected an object")
+    return record
+
+def _record_name(row):
+    name = (row.get('name') or '').strip().lower()
+    if not name:
+        raise ValueError("Missing name")
+    return name
+
+def _normalize_row(row, stored):
+    """
+    Turns an import record into an ingredients row. Records need a name, quantity and
+    unit (base_unit is accepted for round-tripping an export); density_g_ml is optional.
+    `stored` maps names already in the pantry to their base unit and density: those
+    ingredients keep their base unit, and their density if the record has none.
+    """
+    name = _record_name(row)
+    unit = (row.get('unit') or row.get('base_unit') or '').strip().lower()
+    if not unit:
+        raise ValueError(f"Missing unit for '{name}'")
+    quantity = float(row.get('quantity') or 0)
+    density = row.get('density_g_ml')
+    density = float(density) if density not in (None, '') else None
+    converted_quantity, base_unit, base_unit_type = normalize_quantity(quantity, unit, density, stored.get(name))
+    return (name, converted_quantity, base_unit, base_unit_type, density)
+
+def _stored_ingredients(conn, records):
+    # {name: row} for the batch's ingredients that already exist, in one query
+    names = set()
+    for _, row in records:
+        try:
+            names.add(_record_name(row))
+        except (ValueError, TypeError, AttributeError):
+            # Reported when the record is normalized
+            pass
+    rows = conn.execute("""
+        SELECT name, base_unit, base_unit_type, density_g_ml FROM ingredients
+        WHERE name IN (SELECT value FROM json_each(?))
+    """, (json.dumps(sorted(names)),)).fetchall()
+    return {row['name']: dict(row) for row in rows}
+
+def _report_failure(summary, line_number, error):
+    summary['failed'] += 1
+    if len(summary['errors']) < MAX_REPORTED_ERRORS:
+        summary['errors'].append(f"Record {line_number}: {error}")
+
+def _import_batch(conn, records, summary):
+    parsed = []
+    for line_number, record in records:
+        try:
+            parsed.append((line_number, parse_record(record)))
+        except ValueError as e:
+            _report_failure(summary, line_number, e)
+    stored = _stored_ingredients(conn, parsed)
+    rows = []
+    for line_number, record in parsed:
+        try:
+            row = _normalize_row(record, stored)
+        except (ValueError, TypeError, AttributeError) as e:
+            _report_failure(summary, line_number, e)
+            continue
+        rows.append(row)
+        # A later record for the same name converts into what this one will store
+        name, _, base_unit, base_unit_type, density = row
+        previous = stored.get(name)
+        stored[name] = {
+            'name': name, 'base_unit': base_unit, 'base_unit_type': base_unit_type,
+            'density_g_ml': density or (previous['density_g_ml'] if previous else None)
+        }
+    if rows:
+        _upsert_ingredients(conn, rows)
+    summary['imported'] += len(rows)
+
+def import_ingredients(text_stream, fmt='csv'):
+    """
+    Upserts ingredients from a CSV or JSON Lines stream, matching on name.
+    The stream is read incrementally and written with batched executemany calls inside a
+    single transaction, so memory stays flat and a failure leaves the pantry untouched.
+    Imported quantities replace the stored ones. An existing ingredient keeps its base
+    unit (a record that can't be converted into it is reported as failed) and its
+    density if the record doesn't supply one.
+    Returns {'imported': n, 'failed': n, 'errors': [...first few messages...]}.
+    """
+    summary = {'imported': 0, 'failed': 0, 'errors': []}
+    # Imported quantities replace stored ones, so queued changes must land first
+    flush_pending()
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN")
+        batch = []
+        for line_number, row in enumerate(read_rows(text_stream, fmt), start=1):
+            batch.append((line_number, row))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                _import_batch(conn, batch, summary)
+                batch = []
+        if batch:
+            _import_batch(conn, batch, summary)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    invalidate_search_index()
+    # Imported densities can change how any recipe line converts
+    invalidate_requirement_matrix()
+    return summary
+
+def _upsert_ingredients(conn, rows):
+    conn.executemany('''
+        INSERT INTO ingredients (name, quantity, base_unit, base_unit_type, density_g_ml)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            quantity = excluded.quantity,
+            base_unit = excluded.base_unit,
+            base_unit_type = excluded.base_unit_type,
+            density_g_ml = COALESCE(excluded.density_g_ml, ingredients.density_g_ml)
+    ''', rows)
+
+def export_ingredients(fmt='csv'):
+    """
+    Yields the whole pantry as CSV or JSON Lines text, a chunk at a time, straight from
+    the cursor rather than from a fetchall().
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}'")
+    flush_pending()
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM ingredients ORDER BY name")
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if fmt == 'csv' else None
+        if writer:
+            writer.writerow(EXPORT_COLUMNS)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                if writer:
+                    writer.writerow(tuple(row))
+                else:
+                    buffer.write(json.dumps(dict(row)) + '\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            # Header of an empty CSV export
+            yield buffer.getvalue()
+    finally:
+        conn.close()
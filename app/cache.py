@@ -0,0 +1,107 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, make_response
+
+from app.database import get_db_connection, current_database
+from app.write_behind import pending_generation
+
+# Maximum number of rendered fragments kept in memory.
+FRAGMENT_CACHE_SIZE = 512
+
+class LRUCache:
+    """
+    A small thread-safe least-recently-used mapping with a fixed capacity.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._items.move_to_end(key)
+            except KeyError:
+                return default
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+_fragments = LRUCache(FRAGMENT_CACHE_SIZE)
+
+def get_data_version(tables):
+    """
+    Returns a string that changes whenever any of `tables` is written to,
+    built from their table_versions counters. Queued quantity changes count as
+    writes to ingredients.
+    """
+    placeholders = ', '.join('?' for _ in tables)
+    conn = get_db_connection()
+    rows = conn.execute(
+        f"SELECT name, version FROM table_versions WHERE name IN ({placeholders})", tables
+    ).fetchall()
+    conn.close()
+    versions = {row['name']: row['version'] for row in rows}
+    version = '.'.join(str(versions.get(table, 0)) for table in tables)
+    if 'ingredients' in tables:
+        version += f"+{pending_generation()}"
+    return version
+
+def cached_view(*tables):
+    """
+    Decorator for read-only views whose output depends only on their arguments and on `tables`.
+    GET responses carry an ETag derived from the tables' change versions and a matching
+    If-None-Match is answered with 304. Rendered bodies are kept in an LRU keyed by
+    (database, endpoint, arguments, version), so an unchanged fragment is never rendered twice.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version = get_data_version(tables)
+            key = (
+                current_database(),
+                request.endpoint,
+                tuple(sorted(kwargs.items())),
+                tuple(sorted(request.values.items(multi=True))),
+                version
+            )
+            etag = hashlib.sha1(repr(key).encode()).hexdigest()
+            if request.method == 'GET' and etag in request.if_none_match:
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+
+            body = _fragments.get(key)
+            if body is None:
+                body = view(*args, **kwargs)
+                _fragments.put(key, body)
+
+            response = make_response(body)
+            if request.method == 'GET':
+                response.set_etag(etag)
+                # Let clients keep a copy but always revalidate it
+                response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+def clear_fragment_cache():
+    """
+    Empties the fragment cache, e.g. after the database has been recreated.
+    """
+    _fragments.clear()
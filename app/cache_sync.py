@@ -0,0 +1,78 @@
+import threading
+
+from flask import request
+
+from app.database import get_db_connection, database_state
+from app.units import invalidate_conversion_graph
+from app.search import invalidate_search_index
+from app.feasibility import invalidate_requirement_matrix
+from app.tenants import TENANTLESS_ENDPOINTS
+
+# Which in-process caches are derived from which table_versions counters. Rendered
+# fragments aren't listed: their keys already include the versions they were built from.
+CACHE_DEPENDENCIES = {
+    'ingredient_definitions': (invalidate_search_index, invalidate_requirement_matrix),
+    'meals': (invalidate_requirement_matrix,),
+    'meal_ingredients': (invalidate_requirement_matrix,),
+    'unit_conversions': (invalidate_conversion_graph, invalidate_requirement_matrix),
+    'ingredient_conversions': (invalidate_requirement_matrix,),
+}
+
+class _SyncedVersions:
+    """The table_versions counters one database's caches in this process are known to match."""
+    def __init__(self):
+        self.versions = None
+        self.lock = threading.Lock()
+
+def sync_caches():
+    """
+    Drops caches of the current database that another process may have made stale.
+    PRAGMA data_version only changes once another connection has committed, so while
+    nobody else writes this costs one pragma and no table read. Otherwise the counters
+    in table_versions tell which caches are out of date.
+
+    Commits by other threads of this process change data_version too, so their writes
+    also drop caches they had already updated in place; cheap enough for the rare changes
+    CACHE_DEPENDENCIES tracks, but why this only runs with several worker processes.
+    """
+    conn = get_db_connection()
+    try:
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == conn.data_version:
+            return
+        rows = conn.execute("SELECT name, version FROM table_versions").fetchall()
+        conn.data_version = data_version
+    finally:
+        conn.close()
+
+    synced = database_state('cache_sync', _SyncedVersions)
+    with synced.lock:
+        if synced.versions is None:
+            # Caches may predate this process's first check, e.g. when inherited from the
+            # process that forked it, so they are all treated as stale
+            changed = set(CACHE_DEPENDENCIES)
+            synced.versions = {}
+        else:
+            changed = {row['name'] for row in rows if row['version'] > synced.versions.get(row['name'], 0)}
+        for row in rows:
+            # Threads can get here out of order; counters only move forward
+            synced.versions[row['name']] = max(row['version'], synced.versions.get(row['name'], 0))
+
+    invalidations = []
+    for table in changed:
+        for invalidate in CACHE_DEPENDENCIES.get(table, ()):
+            if invalidate not in invalidations:
+                invalidations.append(invalidate)
+    for invalidate in invalidations:
+        invalidate()
+
+def init_cache_sync(app):
+    """
+    Checks for writes by other processes before each request when app.config['CACHE_SYNC']
+    is set, as it is when the app is served by several worker processes.
+    """
+    @app.before_request
+    def sync_request_caches():
+        # Those endpoints have no household selected, so no database to check
+        if app.config.get('CACHE_SYNC') and request.endpoint not in TENANTLESS_ENDPOINTS:
+            sync_caches()
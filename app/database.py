@@ -1,20 +1,405 @@
 import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
 
-def get_db_connection():
-    conn = sqlite3.connect('pantry.db')
+# The database file used unless a thread has switched to another one (see using_database)
+DATABASE = 'pantry.db'
+# Most database files one thread keeps a connection open to; the least recently used
+# idle one is closed beyond that.
+MAX_OPEN_DATABASES_PER_THREAD = 8
+# Most database files whose in-process caches (search index, conversion graph, ...)
+# are kept; the least recently used one's are dropped beyond that.
+MAX_CACHED_DATABASES = 64
+
+# Applied once to every new connection, not per request, after the durability profile's.
+CONNECTION_PRAGMAS = (
+    "PRAGMA cache_size = -16000", # In KiB, i.e. 16 MB of page cache
+    "PRAGMA mmap_size = 268435456", # 256 MB
+)
+# Trade-offs between what a commit costs and what a crash can lose, picked at startup
+# with set_durability_profile(). wal_autocheckpoint is in pages; checkpoint_interval is
+# how often, in seconds, the checkpoint thread folds the WAL back into the database
+# (None leaves that to wal_autocheckpoint alone).
+DURABILITY_PROFILES = {
+    # Every commit is on disk before it returns, and the WAL is kept short
+    'strict': {'journal_mode': 'WAL', 'synchronous': 'FULL', 'wal_autocheckpoint': 1000, 'checkpoint_interval': 30},
+    # Safe against the app crashing; a power cut can lose the last commits, never the database
+    'balanced': {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'wal_autocheckpoint': 1000, 'checkpoint_interval': 300},
+    # Never waits for the disk: safe against the app crashing, but an OS crash or power cut
+    # can corrupt the database. For terminals whose data can be rebuilt.
+    'fast': {'journal_mode': 'WAL', 'synchronous': 'OFF', 'wal_autocheckpoint': 10000, 'checkpoint_interval': None},
+}
+DEFAULT_DURABILITY = 'balanced'
+# Number of prepared statements kept per connection.
+STATEMENT_CACHE_SIZE = 256
+# When set, every statement run through a pooled connection is counted per thread (see
+# reset_request_counters) for the metrics and the benchmarks' queries per request.
+COUNT_STATEMENTS = True
+
+_durability = DEFAULT_DURABILITY
+# WAL checkpoints run by the checkpoint thread since startup
+checkpoints_run = 0
+
+_local = threading.local()
+# {database path: DatabaseState}, least recently used first
+_database_states = OrderedDict()
+_database_states_lock = threading.Lock()
+_open_connections = weakref.WeakSet()
+_open_connections_lock = threading.Lock()
+# Real connections opened since startup, as opposed to pooled checkouts
+connections_opened = 0
+
+def _record_statement(sql, parameters):
+    # Only statements issued by the app are seen, not those the triggers they fire run,
+    # so the metrics, X-Query-Count and the query guard all report the same number
+    if COUNT_STATEMENTS:
+        _local.statements = getattr(_local, 'statements', 0) + 1
+    for recorder in getattr(_local, 'recorders', ()):
+        recorder.append((sql, parameters))
+
+class RecordingCursor(sqlite3.Cursor):
+    """A cursor whose statements are counted and recorded like the connection's own."""
+    def execute(self, sql, parameters=()):
+        _record_statement(sql, parameters)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        _record_statement(sql, None)
+        return super().executemany(sql, seq_of_parameters)
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection owned by a single thread and shared by everything that thread
+    runs. close() only hands it back; when the last holder releases it, any
+    uncommitted work is rolled back, just as closing a real connection would.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        # Depth of unit_of_work() blocks running on this connection
+        self.units_of_work = 0
+        # PRAGMA data_version as last seen by app.cache_sync
+        self.data_version = None
+
+    def execute(self, sql, parameters=()):
+        _record_statement(sql, parameters)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # A batch is one round trip, so it is counted and recorded once
+        _record_statement(sql, None)
+        return super().executemany(sql, seq_of_parameters)
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or RecordingCursor)
+
+    def commit(self):
+        # Inside a unit of work only the block's own commit at the end is real
+        if self.units_of_work == 0:
+            super().commit()
+
+    def close(self):
+        if self.checkouts > 0:
+            self.checkouts -= 1
+        if self.checkouts == 0 and self.in_transaction:
+            self.rollback()
+
+    def dispose(self):
+        """Actually closes the underlying SQLite connection."""
+        super().close()
+
+def _connect(path):
+    # check_same_thread is off only so close_db_connections() can dispose of
+    # connections at shutdown; in normal use a connection never leaves its thread.
+    conn = sqlite3.connect(
+        path,
+        factory=PooledConnection,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False
+    )
     conn.row_factory = sqlite3.Row
+    for pragma in durability_pragmas() + CONNECTION_PRAGMAS:
+        # Setting up the connection isn't a statement of the request that happens to open it
+        sqlite3.Connection.execute(conn, pragma)
+    global connections_opened
+    with _open_connections_lock:
+        _open_connections.add(conn)
+        connections_opened += 1
     return conn
 
-def init_db():
+def reset_request_counters():
+    """
+    Returns (statements, connection checkouts) for this thread since the last reset and
+    starts counting again; called at the start and end of every request.
+    """
+    counts = (getattr(_local, 'statements', 0), getattr(_local, 'checkouts', 0))
+    _local.statements = 0
+    _local.checkouts = 0
+    return counts
+
+def start_recording():
+    """
+    Starts collecting (sql, parameters) for every statement this thread executes through a
+    pooled connection; parameters are None for an executemany batch. Recordings nest.
+    Returns the list that is filled in.
+    """
+    recorder = []
+    _local.recorders = getattr(_local, 'recorders', ()) + (recorder,)
+    return recorder
+
+def stop_recording(recorder):
+    _local.recorders = tuple(other for other in getattr(_local, 'recorders', ()) if other is not recorder)
+    return recorder
+
+def peek_request_counters():
+    """Returns (statements, connection checkouts) for this thread without resetting them."""
+    return (getattr(_local, 'statements', 0), getattr(_local, 'checkouts', 0))
+
+def get_open_connection_count():
+    with _open_connections_lock:
+        return len(_open_connections)
+
+def current_database():
+    """The database file this thread is working on."""
+    return getattr(_local, 'database', None) or DATABASE
+
+@contextmanager
+def using_database(path):
+    """Points this thread's get_db_connection() at another database file for the block."""
+    previous = getattr(_local, 'database', None)
+    _local.database = path
+    try:
+        yield path
+    finally:
+        _local.database = previous
+
+def set_current_database(path):
+    """Points this thread at a database file until it is reset with None, e.g. per request."""
+    _local.database = path
+
+def _thread_connections():
+    # {database path: PooledConnection} owned by this thread, least recently used first
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = OrderedDict()
+    return connections
+
+def get_db_connection():
+    """
+    Returns this thread's pooled connection to the current database, opening it on
+    first use. Callers still close() it when done, which releases rather than closes it.
+    """
+    path = current_database()
+    connections = _thread_connections()
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = _connect(path)
+        # Close the least recently used connections nobody on this thread is holding
+        for idle_path, idle in list(connections.items()):
+            if len(connections) <= MAX_OPEN_DATABASES_PER_THREAD:
+                break
+            if idle.checkouts == 0 and not idle.in_transaction:
+                del connections[idle_path]
+                with _open_connections_lock:
+                    _open_connections.discard(idle)
+                idle.dispose()
+    else:
+        connections.move_to_end(path)
+    conn.checkouts += 1
+    _local.checkouts = getattr(_local, 'checkouts', 0) + 1
+    return conn
+
+def release_db_connection(exception=None):
+    """
+    Request teardown hook: rolls back anything a request left uncommitted so
+    the thread's connections go back to the pool clean.
+    """
+    for conn in _thread_connections().values():
+        conn.checkouts = 0
+        conn.units_of_work = 0
+        if conn.in_transaction:
+            conn.rollback()
+
+class DatabaseState:
+    """
+    In-process objects derived from one database file, such as caches, keyed by name.
+    Values with a close() method have it called when the state is dropped.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def close(self):
+        with self.lock:
+            values, self.values = list(self.values.values()), {}
+        for value in values:
+            if hasattr(value, 'close'):
+                value.close()
+
+def _touch_database_state(path):
+    # Returns the path's state, creating it and evicting the least recently used beyond the limit
+    with _database_states_lock:
+        state = _database_states.get(path)
+        if state is None:
+            state = _database_states[path] = DatabaseState(path)
+        else:
+            _database_states.move_to_end(path)
+        evicted = []
+        while len(_database_states) > MAX_CACHED_DATABASES:
+            evicted.append(_database_states.popitem(last=False)[1])
+    for old_state in evicted:
+        # Outside the lock: closing may flush queued writes to that database
+        with using_database(old_state.path):
+            old_state.close()
+    return state
+
+def database_state(key, factory):
+    """
+    Returns the object stored under `key` for the current database, creating it with
+    factory() on first use. Caches of database contents live here, so every database
+    file gets its own and they are dropped when it falls out of the MAX_CACHED_DATABASES LRU.
+    """
+    state = _touch_database_state(current_database())
+    with state.lock:
+        value = state.values.get(key)
+        if value is None:
+            value = state.values[key] = factory()
+    return value
+
+def peek_database_state(key, path=None):
+    """Returns what database_state() stored under `key`, or None, without creating it."""
+    with _database_states_lock:
+        state = _database_states.get(path or current_database())
+    if state is None:
+        return None
+    with state.lock:
+        return state.values.get(key)
+
+def pop_database_state(key, path=None):
+    """Removes and returns what database_state() stored under `key`, or None."""
+    with _database_states_lock:
+        state = _database_states.get(path or current_database())
+    if state is None:
+        return None
+    with state.lock:
+        return state.values.pop(key, None)
+
+def known_databases():
+    """Database files with cached state in this process, least recently used first."""
+    with _database_states_lock:
+        return list(_database_states)
+
+@contextmanager
+def unit_of_work():
+    """
+    Runs a block as one write transaction on this thread's connection, which it yields.
+    Helpers called inside get the same connection from get_db_connection(), so they see
+    the block's uncommitted rows, and their commit() calls are deferred: the block commits
+    once when it ends and rolls everything back if it raises. Nested blocks join the
+    outer one. Code that issues its own BEGIN must not run inside.
+    """
+    conn = get_db_connection()
+    outermost = conn.units_of_work == 0
+    try:
+        if outermost and not conn.in_transaction:
+            # Take the write lock up front so a read-then-write cannot fail half way
+            conn.execute("BEGIN IMMEDIATE")
+        conn.units_of_work += 1
+        try:
+            yield conn
+        finally:
+            conn.units_of_work -= 1
+        if outermost:
+            conn.commit()
+    except BaseException:
+        if outermost:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def durability_pragmas(profile=None):
+    settings = DURABILITY_PROFILES[profile or _durability]
+    return (
+        f"PRAGMA journal_mode = {settings['journal_mode']}",
+        f"PRAGMA synchronous = {settings['synchronous']}",
+        f"PRAGMA wal_autocheckpoint = {settings['wal_autocheckpoint']}",
+    )
+
+def set_durability_profile(name):
+    """
+    Selects one of DURABILITY_PROFILES for every connection. Meant for startup: pooled
+    connections already open are closed so the next ones are opened with it.
+    """
+    global _durability
+    if name not in DURABILITY_PROFILES:
+        raise ValueError(f"Unknown durability profile '{name}'; expected one of {', '.join(DURABILITY_PROFILES)}")
+    _durability = name
+    close_db_connections()
+
+def get_durability_profile():
+    """Returns (name, settings) of the active durability profile."""
+    return _durability, DURABILITY_PROFILES[_durability]
+
+_checkpoint_thread = None
+_checkpoint_stop = threading.Event()
+
+def checkpoint_wal():
+    """
+    Copies committed WAL pages back into the database without waiting for readers or
+    writers. Returns (busy, wal_pages, pages_checkpointed) as reported by SQLite.
+    """
+    global checkpoints_run
     conn = get_db_connection()
-    # Drop existing tables for a clean slate during development.
-    # Consider a more robust migration strategy for production.
-    conn.execute('DROP TABLE IF EXISTS meal_ingredients')
-    conn.execute('DROP TABLE IF EXISTS ingredients')
-    conn.execute('DROP TABLE IF EXISTS meals')
-    conn.execute('DROP TABLE IF EXISTS unit_conversions')
-    conn.execute('DROP TABLE IF EXISTS ingredient_conversions')
+    result = tuple(conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone())
+    conn.close()
+    checkpoints_run += 1
+    return result
 
+def start_checkpoint_thread():
+    """
+    Checkpoints the WAL of every database in use every checkpoint_interval seconds of
+    the active profile, if it sets one.
+    """
+    global _checkpoint_thread
+    interval = DURABILITY_PROFILES[_durability]['checkpoint_interval']
+
+    def run():
+        while not _checkpoint_stop.wait(interval):
+            for path in known_databases():
+                try:
+                    with using_database(path):
+                        checkpoint_wal()
+                except Exception as e:
+                    print(f"Error checkpointing the WAL of {path}: {e}")
+
+    if interval and _checkpoint_thread is None:
+        _checkpoint_stop.clear()
+        _checkpoint_thread = threading.Thread(target=run, name='wal-checkpoints', daemon=True)
+        _checkpoint_thread.start()
+
+def stop_checkpoint_thread():
+    global _checkpoint_thread
+    _checkpoint_stop.set()
+    if _checkpoint_thread is not None:
+        _checkpoint_thread.join()
+        _checkpoint_thread = None
+
+def close_db_connections():
+    """
+    Closes every pooled connection, e.g. on shutdown.
+    """
+    with _open_connections_lock:
+        connections = list(_open_connections)
+        _open_connections.clear()
+    for conn in connections:
+        conn.dispose()
+    _local.__dict__.pop('connections', None)
+
+def _create_tables(conn):
     conn.execute('''
         CREATE TABLE IF NOT EXISTS ingredients (
             id INTEGER PRIMARY KEY,
@@ -62,8 +447,240 @@ def init_db():
             UNIQUE(ingredient_id, from_unit, to_unit)
         )
     ''')
-    conn.commit()
+
+def _add_lookup_indexes(conn):
+    # Covering index for the recipe JOINs, which filter on meal_id and read the rest
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_meal_ingredients_meal
+        ON meal_ingredients (meal_id, ingredient_id, quantity, unit)
+    ''')
+    # Deleting an ingredient removes its meal_ingredients rows by ingredient_id
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_meal_ingredients_ingredient
+        ON meal_ingredients (ingredient_id)
+    ''')
+    # Lets ingredient-specific conversion lookups read the factor from the index alone
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ingredient_conversions_lookup
+        ON ingredient_conversions (ingredient_id, from_unit, to_unit, factor)
+    ''')
+
+@contextmanager
+def deferred_lookup_indexes(conn, cache_size_kib=262144):
+    """
+    For bulk loads inside an open transaction: drops the meal_ingredients lookup indexes and
+    recreates them on exit, which sorts each index once instead of updating it row by row.
+    The page cache is enlarged meanwhile. Only worth it for loads of many thousands of rows.
+    """
+    conn.execute(f"PRAGMA cache_size = -{cache_size_kib}")
+    conn.execute("DROP INDEX IF EXISTS idx_meal_ingredients_meal")
+    conn.execute("DROP INDEX IF EXISTS idx_meal_ingredients_ingredient")
+    try:
+        yield
+    finally:
+        _add_lookup_indexes(conn)
+        for pragma in CONNECTION_PRAGMAS:
+            if 'cache_size' in pragma:
+                conn.execute(pragma)
+
+def _create_version_triggers(conn, table):
+    # Bumps the table's row in table_versions on every change, whichever code path makes it
+    conn.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)", (table,))
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_version_after_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+            END
+        ''')
+
+def _add_table_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    _create_version_triggers(conn, 'ingredients')
+
+def _add_remaining_table_versions(conn):
+    for table in ('meals', 'meal_ingredients', 'unit_conversions', 'ingredient_conversions'):
+        _create_version_triggers(conn, table)
+
+def _add_ingredient_definition_versions(conn):
+    # Like the ingredients counter, but not bumped by quantity changes: caches of names,
+    # units and densities use it, so stock updates don't invalidate them.
+    conn.execute("INSERT OR IGNORE INTO table_versions (name, version) VALUES ('ingredient_definitions', 0)")
+    for event, target in (
+        ('insert', 'INSERT'),
+        ('delete', 'DELETE'),
+        ('update', 'UPDATE OF name, base_unit, base_unit_type, density_g_ml'),
+    ):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS ingredient_definitions_version_after_{event}
+            AFTER {target} ON ingredients
+            BEGIN
+                UPDATE table_versions SET version = version + 1 WHERE name = 'ingredient_definitions';
+            END
+        ''')
+
+def _add_pantry_deductions(conn):
+    # One row per applied deduction batch, so a resubmitted batch is answered from here
+    # instead of being deducted twice
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pantry_deductions (
+            idempotency_key TEXT PRIMARY KEY,
+            created_at REAL NOT NULL,
+            result TEXT NOT NULL -- JSON of what the batch reported when it was applied
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_pantry_deductions_created_at
+        ON pantry_deductions (created_at)
+    ''')
+
+# Current time as Unix seconds with a fractional part, evaluated inside SQLite
+SQL_NOW = "((julianday('now') - 2440587.5) * 86400.0)"
+
+def _add_inventory_ledger(conn):
+    # Every change to an ingredient's quantity is appended here by triggers, in the same
+    # transaction as the change, whichever code path makes it. ingredients.quantity stays
+    # the materialized current balance.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_ledger (
+            id INTEGER PRIMARY KEY,
+            ingredient_id INTEGER NOT NULL, -- No foreign key: history outlives deleted ingredients
+            change REAL NOT NULL,
+            recorded_at REAL NOT NULL -- Unix time
+        )
+    ''')
+    # Index entries are ordered by (ingredient_id, id), so one ingredient's events after a
+    # snapshot are a single range scan
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_inventory_ledger_ingredient
+        ON inventory_ledger (ingredient_id)
+    ''')
+    for event in ('UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS inventory_ledger_no_{event.lower()}
+            BEFORE {event} ON inventory_ledger
+            BEGIN
+                SELECT RAISE(ABORT, 'inventory_ledger is append-only');
+            END
+        ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS ingredients_ledger_after_insert
+        AFTER INSERT ON ingredients WHEN NEW.quantity != 0
+        BEGIN
+            INSERT INTO inventory_ledger (ingredient_id, change, recorded_at) VALUES (NEW.id, NEW.quantity, {SQL_NOW});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS ingredients_ledger_after_update
+        AFTER UPDATE OF quantity ON ingredients WHEN NEW.quantity != OLD.quantity
+        BEGIN
+            INSERT INTO inventory_ledger (ingredient_id, change, recorded_at)
+            VALUES (NEW.id, NEW.quantity - OLD.quantity, {SQL_NOW});
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS ingredients_ledger_after_delete
+        AFTER DELETE ON ingredients WHEN OLD.quantity != 0
+        BEGIN
+            INSERT INTO inventory_ledger (ingredient_id, change, recorded_at) VALUES (OLD.id, -OLD.quantity, {SQL_NOW});
+        END
+    ''')
+
+    # Full balances at a point in the ledger, so a past quantity is one snapshot plus a short tail
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_snapshots (
+            id INTEGER PRIMARY KEY,
+            taken_at REAL NOT NULL, -- Unix time
+            ledger_id INTEGER NOT NULL -- Last ledger event included in the balances
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_inventory_snapshots_taken_at
+        ON inventory_snapshots (taken_at)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS inventory_snapshot_balances (
+            snapshot_id INTEGER NOT NULL,
+            ingredient_id INTEGER NOT NULL,
+            quantity REAL NOT NULL,
+            PRIMARY KEY (snapshot_id, ingredient_id)
+        ) WITHOUT ROWID
+    ''')
+
+    # Opening balances for whatever is already in the pantry
+    conn.execute(f'''
+        INSERT INTO inventory_ledger (ingredient_id, change, recorded_at)
+        SELECT id, quantity, {SQL_NOW} FROM ingredients WHERE quantity != 0
+    ''')
+
+# Schema migrations, applied in order. PRAGMA user_version records how many have run,
+# so only append to this list; never reorder or edit a step that has shipped.
+MIGRATIONS = [
+    _create_tables,
+    _add_lookup_indexes,
+    _add_table_versions,
+    _add_remaining_table_versions,
+    _add_pantry_deductions,
+    _add_inventory_ledger,
+    _add_ingredient_definition_versions,
+]
+
+def init_db():
+    """
+    Brings the database schema up to date by applying any pending migrations.
+    Returns True if the database was empty beforehand and so may need seeding.
+    """
+    conn = get_db_connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        # Taking the write lock before checking again means that when several processes
+        # start on one database, each migration still runs once
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= number:
+                conn.rollback()
+                if number == 1:
+                    # Another process created the database and seeds it
+                    version = 1
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            conn.close()
+            raise
     conn.close()
+    if version < len(MIGRATIONS):
+        invalidate_caches()
+    return version == 0
+
+def get_table_version(conn, table):
+    """
+    Returns the change counter for `table`, which increases with every committed write to it.
+    """
+    row = conn.execute("SELECT version FROM table_versions WHERE name = ?", (table,)).fetchone()
+    return row['version'] if row else 0
+
+def invalidate_caches():
+    """
+    Drops in-process caches derived from the database contents.
+    """
+    # Imported here because these modules depend on this one.
+    from app.units import invalidate_conversion_graph
+    from app.search import invalidate_search_index
+    from app.cache import clear_fragment_cache
+    from app.feasibility import invalidate_requirement_matrix
+    invalidate_conversion_graph()
+    invalidate_search_index()
+    clear_fragment_cache()
+    invalidate_requirement_matrix()
 
 def seed_db():
     conn = get_db_connection()
@@ -150,3 +767,4 @@ def seed_db():
 
     conn.commit()
     conn.close()
+    invalidate_caches()
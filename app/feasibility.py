@@ -0,0 +1,187 @@
+import json
+import math
+import threading
+
+from app.database import get_db_connection, database_state, peek_database_state
+from app.units import convert_rows_to_base
+from app.write_behind import pending_changes
+
+class _RequirementMatrix:
+    """One database's requirement matrix and the bookkeeping to refresh it row by row."""
+    def __init__(self):
+        # Sparse meals x ingredients matrix in base units per portion, None until first use:
+        # {meal_id: {'name': ..., 'requirements': {ingredient_id: quantity}, 'unconvertible': [names],
+        #            'unconvertible_ids': {ingredient_id, ...}}}
+        self.rows = None
+        # {ingredient_id: set(meal_ids)}, to find the rows touched by a density or conversion change
+        self.meals_by_ingredient = {}
+        # Rows to recompute before the next evaluation
+        self.dirty_meals = set()
+        self.lock = threading.Lock()
+
+def _load_rows(conn, meal_ids=None):
+    """Builds matrix rows for `meal_ids`, or for every meal when None."""
+    if meal_ids is None:
+        meals_filter = meal_ingredients_filter = ""
+        params = ()
+    else:
+        meals_filter = "WHERE id IN (SELECT value FROM json_each(?))"
+        meal_ingredients_filter = "WHERE mi.meal_id IN (SELECT value FROM json_each(?))"
+        params = (json.dumps(sorted(meal_ids)),)
+    rows = {
+        meal['id']: {'name': meal['name'], 'requirements': {}, 'unconvertible': [], 'unconvertible_ids': set()}
+        for meal in conn.execute(f"SELECT id, name FROM meals {meals_filter}", params)
+    }
+
+    meal_ingredients = conn.execute(f"""
+        SELECT
+            mi.meal_id,
+            i.id as ingredient_id,
+            i.name,
+            i.base_unit,
+            i.base_unit_type,
+            i.density_g_ml,
+            mi.quantity,
+            mi.unit
+        FROM meal_ingredients mi
+        JOIN ingredients i ON i.id = mi.ingredient_id
+        {meal_ingredients_filter}
+    """, params).fetchall()
+    items, _ = convert_rows_to_base(meal_ingredients, conn=conn)
+
+    for item in items:
+        row = rows.get(item['meal_id'])
+        if row is None:
+            continue
+        if item['base_quantity'] is None:
+            row['unconvertible'].append(item['name'])
+            row['unconvertible_ids'].add(item['ingredient_id'])
+            continue
+        requirements = row['requirements']
+        requirements[item['ingredient_id']] = requirements.get(item['ingredient_id'], 0) + item['base_quantity']
+    return rows
+
+def _row_ingredients(row):
+    # Unconvertible lines count too: a new density or conversion can make them convertible
+    return set(row['requirements']) | row['unconvertible_ids']
+
+def _index_rows(matrix, rows):
+    for meal_id, row in rows.items():
+        for ingredient_id in _row_ingredients(row):
+            matrix.meals_by_ingredient.setdefault(ingredient_id, set()).add(meal_id)
+
+def _refresh(matrix, conn):
+    # Must be called with matrix.lock held.
+    if matrix.rows is None:
+        matrix.meals_by_ingredient.clear()
+        matrix.dirty_meals.clear()
+        matrix.rows = _load_rows(conn)
+        _index_rows(matrix, matrix.rows)
+    elif matrix.dirty_meals:
+        for meal_id in matrix.dirty_meals:
+            old_row = matrix.rows.pop(meal_id, None)
+            if old_row:
+                for ingredient_id in _row_ingredients(old_row):
+                    matrix.meals_by_ingredient.get(ingredient_id, set()).discard(meal_id)
+        rows = _load_rows(conn, matrix.dirty_meals)
+        matrix.rows.update(rows)
+        _index_rows(matrix, rows)
+        matrix.dirty_meals.clear()
+
+def invalidate_meals(meal_ids):
+    """Marks meals whose recipe lines changed (or that were added or deleted)."""
+    matrix = peek_database_state('requirement_matrix')
+    if matrix is not None:
+        with matrix.lock:
+            if matrix.rows is not None:
+                matrix.dirty_meals.update(int(meal_id) for meal_id in meal_ids)
+
+def invalidate_ingredients(ingredient_ids):
+    """Marks every meal using these ingredients, e.g. after a density or conversion change."""
+    matrix = peek_database_state('requirement_matrix')
+    if matrix is not None:
+        with matrix.lock:
+            if matrix.rows is not None:
+                for ingredient_id in ingredient_ids:
+                    matrix.dirty_meals.update(matrix.meals_by_ingredient.get(int(ingredient_id), ()))
+
+def invalidate_requirement_matrix():
+    """Drops the whole matrix so it is rebuilt on next use."""
+    matrix = peek_database_state('requirement_matrix')
+    if matrix is not None:
+        with matrix.lock:
+            matrix.rows = None
+
+def evaluate_feasibility():
+    """
+    For every meal, the largest number of portions the current pantry supports and the
+    ingredient that limits it. The requirement matrix is cached between calls and only
+    dirty rows are rebuilt; the pantry vector is read fresh with one query and the whole
+    catalogue is evaluated in a single pass over the matrix's non-zero entries.
+
+    Returns a list of dicts with meal_id, name, max_portions (math.inf for a meal without
+    ingredients), bottleneck (ingredient name or None), unconvertible (names of lines that
+    couldn't be converted to base units) and computable. A meal with any unconvertible line
+    isn't computable: its max_portions and bottleneck are None, as counting only the lines
+    that did convert would overstate it. Most portions first, then the uncomputable ones.
+    """
+    requirement_matrix = database_state('requirement_matrix', _RequirementMatrix)
+    conn = get_db_connection()
+    try:
+        with requirement_matrix.lock:
+            _refresh(requirement_matrix, conn)
+            matrix = list(requirement_matrix.rows.items())
+        changes = pending_changes()
+        pantry = {
+            row['id']: max(row['quantity'] + changes.get(row['id'], 0), 0)
+            for row in conn.execute("SELECT id, quantity FROM ingredients")
+        }
+        names = {}
+        results = []
+        for meal_id, row in matrix:
+            if row['unconvertible']:
+                results.append({
+                    'meal_id': meal_id,
+                    'name': row['name'],
+                    'max_portions': None,
+                    'bottleneck': None,
+                    'unconvertible': row['unconvertible'],
+                    'computable': False,
+                })
+                continue
+            max_portions = math.inf
+            bottleneck_id = None
+            for ingredient_id, required in row['requirements'].items():
+                if required <= 0:
+                    continue
+                portions = pantry.get(ingredient_id, 0) / required
+                if portions < max_portions:
+                    max_portions = portions
+                    bottleneck_id = ingredient_id
+            if bottleneck_id is not None:
+                names[bottleneck_id] = None
+            results.append({
+                'meal_id': meal_id,
+                'name': row['name'],
+                'max_portions': max_portions,
+                'bottleneck': bottleneck_id,
+                'unconvertible': row['unconvertible'],
+                'computable': True,
+            })
+
+        # Resolve bottleneck ids to names in one query
+        if names:
+            for ingredient in conn.execute(
+                "SELECT id, name FROM ingredients WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(names)),)
+            ):
+                names[ingredient['id']] = ingredient['name']
+    finally:
+        conn.close()
+
+    for result in results:
+        result['bottleneck'] = names.get(result['bottleneck'])
+    results.sort(key=lambda result: (
+        not result['computable'], -result['max_portions'] if result['computable'] else 0, result['name']
+    ))
+    return results
@@ -0,0 +1,81 @@
+from flask import g, has_app_context
+
+from app.database import get_db_connection
+
+INGREDIENT_COLUMNS = ('id', 'name', 'quantity', 'base_unit', 'base_unit_type', 'density_g_ml')
+
+class IngredientRecord:
+    """
+    One ingredients row. Readable like a sqlite3.Row (record['name'], dict(record))
+    and by attribute, so templates and the units helpers take either.
+    """
+    __slots__ = INGREDIENT_COLUMNS
+
+    def __init__(self, row):
+        for column in INGREDIENT_COLUMNS:
+            setattr(self, column, row[column])
+
+    def __getitem__(self, column):
+        return getattr(self, column)
+
+    def keys(self):
+        return INGREDIENT_COLUMNS
+
+    def __repr__(self):
+        return f"IngredientRecord(id={self.id}, name={self.name!r})"
+
+def _identity_map():
+    # {('id', id) or ('name', name): IngredientRecord or None}, one per request
+    if not has_app_context():
+        return None
+    if 'ingredient_map' not in g:
+        g.ingredient_map = {}
+    return g.ingredient_map
+
+def _lookup(key, sql, value, conn):
+    records = _identity_map()
+    if records is not None and key in records:
+        return records[key]
+
+    owns_connection = conn is None
+    if owns_connection:
+        conn = get_db_connection()
+    row = conn.execute(sql, (value,)).fetchone()
+    if owns_connection:
+        conn.close()
+
+    record = IngredientRecord(row) if row else None
+    if records is not None:
+        records[key] = record
+        if record:
+            records[('id', record.id)] = record
+            records[('name', record.name)] = record
+    return record
+
+def lookup_ingredient(ingredient_id, conn=None):
+    """
+    Returns the ingredient as an IngredientRecord, or None. Within a request each
+    ingredient is read from the database once, whether asked for by id or by name.
+    """
+    try:
+        ingredient_id = int(ingredient_id)
+    except (TypeError, ValueError):
+        return None
+    return _lookup(
+        ('id', ingredient_id), f"SELECT {', '.join(INGREDIENT_COLUMNS)} FROM ingredients WHERE id = ?",
+        ingredient_id, conn
+    )
+
+def lookup_ingredient_by_name(name, conn=None):
+    """Like lookup_ingredient, by exact name."""
+    return _lookup(
+        ('name', name), f"SELECT {', '.join(INGREDIENT_COLUMNS)} FROM ingredients WHERE name = ?", name, conn
+    )
+
+def forget_ingredients():
+    """
+    Drops every record read in this request. Call after writing to ingredients, so
+    later reads in the same request see the new rows (and new names resolve).
+    """
+    if has_app_context():
+        g.pop('ingredient_map', None)
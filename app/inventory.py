@@ -0,0 +1,123 @@
+import json
+import math
+import time
+
+from app.database import get_db_connection
+from app.write_behind import flush_pending
+
+# How long an idempotency key is remembered; a batch resent after this is applied again.
+IDEMPOTENCY_KEY_TTL = 7 * 24 * 3600
+# Longest accepted idempotency key.
+MAX_IDEMPOTENCY_KEY_LENGTH = 128
+
+class InsufficientStock(Exception):
+    """
+    Raised when a batch would take ingredients below zero and the caller asked to prevent that.
+    `shortages` lists {'ingredient_id', 'name', 'quantity', 'deduct'} for each offending item.
+    """
+    def __init__(self, shortages):
+        super().__init__(f"{len(shortages)} ingredient(s) would go below zero")
+        self.shortages = shortages
+
+def parse_deduction(value):
+    """Parses a cooking-form value like "12_250.5" into (ingredient_id, quantity)."""
+    ingredient_id, quantity = value.split('_')
+    return int(ingredient_id), float(quantity)
+
+def _fetch_quantities(conn, ingredient_ids):
+    rows = conn.execute(
+        "SELECT id, name, quantity, base_unit FROM ingredients WHERE id IN (SELECT value FROM json_each(?))",
+        (json.dumps(sorted(ingredient_ids)),)
+    ).fetchall()
+    return {row['id']: row for row in rows}
+
+def apply_deductions(deductions, idempotency_key=None, prevent_negative=False):
+    """
+    Takes a batch of (ingredient_id, quantity) pairs out of the pantry in one transaction.
+    Several deductions of the same ingredient are added together first, and every UPDATE
+    goes out in a single executemany.
+
+    With an `idempotency_key`, the first batch under that key is applied and its result
+    stored; sending the same key again returns the stored result without deducting anything.
+    With `prevent_negative`, the whole batch is refused with InsufficientStock if any
+    ingredient would end up below zero.
+
+    Returns {'items': [{'ingredient_id', 'name', 'deducted', 'quantity', 'base_unit'}, ...],
+             'unknown': [ids not in the pantry], 'replayed': bool}.
+    Raises ValueError for a malformed batch or key.
+    """
+    if idempotency_key is not None:
+        idempotency_key = str(idempotency_key).strip()
+        if not idempotency_key or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            raise ValueError("Invalid idempotency key")
+
+    totals = {}
+    for ingredient_id, quantity in deductions:
+        ingredient_id, quantity = int(ingredient_id), float(quantity)
+        if quantity < 0:
+            raise ValueError(f"Negative deduction for ingredient {ingredient_id}")
+        totals[ingredient_id] = totals.get(ingredient_id, 0) + quantity
+        # float() accepts 'inf' and 'nan', and large amounts can add up to inf; any of
+        # them would be stored as the ingredient's quantity
+        if not math.isfinite(totals[ingredient_id]):
+            raise ValueError(f"Deduction for ingredient {ingredient_id} is not a finite number")
+
+    # Stock checks and reported quantities must include queued +/- changes
+    flush_pending()
+    conn = get_db_connection()
+    try:
+        # Take the write lock up front so a concurrent resend of the same key waits for
+        # this batch and then finds its stored result.
+        conn.execute("BEGIN IMMEDIATE")
+        if idempotency_key is not None:
+            now = time.time()
+            conn.execute("DELETE FROM pantry_deductions WHERE created_at < ?", (now - IDEMPOTENCY_KEY_TTL,))
+            stored = conn.execute(
+                "SELECT result FROM pantry_deductions WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+            if stored:
+                conn.commit()
+                return dict(json.loads(stored['result']), replayed=True)
+
+        before = _fetch_quantities(conn, totals)
+        unknown = sorted(ingredient_id for ingredient_id in totals if ingredient_id not in before)
+        if prevent_negative:
+            shortages = [
+                {'ingredient_id': row['id'], 'name': row['name'], 'quantity': row['quantity'], 'deduct': totals[row['id']]}
+                for row in before.values() if row['quantity'] < totals[row['id']]
+            ]
+            if shortages:
+                raise InsufficientStock(sorted(shortages, key=lambda shortage: shortage['name']))
+
+        conn.executemany(
+            "UPDATE ingredients SET quantity = quantity - ? WHERE id = ?",
+            [(totals[ingredient_id], ingredient_id) for ingredient_id in before]
+        )
+        after = _fetch_quantities(conn, before)
+        result = {
+            'items': sorted((
+                {
+                    'ingredient_id': row['id'],
+                    'name': row['name'],
+                    'deducted': totals[row['id']],
+                    'quantity': row['quantity'],
+                    'base_unit': row['base_unit'],
+                }
+                for row in after.values()
+            ), key=lambda item: item['name']),
+            'unknown': unknown,
+        }
+        if idempotency_key is not None:
+            conn.execute(
+                "INSERT INTO pantry_deductions (idempotency_key, created_at, result) VALUES (?, ?, ?)",
+                (idempotency_key, now, json.dumps(result))
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    result['replayed'] = False
+    return result
@@ -0,0 +1,147 @@
+import threading
+from datetime import datetime
+
+from app.database import get_db_connection, using_database, known_databases, SQL_NOW
+
+# A snapshot is only worth taking once this many ledger events have accumulated since the
+# last one; this also bounds how many events a point-in-time read replays.
+SNAPSHOT_MIN_EVENTS = 10000
+# How often the background snapshotter checks, in seconds.
+SNAPSHOT_CHECK_INTERVAL = 60
+
+def parse_timestamp(value):
+    """Accepts Unix seconds or an ISO 8601 date/time (local time unless it has an offset)."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    return datetime.fromisoformat(str(value).strip()).timestamp()
+
+def take_snapshot(conn=None, force=True):
+    """
+    Records every ingredient's current balance as a snapshot, in one transaction so the
+    balances match the ledger position stored with them. Unless `force` is set, nothing
+    is done when fewer than SNAPSHOT_MIN_EVENTS events happened since the last snapshot.
+    Returns the new snapshot's id, or None if none was taken.
+    """
+    own_connection = conn is None
+    if own_connection:
+        conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        last_event = conn.execute("SELECT COALESCE(MAX(id), 0) FROM inventory_ledger").fetchone()[0]
+        last_snapshot = conn.execute(
+            "SELECT ledger_id FROM inventory_snapshots ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        since = last_event - (last_snapshot['ledger_id'] if last_snapshot else 0)
+        if since == 0 or (not force and since < SNAPSHOT_MIN_EVENTS):
+            conn.rollback()
+            return None
+        cursor = conn.execute(
+            f"INSERT INTO inventory_snapshots (taken_at, ledger_id) VALUES ({SQL_NOW}, ?)", (last_event,)
+        )
+        snapshot_id = cursor.lastrowid
+        conn.execute('''
+            INSERT INTO inventory_snapshot_balances (snapshot_id, ingredient_id, quantity)
+            SELECT ?, id, quantity FROM ingredients WHERE quantity != 0
+        ''', (snapshot_id,))
+        conn.commit()
+        return snapshot_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if own_connection:
+            conn.close()
+
+def _snapshot_before(conn, at):
+    # Latest snapshot taken no later than `at`; replaying starts from the ledger's beginning without one
+    row = conn.execute(
+        "SELECT id, ledger_id FROM inventory_snapshots WHERE taken_at <= ? ORDER BY taken_at DESC LIMIT 1", (at,)
+    ).fetchone()
+    return (row['id'], row['ledger_id']) if row else (None, 0)
+
+def quantity_as_of(ingredient_id, at):
+    """
+    An ingredient's quantity at Unix time `at`: its balance in the latest snapshot at or
+    before `at`, plus the ledger events for it recorded after that snapshot up to `at`.
+    """
+    conn = get_db_connection()
+    snapshot_id, ledger_id = _snapshot_before(conn, at)
+    balance = 0
+    if snapshot_id is not None:
+        row = conn.execute(
+            "SELECT quantity FROM inventory_snapshot_balances WHERE snapshot_id = ? AND ingredient_id = ?",
+            (snapshot_id, ingredient_id)
+        ).fetchone()
+        balance = row['quantity'] if row else 0
+    tail = conn.execute(
+        "SELECT TOTAL(change) FROM inventory_ledger WHERE ingredient_id = ? AND id > ? AND recorded_at <= ?",
+        (ingredient_id, ledger_id, at)
+    ).fetchone()[0]
+    conn.close()
+    return balance + tail
+
+def pantry_as_of(at):
+    """
+    Every ingredient's quantity at Unix time `at`, from one snapshot and the ledger events
+    after it. Returns a list of {'ingredient_id', 'name', 'quantity', 'base_unit'} for the
+    non-zero balances, sorted by name; deleted ingredients have a name of None.
+    """
+    conn = get_db_connection()
+    snapshot_id, ledger_id = _snapshot_before(conn, at)
+    rows = conn.execute('''
+        WITH balances(ingredient_id, quantity) AS (
+            SELECT ingredient_id, quantity FROM inventory_snapshot_balances WHERE snapshot_id = ?
+            UNION ALL
+            SELECT ingredient_id, change FROM inventory_ledger WHERE id > ? AND recorded_at <= ?
+        )
+        SELECT b.ingredient_id, i.name, i.base_unit, TOTAL(b.quantity) as quantity
+        FROM balances b
+        LEFT JOIN ingredients i ON i.id = b.ingredient_id
+        GROUP BY b.ingredient_id
+        HAVING ABS(TOTAL(b.quantity)) > 1e-9
+    ''', (snapshot_id, ledger_id, at)).fetchall()
+    conn.close()
+    return sorted((dict(row) for row in rows), key=lambda row: (row['name'] is None, row['name'] or ''))
+
+def ingredient_history(ingredient_id, limit=50):
+    """The most recent ledger events for an ingredient, newest first."""
+    conn = get_db_connection()
+    rows = conn.execute(
+        "SELECT id, change, recorded_at FROM inventory_ledger WHERE ingredient_id = ? ORDER BY id DESC LIMIT ?",
+        (ingredient_id, limit)
+    ).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+_snapshot_thread = None
+_snapshot_stop = threading.Event()
+
+def start_snapshot_thread(interval=SNAPSHOT_CHECK_INTERVAL):
+    """
+    Takes a snapshot in the background whenever enough ledger events have piled up,
+    in every database in use.
+    """
+    global _snapshot_thread
+
+    def run():
+        while not _snapshot_stop.wait(interval):
+            for path in known_databases():
+                try:
+                    with using_database(path):
+                        take_snapshot(force=False)
+                except Exception as e:
+                    print(f"Error taking inventory snapshot of {path}: {e}")
+
+    if _snapshot_thread is None:
+        _snapshot_stop.clear()
+        _snapshot_thread = threading.Thread(target=run, name='inventory-snapshots', daemon=True)
+        _snapshot_thread.start()
+
+def stop_snapshot_thread():
+    global _snapshot_thread
+    _snapshot_stop.set()
+    if _snapshot_thread is not None:
+        _snapshot_thread.join()
+        _snapshot_thread = None
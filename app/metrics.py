@@ -0,0 +1,205 @@
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+from flask import g, request
+
+from app import database
+from app.write_behind import peek_write_behind
+
+# Upper bounds of the histogram buckets; +Inf is implied.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+CONNECTION_BUCKETS = (0, 1, 2, 3, 4, 5, 10)
+
+class Counter:
+    """A monotonically increasing value per label set."""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, labels, value
+
+class ThreadLocalCounter(Counter):
+    """
+    A Counter for hot paths: each thread adds to its own values without taking a lock,
+    and the threads' values are summed when scraped.
+    """
+    def __init__(self, name, help_text, label_names):
+        super().__init__(name, help_text, label_names)
+        self._local = threading.local()
+        # Every thread's {labels: value}, kept after the thread ends so totals never drop
+        self._shards = []
+
+    def _shard(self):
+        values = getattr(self._local, 'values', None)
+        if values is None:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+        return values
+
+    def inc(self, labels, amount=1):
+        values = self._shard()
+        values[labels] = values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            shards = list(self._shards)
+        totals = {}
+        for values in shards:
+            for labels, value in list(values.items()):
+                totals[labels] = totals.get(labels, 0) + value
+        for labels, value in totals.items():
+            yield self.name, labels, value
+
+class Histogram(Counter):
+    """Observations counted into fixed buckets per label set, with their sum and count."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names, buckets):
+        super().__init__(name, help_text, label_names)
+        self.buckets = buckets
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + (('le', bound),), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+REQUESTS = Counter('pantry_http_requests_total', "HTTP requests handled.", ('endpoint', 'method', 'status'))
+ERRORS = Counter(
+    'pantry_http_request_errors_total', "Requests that raised or answered with a 5xx status.", ('endpoint',)
+)
+LATENCY = Histogram(
+    'pantry_http_request_duration_seconds', "Time to handle a request.", ('endpoint',), LATENCY_BUCKETS
+)
+STATEMENTS = Histogram(
+    'pantry_sql_statements_per_request', "SQL statements run by a request.", ('endpoint',), STATEMENT_BUCKETS
+)
+CHECKOUTS = Histogram(
+    'pantry_db_connections_per_request', "get_db_connection() calls made by a request.", ('endpoint',),
+    CONNECTION_BUCKETS
+)
+CONVERSION_SECONDS = ThreadLocalCounter(
+    'pantry_unit_conversion_seconds_total', "Time spent in app.units conversion functions.", ('function',)
+)
+CONVERSION_CALLS = ThreadLocalCounter(
+    'pantry_unit_conversion_calls_total', "Calls to app.units conversion functions.", ('function',)
+)
+METRICS = [REQUESTS, ERRORS, LATENCY, STATEMENTS, CHECKOUTS, CONVERSION_SECONDS, CONVERSION_CALLS]
+
+def timed_conversion(function):
+    """Decorator recording calls to, and time spent in, a units conversion function."""
+    labels = (function.__name__,)
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            CONVERSION_SECONDS.inc(labels, time.perf_counter() - started)
+            CONVERSION_CALLS.inc(labels)
+    return wrapper
+
+def init_metrics(app):
+    """Registers the request hooks that feed the metrics."""
+    @app.before_request
+    def start_request():
+        database.reset_request_counters()
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_status(response):
+        g.metrics_status = response.status_code
+        if app.config.get('QUERY_COUNT_HEADER'):
+            statements, _ = database.peek_request_counters()
+            response.headers['X-Query-Count'] = str(statements)
+        return response
+
+    @app.teardown_request
+    def record_request(exception=None):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        status = 500 if exception is not None else g.pop('metrics_status', 500)
+        endpoint = request.endpoint or 'unmatched'
+        statements, checkouts = database.reset_request_counters()
+        REQUESTS.inc((endpoint, request.method, str(status)))
+        if status >= 500:
+            ERRORS.inc((endpoint,))
+        LATENCY.observe((endpoint,), elapsed)
+        STATEMENTS.observe((endpoint,), statements)
+        CHECKOUTS.observe((endpoint,), checkouts)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(label_names, labels):
+    # Histogram buckets append an extra ('le', bound) pair after the metric's own labels
+    pairs = list(zip(label_names, labels)) + list(labels[len(label_names):])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(metric.label_names, labels)} {value}")
+
+    # Every household's queue, without starting any
+    queues = [peek_write_behind(path) for path in database.known_databases()]
+    profile, settings = database.get_durability_profile()
+    gauges = (
+        ('pantry_db_open_connections', 'gauge', "Pooled SQLite connections currently open.",
+         (), database.get_open_connection_count()),
+        ('pantry_db_connections_opened_total', 'counter', "SQLite connections opened since startup.",
+         (), database.connections_opened),
+        ('pantry_db_durability_profile', 'gauge', "The active durability profile, always 1.",
+         (('profile', profile), ('journal_mode', settings['journal_mode']), ('synchronous', settings['synchronous'])), 1),
+        ('pantry_db_cached_databases', 'gauge', "Database files (households) with in-process caches.",
+         (), len(database.known_databases())),
+        ('pantry_db_wal_checkpoints_total', 'counter', "WAL checkpoints run by the checkpoint thread.",
+         (), database.checkpoints_run),
+        ('pantry_write_behind_pending', 'gauge', "Ingredients with quantity changes waiting to be written.",
+         (), sum(len(queue.pending()) for queue in queues if queue)),
+    )
+    for name, kind, help_text, labels, value in gauges:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name}{_format_labels((), labels)} {value}")
+    return '\n'.join(lines) + '\n'
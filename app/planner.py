@@ -0,0 +1,67 @@
+import json
+
+from app.database import get_db_connection
+from app.units import convert_rows_to_base
+from app.write_behind import pending_changes
+
+def plan_requirements(meal_portions):
+    """
+    Totals what a set of meals needs and compares it with the pantry.
+    `meal_portions` maps meal_id -> portion; the same meal may be planned several times
+    by summing its portions beforehand.
+
+    One aggregated JOIN sums each (ingredient, recipe unit) pair across all planned meals,
+    weighted by portion; the sums are then converted to base units in-process and added up
+    per ingredient.
+
+    Returns (requirements, missing_conversions). Each requirement is a dict with
+    ingredient_id, name, base_unit, density_g_ml, required, pantry_quantity and shortfall,
+    sorted by name. The plan route adds display strings for JSON; templates use |quantity.
+    """
+    plan = [[int(meal_id), float(portion)] for meal_id, portion in meal_portions.items() if portion > 0]
+    if not plan:
+        return [], []
+
+    conn = get_db_connection()
+    rows = conn.execute("""
+        WITH plan(meal_id, portion) AS (
+            SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+        )
+        SELECT
+            i.id as ingredient_id,
+            i.name,
+            i.quantity as pantry_quantity,
+            i.base_unit,
+            i.base_unit_type,
+            i.density_g_ml,
+            mi.unit,
+            SUM(mi.quantity * plan.portion) as quantity
+        FROM plan
+        JOIN meal_ingredients mi ON mi.meal_id = plan.meal_id
+        JOIN ingredients i ON i.id = mi.ingredient_id
+        GROUP BY i.id, mi.unit
+    """, (json.dumps(plan),)).fetchall()
+    items, missing_conversions = convert_rows_to_base(rows, conn=conn)
+    conn.close()
+
+    changes = pending_changes()
+    totals = {}
+    for item in items:
+        if item['base_quantity'] is None:
+            continue
+        total = totals.get(item['ingredient_id'])
+        if total is None:
+            total = totals[item['ingredient_id']] = {
+                'ingredient_id': item['ingredient_id'],
+                'name': item['name'],
+                'base_unit': item['base_unit'],
+                'density_g_ml': item['density_g_ml'],
+                'pantry_quantity': item['pantry_quantity'] + changes.get(item['ingredient_id'], 0),
+                'required': 0,
+            }
+        total['required'] += item['base_quantity']
+
+    requirements = sorted(totals.values(), key=lambda total: total['name'])
+    for total in requirements:
+        total['shortfall'] = max(total['required'] - total['pantry_quantity'], 0)
+    return requirements, missing_conversions
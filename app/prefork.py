@@ -0,0 +1,333 @@
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from multiprocessing import RawArray
+
+from waitress import wasyncore
+from waitress.server import create_server
+
+# Seconds between a worker's heartbeats, and between the master's checks on its workers.
+HEARTBEAT_INTERVAL = 1
+SUPERVISE_INTERVAL = 0.5
+# Seconds the master waits before replacing a worker that died without ever starting up,
+# so a broken deployment doesn't fork in a loop.
+RESPAWN_DELAY = 1
+# While a worker drains, a connection with nothing in flight is only closed once it has
+# been quiet this many seconds; one accepted just before may not have sent its request yet.
+DRAIN_IDLE = 1
+
+def worker_count(value):
+    """Parses a worker count setting: a number, or 'auto' for one per CPU core."""
+    if str(value).strip().lower() == 'auto':
+        return os.cpu_count() or 1
+    return max(1, int(value))
+
+class _Worker:
+    """What the master knows about one forked worker process."""
+    def __init__(self, pid, slot, generation, started):
+        self.pid = pid
+        self.slot = slot
+        self.generation = generation
+        self.started = started
+
+class PreforkServer:
+    """
+    Serves a WSGI app from several processes, each running waitress with its own threads
+    on one listening socket that the master binds before forking them. The kernel hands
+    each new connection to whichever worker accepts it first, so CPU-bound work such as
+    unit conversion and rendering runs on as many cores as there are workers.
+
+    The master only supervises. Each worker stamps a heartbeat into shared memory from
+    waitress's I/O loop, and only while its threads make progress on queued requests; one
+    that stays silent for `timeout` seconds is killed and replaced, as is one that exits.
+
+    Signals to the master: SIGTERM or SIGINT stop every worker gracefully and exit. SIGHUP
+    starts a fresh set of workers and retires the old ones once the new ones are serving.
+    A worker told to stop stops accepting, finishes the requests it has (for up to
+    `graceful_timeout` seconds) and runs `on_worker_exit`.
+
+    Workers are forked from the master, so code and data loaded before run() is shared,
+    and SIGHUP doesn't load new code; restart the master for that. Anything that must not
+    cross a fork (database connections, threads) belongs in `on_worker_start`.
+    """
+    def __init__(self, app, host='0.0.0.0', port=5000, workers=2, threads=4, connection_limit=100,
+                 backlog=1024, timeout=30, graceful_timeout=30, on_worker_start=None, on_worker_exit=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.connection_limit = connection_limit
+        self.backlog = backlog
+        self.timeout = timeout
+        self.graceful_timeout = graceful_timeout
+        self.on_worker_start = on_worker_start
+        self.on_worker_exit = on_worker_exit
+        self.socket = None
+        # Room for a second set of workers while a restart overlaps the two
+        self.heartbeats = RawArray('d', workers * 2)
+        self.children = {}
+        self.generation = 0
+        self.retiring = set()
+        self.restart_started = None
+        self.respawn_after = 0
+        self.stopping = False
+        self.restart_requested = False
+
+    # --- Master ------------------------------------------------------------------
+
+    def run(self):
+        """Binds the socket, forks the workers and supervises them until told to stop."""
+        self.socket = socket.create_server((self.host, self.port), backlog=self.backlog)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGHUP, self._request_restart)
+        print(f"Serving on http://{self.host}:{self.port} with {self.workers} workers of {self.threads} threads")
+        try:
+            while not self.stopping:
+                self._reap()
+                if self.restart_requested:
+                    self.restart_requested = False
+                    self._start_restart()
+                self._check_heartbeats()
+                self._spawn_missing()
+                self._finish_restart()
+                time.sleep(SUPERVISE_INTERVAL)
+        finally:
+            self._stop_workers()
+            self.socket.close()
+
+    def _request_stop(self, signum, frame):
+        self.stopping = True
+
+    def _request_restart(self, signum, frame):
+        self.restart_requested = True
+
+    def _current(self):
+        return [child for child in self.children.values() if child.generation == self.generation]
+
+    def _spawn(self):
+        used = {child.slot for child in self.children.values()}
+        slot = next((slot for slot in range(len(self.heartbeats)) if slot not in used), None)
+        if slot is None:
+            # Every slot is still held by a worker that is on its way out
+            return
+        # Booting counts against the timeout like any other silence
+        self.heartbeats[slot] = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                self._run_worker(slot)
+                status = 0
+            except BaseException as e:
+                print(f"Worker {os.getpid()} failed: {e!r}")
+            finally:
+                os._exit(status)
+        self.children[pid] = _Worker(pid, slot, self.generation, self.heartbeats[slot])
+
+    def _spawn_missing(self):
+        if time.monotonic() < self.respawn_after:
+            return
+        for _ in range(self.workers - len(self._current())):
+            self._spawn()
+
+    def _reap(self):
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            child = self.children.pop(pid, None)
+            if child is None:
+                continue
+            if child.pid in self.retiring:
+                self.retiring.discard(child.pid)
+                continue
+            if child.generation is None:
+                # Killed by _check_heartbeats, and already replaced
+                continue
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; replacing it")
+            if self.heartbeats[child.slot] <= child.started:
+                self.respawn_after = time.monotonic() + RESPAWN_DELAY
+
+    def _check_heartbeats(self):
+        now = time.monotonic()
+        for child in list(self.children.values()):
+            if child.generation is not None and now - self.heartbeats[child.slot] > self.timeout:
+                print(f"Worker {child.pid} missed its heartbeats for {self.timeout}s; killing it")
+                self._signal(child.pid, signal.SIGKILL)
+                # Stop counting it, so it is replaced now rather than once it is reaped
+                child.generation = None
+                self.retiring.discard(child.pid)
+
+    def _start_restart(self):
+        # The old workers keep serving until their replacements have sent a heartbeat
+        self.retiring.update(child.pid for child in self._current())
+        self.generation += 1
+        self.restart_started = time.monotonic()
+        print(f"Restarting {len(self.retiring)} workers")
+
+    def _finish_restart(self):
+        if self.restart_started is None:
+            return
+        ready = [child for child in self._current() if self.heartbeats[child.slot] > child.started]
+        if len(ready) < self.workers and time.monotonic() - self.restart_started < self.timeout:
+            return
+        for pid in self.retiring:
+            self._signal(pid, signal.SIGTERM)
+        self.restart_started = None
+
+    def _stop_workers(self):
+        for pid in self.children:
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout + HEARTBEAT_INTERVAL
+        while self.children and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.children:
+            print(f"Worker {pid} did not stop within {self.graceful_timeout}s; killing it")
+            self._signal(pid, signal.SIGKILL)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.children.clear()
+
+    def _signal(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    # --- Worker ------------------------------------------------------------------
+
+    def _run_worker(self, slot):
+        self.children.clear()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        # Ctrl-C reaches the whole process group; the master decides what stops
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        if self.on_worker_start:
+            self.on_worker_start()
+        try:
+            handled = [0]
+
+            def counting_app(environ, start_response):
+                try:
+                    return self.app(environ, start_response)
+                finally:
+                    handled[0] += 1
+
+            server = create_server(
+                counting_app, sockets=[self.socket], threads=self.threads,
+                connection_limit=self.connection_limit, backlog=self.backlog
+            )
+            stopped = threading.Event()
+            draining = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: drain_server(server, draining, self.graceful_timeout))
+            heartbeat = threading.Thread(
+                target=self._beat, args=(server, slot, handled, stopped), name='heartbeat', daemon=True
+            )
+            heartbeat.start()
+            try:
+                server.run()
+            finally:
+                stopped.set()
+        finally:
+            if self.on_worker_exit:
+                self.on_worker_exit()
+
+    def _beat(self, server, slot, handled, stopped):
+        def stamp():
+            self.heartbeats[slot] = time.monotonic()
+
+        last_handled = None
+        # Keeps beating while draining, so the master doesn't kill a worker finishing up
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            # Sent through the I/O loop, so a blocked loop stays silent, and skipped while
+            # requests wait and none finished since the last beat, so do stuck threads
+            if server.task_dispatcher.queue and handled[0] == last_handled:
+                continue
+            last_handled = handled[0]
+            try:
+                server.trigger.pull_trigger(stamp)
+            except OSError:
+                return
+
+def drain_server(server, draining, graceful_timeout):
+    """
+    Stops a waitress server from accepting, lets it finish its requests for up to
+    `graceful_timeout` seconds and then closes it, ending run(). The SIGTERM handler of
+    every serving process; `draining` makes a repeated signal a no-op.
+    """
+    # Runs in the main thread, between steps of waitress's I/O loop. The listening
+    # socket stays open for any other workers; this one just stops accepting from it.
+    server.accepting = False
+    if draining.is_set():
+        return
+    draining.set()
+
+    def wait_for_requests():
+        deadline = time.monotonic() + graceful_timeout
+        while time.monotonic() < deadline:
+            dispatcher = server.task_dispatcher
+            quiet_since = time.time() - DRAIN_IDLE
+            busy = dispatcher.queue or dispatcher.active_count or any(
+                channel.requests or channel.request is not None or channel.total_outbufs_len
+                or channel.last_activity > quiet_since
+                for channel in list(server.active_channels.values())
+            )
+            if not busy:
+                break
+            time.sleep(0.05)
+        server.trigger.pull_trigger(lambda: close_server(server))
+
+    threading.Thread(target=wait_for_requests, name='drain', daemon=True).start()
+
+def close_server(server):
+    """Shuts down a waitress server's threads and every socket in its loop, ending run()."""
+    server.task_dispatcher.shutdown()
+    wasyncore.close_all(server._map)
+
+def serve(app, host='0.0.0.0', port=5000, workers=1, threads=4, connection_limit=100, backlog=1024,
+          timeout=30, graceful_timeout=30, on_worker_start=None, on_worker_exit=None):
+    """
+    Serves `app` until stopped: with one worker (or where fork isn't available) in this
+    process, as waitress.serve does, otherwise through a PreforkServer. on_worker_start and
+    on_worker_exit run in each process that serves requests, around its serving. Either
+    way SIGTERM stops gracefully, so on_worker_exit runs before the process exits.
+    """
+    if workers > 1 and hasattr(os, 'fork'):
+        PreforkServer(
+            app, host, port, workers=workers, threads=threads, connection_limit=connection_limit,
+            backlog=backlog, timeout=timeout, graceful_timeout=graceful_timeout,
+            on_worker_start=on_worker_start, on_worker_exit=on_worker_exit
+        ).run()
+        return
+    if on_worker_start:
+        on_worker_start()
+    try:
+        logging.basicConfig()
+        server = create_server(
+            app, host=host, port=port, threads=threads, connection_limit=connection_limit, backlog=backlog
+        )
+        draining = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: drain_server(server, draining, graceful_timeout))
+        server.print_listen("Serving on http://{}:{}")
+        # Ctrl-C still stops at once: waitress ends run() on KeyboardInterrupt
+        server.run()
+    finally:
+        if on_worker_exit:
+            on_worker_exit()
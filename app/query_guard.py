@@ -0,0 +1,102 @@
+import re
+from contextlib import contextmanager
+
+from flask import g, request
+
+from app.database import start_recording, stop_recording
+
+# The same statement run this many times in one request with different parameters is
+# reported as an N+1 pattern: a query inside a loop that one batched query could replace.
+N_PLUS_ONE_THRESHOLD = 3
+
+# {endpoint: maximum statements per request}, filled in by @query_budget.
+BUDGETS = {}
+
+_WHITESPACE = re.compile(r'\s+')
+
+class QueryGuardError(AssertionError):
+    """Raised when a request or block exceeds its query budget or repeats a statement in a loop."""
+
+def query_budget(max_statements):
+    """
+    Declares how many SQL statements one request to a view may run (an executemany batch
+    counts once). Goes under @app.route, so the budget sits next to the route it covers.
+    """
+    def decorator(view):
+        BUDGETS[view.__name__] = max_statements
+        return view
+    return decorator
+
+def find_repeated_statements(statements, threshold=N_PLUS_ONE_THRESHOLD):
+    """
+    Returns [(sql, times)] for statements run at least `threshold` times with differing
+    parameters, most repeated first.
+    """
+    seen = {}
+    for sql, parameters in statements:
+        if parameters is None:
+            continue
+        entry = seen.setdefault(_WHITESPACE.sub(' ', sql).strip(), [0, set()])
+        entry[0] += 1
+        entry[1].add(repr(parameters))
+    repeated = [(sql, times) for sql, (times, distinct) in seen.items() if times >= threshold and len(distinct) > 1]
+    return sorted(repeated, key=lambda item: -item[1])
+
+def find_problems(statements, max_statements=None, allow_repeats=False):
+    """Describes every way `statements` break the budget or repeat, as a list of messages."""
+    problems = []
+    if max_statements is not None and len(statements) > max_statements:
+        problems.append(f"{len(statements)} statements run, budget is {max_statements}")
+    if not allow_repeats:
+        for sql, times in find_repeated_statements(statements):
+            problems.append(f"N+1: run {times} times with different parameters: {sql}")
+    return problems
+
+@contextmanager
+def assert_queries(max_statements=None, allow_repeats=False):
+    """
+    For tests: fails with QueryGuardError if the block runs more than `max_statements`
+    statements or an N+1 pattern. Yields the list of recorded (sql, parameters).
+
+        with assert_queries(max_statements=4):
+            client.get('/meal/1')
+    """
+    recorder = start_recording()
+    try:
+        yield recorder
+    finally:
+        stop_recording(recorder)
+    problems = find_problems(recorder, max_statements, allow_repeats)
+    if problems:
+        raise QueryGuardError('; '.join(problems))
+
+def init_query_guard(app):
+    """
+    Checks every request against its route's budget and for N+1 patterns when
+    app.config['QUERY_GUARD'] is 'warn' or 'raise'. Off by default.
+    """
+    @app.before_request
+    def start_guard():
+        if app.config.get('QUERY_GUARD') in ('warn', 'raise'):
+            g.query_guard_statements = start_recording()
+
+    @app.after_request
+    def check_guard(response):
+        statements = g.pop('query_guard_statements', None)
+        if statements is None:
+            return response
+        stop_recording(statements)
+        problems = find_problems(statements, BUDGETS.get(request.endpoint))
+        if problems:
+            message = f"Query guard, {request.method} {request.path}: " + '; '.join(problems)
+            if app.config['QUERY_GUARD'] == 'raise':
+                raise QueryGuardError(message)
+            print(message)
+        return response
+
+    @app.teardown_request
+    def stop_guard(exception=None):
+        # The request failed before after_request could stop the recording
+        statements = g.pop('query_guard_statements', None)
+        if statements is not None:
+            stop_recording(statements)
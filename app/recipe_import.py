@@ -0,0 +1,261 @@
+import csv
+import json
+import re
+
+from app.database import get_db_connection
+from app.units import canonical_unit
+from app.feasibility import invalidate_meals
+
+UNICODE_FRACTIONS = {
+    '½': 0.5, '⅓': 1/3, '⅔': 2/3, '¼': 0.25, '¾': 0.75,
+    '⅛': 0.125, '⅜': 0.375, '⅝': 0.625, '⅞': 0.875,
+}
+
+# "1 1/2 cups flour", "2 tbsp sugar", "1½ c. milk", "0.5 tsp salt", "3 eggs", "- 1/4 cup of oil"
+_LINE_PATTERN = re.compile(r'''
+    ^\s*(?:[-*•]\s*)?                                 # optional list bullet
+    (?P<quantity>
+        \d+\s+\d+/\d+                                  # mixed number: 1 1/2
+      | \d+/\d+                                        # fraction: 1/2
+      | (?:\d+(?:\.\d+)?|\.\d+)\s*[½⅓⅔¼¾⅛⅜⅝⅞]?          # number, optionally with a vulgar fraction: 2, 0.5, 1½
+      | [½⅓⅔¼¾⅛⅜⅝⅞]                                  # vulgar fraction alone: ½
+    )
+    \s*(?P<rest>\S.*?)\s*$
+''', re.VERBOSE)
+_OF_PREFIX = re.compile(r'^of\s+', re.IGNORECASE)
+
+class UnknownUnit(ValueError):
+    """Raised for a structured ingredient whose unit isn't one we can convert."""
+    def __init__(self, unit):
+        super().__init__(f"Unknown unit '{unit}'")
+        self.unit = unit
+
+class UnreadableRecord:
+    """
+    Stands in for a library record that isn't a meal at all, such as malformed JSON, so
+    import_recipes() reports it with the unparsed lines instead of failing the import.
+    """
+    def __init__(self, text):
+        self.text = text
+
+def parse_quantity(text):
+    """Converts '1 1/2', '3/4', '0.5', '1½' or '½' to a float."""
+    quantity = 0.0
+    for part in text.split():
+        if '/' in part:
+            numerator, denominator = part.split('/')
+            if int(denominator) == 0:
+                raise ValueError(f"Invalid fraction '{part}'")
+            quantity += int(numerator) / int(denominator)
+            continue
+        if part[-1] in UNICODE_FRACTIONS:
+            quantity += UNICODE_FRACTIONS[part[-1]]
+            part = part[:-1]
+        if part:
+            quantity += float(part)
+    return quantity
+
+def parse_ingredient_line(line):
+    """
+    Parses a recipe line such as "1 1/2 cups flour" into (quantity, unit, ingredient_name).
+    Lines without a recognised unit ("3 eggs") are counted in 'unit'.
+    Raises ValueError if the line has no quantity or no ingredient name.
+    """
+    match = _LINE_PATTERN.match(line)
+    if not match:
+        raise ValueError(f"No quantity in '{line.strip()}'")
+    quantity = parse_quantity(match.group('quantity'))
+
+    rest = match.group('rest')
+    first_word, _, remainder = rest.partition(' ')
+    unit = canonical_unit(first_word)
+    if unit:
+        rest = remainder
+    else:
+        unit = 'unit'
+    name = _OF_PREFIX.sub('', rest).strip().lower()
+    if not name:
+        raise ValueError(f"No ingredient in '{line.strip()}'")
+    return quantity, unit, name
+
+def parse_ingredient_item(item):
+    """
+    Parses a structured ingredient, {"quantity": ..., "unit": ..., "ingredient": ...}, into
+    (quantity, unit, ingredient_name); one with a "line" is parsed as text instead. Unlike
+    in a line, the unit is known to be a unit, so one we don't recognise raises UnknownUnit
+    rather than being read as part of the name. A missing unit means a count.
+    """
+    if item.get('line'):
+        return parse_ingredient_line(item['line'])
+    quantity_text = str(item.get('quantity') or '').strip()
+    if not quantity_text:
+        raise ValueError("No quantity")
+    quantity = parse_quantity(quantity_text)
+    raw_unit = str(item.get('unit') or '').strip()
+    unit = canonical_unit(raw_unit) if raw_unit else 'unit'
+    if unit is None:
+        raise UnknownUnit(raw_unit)
+    name = _OF_PREFIX.sub('', str(item.get('ingredient') or '')).strip().lower()
+    if not name:
+        raise ValueError("No ingredient")
+    return quantity, unit, name
+
+def read_recipe_records(text_stream, fmt):
+    """
+    Lazily yields (meal_name, entry) pairs from a recipe library, where an entry is a line
+    of text or a dict with quantity, unit and ingredient (see parse_ingredient_item).
+
+    'txt':   a "# Meal name" header line starts each meal, followed by one ingredient per line.
+    'csv':   columns meal and line, or meal, quantity, unit and ingredient.
+    'jsonl': one {"meal": ..., "ingredients": [...]} object per line, where each ingredient is a
+             line of text or an object with quantity, unit and ingredient. Any other line is
+             yielded as (None, UnreadableRecord).
+    """
+    if fmt == 'txt':
+        meal_name = None
+        for line in text_stream:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('#'):
+                meal_name = line.lstrip('#').strip()
+            else:
+                yield meal_name, line
+    elif fmt == 'csv':
+        for row in csv.DictReader(text_stream):
+            yield row.get('meal'), row
+    elif fmt == 'jsonl':
+        for line in text_stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not (
+                isinstance(record, dict) and isinstance(record.get('meal'), (str, type(None)))
+                and isinstance(record.get('ingredients', []), list)
+            ):
+                yield None, UnreadableRecord(line)
+                continue
+            for item in record.get('ingredients', []):
+                yield record.get('meal'), item
+    else:
+        raise ValueError(f"Unsupported format '{fmt}'")
+
+def _entry_text(entry):
+    # How an entry that couldn't be parsed is shown back in the summary
+    if isinstance(entry, str):
+        return entry
+    if entry.get('line'):
+        return entry['line']
+    return ' '.join(str(entry.get(key) or '') for key in ('quantity', 'unit', 'ingredient')).strip()
+
+def _without_first_word(name):
+    return name.split(' ', 1)[-1]
+
+def _lookup_ids(conn, table, names):
+    # One query however many names: the list goes in as a single JSON parameter
+    rows = conn.execute(
+        f"SELECT id, name FROM {table} WHERE name IN (SELECT value FROM json_each(?))",
+        (json.dumps(sorted(names)),)
+    ).fetchall()
+    return {row['name']: row['id'] for row in rows}
+
+def import_recipes(records, meal_id=None, create_meals=True):
+    """
+    Adds ingredient lines to meals in bulk. `records` is an iterable of (meal_name, entry)
+    with entries as yielded by read_recipe_records;
+    if `meal_id` is given every line goes to that meal and meal names are ignored.
+    All ingredient (and meal) names are resolved with one query each and every
+    meal_ingredients row is inserted with one executemany in a single transaction.
+    Missing meals are created when `create_meals` is set; ingredients must already exist.
+
+    Returns {'imported': n, 'meals': n, 'unparsed': [...], 'unknown_units': [...],
+             'unresolved_ingredients': [...], 'unresolved_meals': [...]}.
+    """
+    parsed = []
+    unparsed = []
+    unknown_units = set()
+    for meal_name, entry in records:
+        if isinstance(entry, UnreadableRecord):
+            unparsed.append(entry.text)
+            continue
+        try:
+            if isinstance(entry, str):
+                quantity, unit, ingredient_name = parse_ingredient_line(entry)
+            else:
+                quantity, unit, ingredient_name = parse_ingredient_item(entry)
+        except UnknownUnit as e:
+            unknown_units.add(e.unit)
+            continue
+        except (ValueError, AttributeError):
+            unparsed.append(_entry_text(entry) if isinstance(entry, (str, dict)) else repr(entry))
+            continue
+        meal_key = meal_id if meal_id is not None else (meal_name or '').strip().lower()
+        if meal_key == '':
+            # A line outside any meal
+            unparsed.append(_entry_text(entry))
+            continue
+        parsed.append((meal_key, quantity, unit, ingredient_name))
+
+    summary = {
+        'imported': 0,
+        'meals': 0,
+        'unparsed': unparsed,
+        'unknown_units': sorted(unknown_units),
+        'unresolved_ingredients': [],
+        'unresolved_meals': [],
+    }
+    if not parsed:
+        return summary
+
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN")
+        # A line like "2 pinches salt" parses as 2 units of "pinches salt". Looking up the name
+        # without its first word in the same query lets us report "pinches" as an unknown unit.
+        candidates = {row[3] for row in parsed}
+        candidates.update(_without_first_word(row[3]) for row in parsed if row[2] == 'unit' and ' ' in row[3])
+        ingredient_ids = _lookup_ids(conn, 'ingredients', candidates)
+
+        if meal_id is not None:
+            meal_ids = {meal_id: meal_id}
+        else:
+            meal_names = {row[0] for row in parsed}
+            if create_meals:
+                conn.executemany("INSERT OR IGNORE INTO meals (name) VALUES (?)", [(name,) for name in meal_names])
+            meal_ids = _lookup_ids(conn, 'meals', meal_names)
+            summary['unresolved_meals'] = sorted(meal_names - meal_ids.keys())
+
+        rows = []
+        unresolved = set()
+        for meal_key, quantity, unit, ingredient_name in parsed:
+            ingredient_id = ingredient_ids.get(ingredient_name)
+            if ingredient_id is None:
+                if unit == 'unit' and _without_first_word(ingredient_name) in ingredient_ids:
+                    unknown_units.add(ingredient_name.split(' ', 1)[0])
+                else:
+                    unresolved.add(ingredient_name)
+            elif meal_key in meal_ids:
+                rows.append((meal_ids[meal_key], ingredient_id, quantity, unit))
+
+        conn.executemany(
+            "INSERT INTO meal_ingredients (meal_id, ingredient_id, quantity, unit) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    touched_meals = {row[0] for row in rows}
+    invalidate_meals(touched_meals)
+    summary['imported'] = len(rows)
+    summary['meals'] = len(touched_meals)
+    summary['unresolved_ingredients'] = sorted(unresolved)
+    summary['unknown_units'] = sorted(unknown_units)
+    return summary
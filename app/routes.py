@@ -1,11 +1,32 @@
-from flask import render_template, request, make_response, jsonify
+import io
+import math
+import sqlite3
+import uuid
+
+from flask import render_template, request, make_response, jsonify, Response, stream_with_context
 from app import app
-from app.database import get_db_connection
+from app.database import get_db_connection, get_table_version, unit_of_work
 from app.units import (
     convert_to_base, needs_conversion_prompt, get_conversion_prompt_html,
     get_base_unit_type, get_base_unit, get_new_ingredient_conversion_prompt_html,
-    convert_units, format_fraction, convert_from_base
+    convert_units, format_fraction, convert_from_base, get_conversion_factor,
+    convert_rows_to_base
 )
+from app.search import search_ingredients, index_ingredient, unindex_ingredient
+from app.cache import cached_view
+from app.bulk import import_ingredients, export_ingredients, guess_format, FORMATS
+from app.recipe_import import import_recipes, read_recipe_records
+from app.planner import plan_requirements
+from app.feasibility import evaluate_feasibility, invalidate_meals, invalidate_ingredients
+from app.inventory import apply_deductions, parse_deduction, InsufficientStock
+from app.write_behind import adjust_quantity, flush_pending, pending_changes, with_pending
+from app.ledger import parse_timestamp, quantity_as_of, pantry_as_of, ingredient_history
+from app.metrics import render_metrics
+from app.query_guard import query_budget
+from app.identity_map import lookup_ingredient, lookup_ingredient_by_name, forget_ingredients
+
+# Tables a rendered recipe depends on: its rows, the ingredients and every conversion
+RECIPE_TABLES = ('meals', 'meal_ingredients', 'ingredients', 'unit_conversions', 'ingredient_conversions')
 
 def get_all_units():
     # These are hardcoded for consistency in the UI
@@ -13,11 +34,46 @@ def get_all_units():
     volume_units = ['ml', 'l', 'cc', 'cup', 'tbsp', 'tsp', 'gallon', 'quart', 'pint']
     return mass_units, volume_units
 
-def get_all_ingredients():
+# Rows per page for the pantry and meal listings
+PAGE_SIZE = 50
+
+def get_letter(value):
+    """Returns `value` if it is a single letter a-z usable as a list filter, else None."""
+    value = (value or '').strip().lower()
+    if len(value) == 1 and 'a' <= value <= 'z':
+        return value
+    return None
+
+def get_page(table, after=None, letter=None, limit=PAGE_SIZE):
+    """
+    Keyset pagination by name: returns (rows, next_after) for the rows after `after`,
+    optionally restricted to names starting with `letter`. next_after is None on the last page.
+    Ranges on name (rather than LIKE) keep both the filter and the ORDER BY on the name index.
+    """
+    conditions = []
+    params = []
+    if after:
+        conditions.append("name > ?")
+        params.append(after)
+    if letter:
+        conditions.append("name >= ? AND name < ?")
+        params.extend([letter, chr(ord(letter) + 1)])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
     conn = get_db_connection()
-    ingredients = conn.execute('SELECT * FROM ingredients ORDER BY name').fetchall()
+    rows = conn.execute(f"SELECT * FROM {table} {where} ORDER BY name LIMIT ?", params + [limit + 1]).fetchall()
     conn.close()
-    return ingredients
+    if table == 'ingredients':
+        rows = with_pending(rows)
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]['name']
+    return rows, None
+
+def render_ingredients_list(letter=None, show_edit_buttons=False):
+    ingredients, next_after = get_page('ingredients', letter=letter)
+    return render_template(
+        '_ingredients_list.html', ingredients=ingredients, next_after=next_after, letter=letter,
+        show_edit_buttons=show_edit_buttons, list_version=get_ingredient_list_version()
+    )
 
 def get_all_meals():
     conn = get_db_connection()
@@ -25,18 +81,97 @@ def get_all_meals():
     conn.close()
     return meals
 
+def get_ingredient_list_version():
+    conn = get_db_connection()
+    version = get_table_version(conn, 'ingredients')
+    conn.close()
+    return version
+
+def ingredient_list_response(version_before, ingredient_id=None, inserted=False):
+    """
+    Builds the response to a pantry write.
+    If the client's list was current before the write (it sends back the list_version
+    it was rendered with), only the changed item is sent, as an out-of-band swap that
+    replaces it or inserts it at its sorted position. Otherwise the whole list is re-rendered.
+    """
+    letter = get_letter(request.form.get('letter'))
+    if request.form.get('list_version') != str(version_before):
+        return make_response(render_ingredients_list(letter, show_edit_buttons=True))
+
+    conn = get_db_connection()
+    ingredient = None
+    position = None
+    if ingredient_id:
+        ingredient, = with_pending([lookup_ingredient(ingredient_id, conn)])
+    if ingredient and letter and not ingredient['name'].startswith(letter):
+        # Not part of the client's filtered list
+        ingredient = None
+    if ingredient and not inserted:
+        position = 'replace'
+    elif ingredient:
+        # Insert before the next item by name in the same list. If that item hasn't been
+        # paged in yet, the swap finds no target and the item arrives with its page instead.
+        upper = chr(ord(letter) + 1) if letter else None
+        next_ingredient = conn.execute(
+            "SELECT id FROM ingredients WHERE name > ? AND (? IS NULL OR name < ?) ORDER BY name LIMIT 1",
+            (ingredient['name'], upper, upper)
+        ).fetchone()
+        if next_ingredient:
+            position = f"beforebegin:#ingredient-{next_ingredient['id']}"
+        else:
+            position = "beforebegin:#ingredient-list-end"
+    list_version = get_table_version(conn, 'ingredients')
+    conn.close()
+
+    response = make_response(render_template(
+        '_ingredient_update.html', ingredient=ingredient, position=position, list_version=list_version
+    ))
+    # Everything is out-of-band, so leave the request's own target alone
+    response.headers['HX-Reswap'] = 'none'
+    return response
+
 @app.route('/')
+@query_budget(6)
+@cached_view('ingredients', 'meals')
 def index():
-    ingredients = get_all_ingredients()
+    ingredients, next_after = get_page('ingredients')
     meals = get_all_meals()
-    return render_template('index.html', ingredients=ingredients, meals=meals)
+    return render_template(
+        'index.html', ingredients=ingredients, next_after=next_after, meals=meals,
+        list_version=get_ingredient_list_version()
+    )
 
 @app.route('/pantry')
+@query_budget(5)
+@cached_view('ingredients')
 def pantry():
-    ingredients = get_all_ingredients()
-    return render_template('pantry.html', ingredients=ingredients)
+    ingredients, next_after = get_page('ingredients')
+    return render_template(
+        'pantry.html', ingredients=ingredients, next_after=next_after,
+        list_version=get_ingredient_list_version()
+    )
+
+@app.route('/ingredients_list')
+@query_budget(5)
+@cached_view('ingredients')
+def ingredients_list():
+    letter = get_letter(request.args.get('letter'))
+    return render_ingredients_list(letter, show_edit_buttons=bool(request.args.get('edit')))
+
+@app.route('/ingredients_page')
+@query_budget(4)
+@cached_view('ingredients')
+def ingredients_page():
+    after = request.args.get('after')
+    letter = get_letter(request.args.get('letter'))
+    ingredients, next_after = get_page('ingredients', after, letter)
+    return render_template(
+        '_ingredients_page.html', ingredients=ingredients, next_after=next_after, letter=letter,
+        show_edit_buttons=bool(request.args.get('edit'))
+    )
 
 @app.route('/add_ingredient', methods=['POST'])
+@query_budget(8)
 def add_ingredient():
     ingredient_name = request.form['ingredient_name'].strip().lower()
     try:
@@ -44,105 +179,91 @@ def add_ingredient():
     except (ValueError, TypeError):
         quantity = 0
     unit = request.form.get('unit', '').strip().lower()
+    list_version = get_ingredient_list_version()
 
     if not ingredient_name or not unit:
-        ingredients = get_all_ingredients()
-        return render_template('_ingredients_list.html', ingredients=ingredients)
-
-    conn = get_db_connection()
-    ingredient = conn.execute("SELECT * FROM ingredients WHERE name = ?", (ingredient_name,)).fetchone()
+        return ingredient_list_response(list_version)
 
-    # This will be our final response, can be overridden by a prompt
-    response_html = ""
+    # The item to send back; stays None if nothing was written
+    changed_id = None
+    ingredient = None
 
-    if ingredient:
-        # Ingredient exists
-        try:
-            if needs_conversion_prompt(unit, ingredient['id']):
-                conn.close()
-                # Return a prompt instead of the ingredient list
-                return make_response(get_conversion_prompt_html(ingredient['id'], quantity, unit, 0))
-
-            converted_quantity, _, _ = convert_to_base(quantity, unit, ingredient['id'])
-            conn.execute("UPDATE ingredients SET quantity = quantity + ? WHERE id = ?", (converted_quantity, ingredient['id']))
-            conn.commit()
-        except ValueError as e:
+    try:
+        with unit_of_work() as conn:
+            ingredient = lookup_ingredient_by_name(ingredient_name, conn)
+            if ingredient:
+                # Ingredient exists
+                if needs_conversion_prompt(unit, ingredient['id']):
+                    # Return a prompt instead of the ingredient list
+                    return make_response(get_conversion_prompt_html(ingredient['id'], quantity, unit, 0))
+
+                converted_quantity, _, _ = convert_to_base(quantity, unit, ingredient['id'])
+                conn.execute("UPDATE ingredients SET quantity = quantity + ? WHERE id = ?", (converted_quantity, ingredient['id']))
+                changed_id = ingredient['id']
+            else:
+                # New ingredient
+                base_unit_type = get_base_unit_type(unit)
+                if not base_unit_type:
+                    raise ValueError(f"Cannot determine type for unit '{unit}'. Please use a standard unit (e.g., g, ml, oz, cup).")
+
+                # If the user adds a new ingredient that has a mass or volume, we need its density
+                # to allow for future conversions. We will standardize on 'g' as the base unit.
+                if base_unit_type in ['mass', 'volume']:
+                    # We pass the original unit to the prompt function to make it more informative.
+                    response = make_response(get_new_ingredient_conversion_prompt_html(ingredient_name, quantity, unit))
+                    response.headers['HX-Retarget'] = '#user-prompts'
+                    response.headers['HX-Reswap'] = 'innerHTML'
+                    return response
+
+                # This logic will now only apply to 'count' type ingredients, as mass/volume types
+                # are handled by the density prompt and its corresponding route.
+                base_unit = get_base_unit(base_unit_type)
+                converted_quantity, _, _ = convert_to_base(quantity, unit) # This will just be the quantity itself for 'count'
+
+                cursor = conn.execute(
+                    'INSERT INTO ingredients (name, quantity, base_unit, base_unit_type) VALUES (?, ?, ?, ?)',
+                    (ingredient_name, converted_quantity, base_unit, base_unit_type)
+                )
+                changed_id = cursor.lastrowid
+        forget_ingredients()
+        if not ingredient:
+            index_ingredient(changed_id, ingredient_name, base_unit)
+    except ValueError as e:
+        changed_id = None
+        if ingredient:
             print(f"Conversion error for existing ingredient: {e}")
-            # Optionally, return an error message to the user here
-        finally:
-            if conn: conn.close()
-    else:
-        # New ingredient
-        try:
-            base_unit_type = get_base_unit_type(unit)
-            if not base_unit_type:
-                raise ValueError(f"Cannot determine type for unit '{unit}'. Please use a standard unit (e.g., g, ml, oz, cup).")
-
-            # If the user adds a new ingredient that has a mass or volume, we need its density
-            # to allow for future conversions. We will standardize on 'g' as the base unit.
-            if base_unit_type in ['mass', 'volume']:
-                conn.close()
-                # We pass the original unit to the prompt function to make it more informative.
-                response = make_response(get_new_ingredient_conversion_prompt_html(ingredient_name, quantity, unit))
-                response.headers['HX-Retarget'] = '#user-prompts'
-                response.headers['HX-Reswap'] = 'innerHTML'
-                return response
-
-            # This logic will now only apply to 'count' type ingredients, as mass/volume types
-            # are handled by the density prompt and its corresponding route.
-            base_unit = get_base_unit(base_unit_type)
-            converted_quantity, _, _ = convert_to_base(quantity, unit) # This will just be the quantity itself for 'count'
-
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO ingredients (name, quantity, base_unit, base_unit_type) VALUES (?, ?, ?, ?)',
-                (ingredient_name, converted_quantity, base_unit, base_unit_type)
-            )
-            conn.commit()
-        except ValueError as e:
+        else:
             print(f"Error adding new ingredient: {e}")
-            # Optionally, return an error message to the user
-        finally:
-            if conn: conn.close()
+        # Optionally, return an error message to the user here
 
-    ingredients = get_all_ingredients()
-    response_html = render_template('_ingredients_list.html', ingredients=ingredients)
-    # This ensures the prompt area is cleared on successful add
-    return make_response(response_html)
+    # Send back just the changed item; this also clears the prompt area
+    return ingredient_list_response(list_version, changed_id, inserted=not ingredient)
 
 @app.route('/search')
+@query_budget(2)
+@cached_view('ingredients')
 def search():
     query = request.args.get('q', '').strip().lower()
-    conn = get_db_connection()
-    if query:
-        ingredients = conn.execute(
-            "SELECT * FROM ingredients WHERE name LIKE ? ORDER BY name LIMIT 5",
-            (query + '%',)
-        ).fetchall()
-    else:
-        ingredients = []
-    conn.close()
+    ingredients = search_ingredients(query)
     return render_template('_search_results.html', ingredients=ingredients)
 
 @app.route('/update_quantity', methods=['POST'])
+@query_budget(3)
 def update_quantity():
     ingredient_id = request.form['id']
     change = float(request.form['change'])
 
-    conn = get_db_connection()
-    conn.execute(
-        "UPDATE ingredients SET quantity = quantity + ? WHERE id = ?",
-        (change, ingredient_id)
-    )
-    conn.commit()
+    # Queued and merged with other clicks when write-behind is enabled
+    adjust_quantity(ingredient_id, change)
+    forget_ingredients()
 
     # Fetch the updated ingredient to send back
-    ingredient = conn.execute("SELECT * FROM ingredients WHERE id = ?", (ingredient_id,)).fetchone()
-    conn.close()
+    ingredient, = with_pending([lookup_ingredient(ingredient_id)])
 
     return render_template('_ingredient_item.html', ingredient=ingredient)
 
 @app.route('/add_conversion', methods=['POST'])
+@query_budget(8)
 def add_conversion():
     ingredient_id = request.form['ingredient_id']
     from_unit = request.form['from_unit']
@@ -152,88 +273,80 @@ def add_conversion():
     # The original quantity and unit the user was trying to add
     original_quantity = float(request.form['quantity_to_add'])
     original_unit = request.form['unit_to_add']
+    list_version = get_ingredient_list_version()
 
-    conn = get_db_connection()
     try:
-        # Save the new conversion factor
-        conn.execute(
-            "INSERT INTO ingredient_conversions (ingredient_id, from_unit, to_unit, factor) VALUES (?, ?, ?, ?)",
-            (ingredient_id, from_unit, to_unit, factor)
-        )
-        conn.commit()
-
-        # Now that the conversion is saved, try to add the original quantity again
-        # We need a new connection for convert_to_base to see the new conversion
-        conn.close()
-        conn = get_db_connection()
+        with unit_of_work() as conn:
+            # Save the new conversion factor
+            conn.execute(
+                "INSERT INTO ingredient_conversions (ingredient_id, from_unit, to_unit, factor) VALUES (?, ?, ?, ?)",
+                (ingredient_id, from_unit, to_unit, factor)
+            )
 
-        converted_quantity, _, _ = convert_to_base(original_quantity, original_unit, ingredient_id)
-        conn.execute(
-            "UPDATE ingredients SET quantity = quantity + ? WHERE id = ?",
-            (converted_quantity, ingredient_id)
-        )
-        conn.commit()
+            # Now that the conversion is saved, try to add the original quantity again;
+            # convert_to_base runs in the same transaction, so it sees the new conversion
+            converted_quantity, _, _ = convert_to_base(original_quantity, original_unit, ingredient_id)
+            conn.execute(
+                "UPDATE ingredients SET quantity = quantity + ? WHERE id = ?",
+                (converted_quantity, ingredient_id)
+            )
+        forget_ingredients()
+        invalidate_ingredients([ingredient_id])
 
     except Exception as e:
         print(f"Error in add_conversion: {e}")
         # Handle error, maybe return a message
-    finally:
-        if conn: conn.close()
 
-    # Return the updated ingredient list
-    ingredients = get_all_ingredients()
-    response_html = render_template('_ingredients_list.html', ingredients=ingredients)
-    # This response will replace the #ingredient-list-container, thus clearing the prompt
-    return make_response(response_html)
+    # The prompt replaced the list, so the client sends no list_version and gets the
+    # whole list back, which replaces #ingredient-list-container and clears the prompt
+    return ingredient_list_response(list_version, ingredient_id)
 
 @app.route('/add_new_ingredient_with_density', methods=['POST'])
+@query_budget(8)
 def add_new_ingredient_with_density():
     ingredient_name = request.form['ingredient_name'].strip().lower()
     original_quantity = float(request.form['original_quantity'])
     original_unit = request.form['original_unit']
     density_g_ml = float(request.form['density_g_ml'])
+    list_version = get_ingredient_list_version()
+    ingredient_id = None
 
-    conn = get_db_connection()
     try:
-        # 1. Create the new ingredient.
-        # When adding with a volume unit, we standardize the base unit to 'g'.
-        base_unit = 'g'
-        base_unit_type = 'mass'
-
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO ingredients (name, quantity, base_unit, base_unit_type, density_g_ml) VALUES (?, ?, ?, ?, ?)',
-            (ingredient_name, 0, base_unit, base_unit_type, density_g_ml)
-        )
-        ingredient_id = cursor.lastrowid
-        conn.commit() # Commit the insert to make the ingredient available for conversion
-
-        # 2. Convert the original quantity to the base quantity using the new density.
-        # We need a new connection/cursor for convert_to_base to see the new ingredient.
-        conn.close()
-        conn = get_db_connection()
+        with unit_of_work() as conn:
+            # 1. Create the new ingredient.
+            # When adding with a volume unit, we standardize the base unit to 'g'.
+            base_unit = 'g'
+            base_unit_type = 'mass'
+
+            cursor = conn.execute(
+                'INSERT INTO ingredients (name, quantity, base_unit, base_unit_type, density_g_ml) VALUES (?, ?, ?, ?, ?)',
+                (ingredient_name, 0, base_unit, base_unit_type, density_g_ml)
+            )
+            ingredient_id = cursor.lastrowid
 
-        converted_quantity, _, _ = convert_to_base(original_quantity, original_unit, ingredient_id)
+            # 2. Convert the original quantity to the base quantity using the new density.
+            # convert_to_base reads the new row within the same transaction.
+            converted_quantity, _, _ = convert_to_base(original_quantity, original_unit, ingredient_id)
 
-        # 3. Update the ingredient with the correct converted quantity.
-        conn.execute(
-            "UPDATE ingredients SET quantity = ? WHERE id = ?",
-            (converted_quantity, ingredient_id)
-        )
-        conn.commit()
+            # 3. Update the ingredient with the correct converted quantity.
+            conn.execute(
+                "UPDATE ingredients SET quantity = ? WHERE id = ?",
+                (converted_quantity, ingredient_id)
+            )
+        forget_ingredients()
+        index_ingredient(ingredient_id, ingredient_name, base_unit)
 
     except Exception as e:
+        # Nothing was stored, so there is no new item to send back
+        ingredient_id = None
         print(f"Error in add_new_ingredient_with_density: {e}")
         # Optionally handle error, e.g., by returning an error message to the user
-    finally:
-        if conn: conn.close()
 
-    # Return the updated ingredient list, which also clears the prompt
-    ingredients = get_all_ingredients()
-    response_html = render_template('_ingredients_list.html', ingredients=ingredients)
-    return make_response(response_html)
+    # Send back just the new item, which also clears the prompt
+    return ingredient_list_response(list_version, ingredient_id, inserted=True)
 
 @app.route('/start_cooking_session', methods=['POST'])
+@query_budget(4)
 def start_cooking_session():
     meal_id = request.form.get('meal_id')
     try:
@@ -250,72 +363,82 @@ def start_cooking_session():
 
     # Get ingredients for the meal from meal_ingredients table
     meal_ingredients_raw = conn.execute("""
-        SELECT i.id, i.name, i.quantity as pantry_quantity, i.base_unit, mi.quantity as recipe_quantity, mi.unit as recipe_unit
+        SELECT
+            i.id as ingredient_id,
+            i.name,
+            i.quantity as pantry_quantity,
+            i.base_unit,
+            i.base_unit_type,
+            i.density_g_ml,
+            mi.quantity,
+            mi.unit
         FROM ingredients i
         JOIN meal_ingredients mi ON i.id = mi.ingredient_id
         WHERE mi.meal_id = ?
     """, (meal_id,)).fetchall()
 
+    # Convert the whole recipe in one pass; rows that can't be converted come back in missing_conversions
+    converted_items, missing_conversions = convert_rows_to_base(meal_ingredients_raw, portion, conn)
+
+    changes = pending_changes()
     recipe_items = []
-    missing_conversions = []
-    for item in meal_ingredients_raw:
-        try:
-            required_quantity_base, _, _ = convert_to_base(item['recipe_quantity'] * portion, item['recipe_unit'], item['id'])
-
-            recipe_items.append({
-                "ingredient": {
-                    "id": item['id'],
-                    "name": item['name'],
-                    "base_unit": item['base_unit']
-                },
-                "required_quantity": required_quantity_base,
-                "pantry_quantity": item['pantry_quantity'],
-                "in_stock": item['pantry_quantity'] >= required_quantity_base
-            })
-        except ValueError as e:
-            print(f"Could not convert {item['name']} for cooking session: {e}")
-            # Handle error - maybe skip this ingredient or show an error in the UI
-            missing_conversions.append({
+    for item in converted_items:
+        if item['base_quantity'] is None:
+            continue
+        item['pantry_quantity'] += changes.get(item['ingredient_id'], 0)
+        recipe_items.append({
+            "ingredient": {
+                "id": item['ingredient_id'],
                 "name": item['name'],
-                "unit": item['recipe_unit'],
                 "base_unit": item['base_unit']
-            })
+            },
+            "required_quantity": item['base_quantity'],
+            "pantry_quantity": item['pantry_quantity'],
+            "in_stock": item['pantry_quantity'] >= item['base_quantity']
+        })
 
     conn.close()
 
-    return render_template('cooking_mode.html', meal=meal, portion=portion, recipe_items=recipe_items, missing_conversions=missing_conversions)
+    return render_template(
+        'cooking_mode.html', meal=meal, portion=portion, recipe_items=recipe_items,
+        missing_conversions=missing_conversions, idempotency_key=uuid.uuid4().hex
+    )
 
 @app.route('/ingredient/<int:ing_id>')
+@query_budget(3)
+@cached_view('ingredients')
 def get_ingredient(ing_id):
-    conn = get_db_connection()
-    ingredient = conn.execute("SELECT * FROM ingredients WHERE id = ?", (ing_id,)).fetchone()
-    conn.close()
+    ingredient, = with_pending([lookup_ingredient(ing_id)])
     return render_template('_ingredient_item.html', ingredient=ingredient)
 
 @app.route('/edit_ingredient_form/<int:ing_id>')
+@query_budget(3)
+@cached_view('ingredients')
 def edit_ingredient_form(ing_id):
-    conn = get_db_connection()
-    ingredient = conn.execute("SELECT * FROM ingredients WHERE id = ?", (ing_id,)).fetchone()
-    conn.close()
+    # The form's quantity is saved as is, so it must include queued +/- changes
+    ingredient, = with_pending([lookup_ingredient(ing_id)])
     return render_template('_edit_ingredient_form.html', ingredient=ingredient)
 
 @app.route('/edit_ingredient/<int:ing_id>', methods=['POST'])
+@query_budget(4)
 def edit_ingredient(ing_id):
-    conn = get_db_connection()
     new_name = request.form.get('name', '').strip().lower()
     new_quantity = request.form.get('quantity', 0)
 
     if not new_name:
         # Handle error: name cannot be empty
         # For simplicity, we'll just fetch the original ingredient and return it
-        ingredient = conn.execute("SELECT * FROM ingredients WHERE id = ?", (ing_id,)).fetchone()
-        conn.close()
+        ingredient, = with_pending([lookup_ingredient(ing_id)])
         return render_template('_ingredient_item.html', ingredient=ingredient)
 
     try:
         new_quantity = float(new_quantity)
-        conn.execute("UPDATE ingredients SET name = ?, quantity = ? WHERE id = ?", (new_name, new_quantity, ing_id))
-        conn.commit()
+        # The new quantity replaces whatever is stored, so queued changes must land first
+        flush_pending()
+        with unit_of_work() as conn:
+            conn.execute("UPDATE ingredients SET name = ?, quantity = ? WHERE id = ?", (new_name, new_quantity, ing_id))
+        forget_ingredients()
+        invalidate_ingredients([ing_id])
     except ValueError:
         # Handle error: quantity is not a valid float
         pass # For simplicity, we do nothing
@@ -323,42 +446,40 @@ def edit_ingredient(ing_id):
         print(f"Error updating ingredient: {e}")
         # Handle other potential DB errors
 
-    ingredient = conn.execute("SELECT * FROM ingredients WHERE id = ?", (ing_id,)).fetchone()
-    conn.close()
+    ingredient = lookup_ingredient(ing_id)
+    if ingredient:
+        # Keep the search index in step with a possible rename
+        index_ingredient(ing_id, ingredient['name'], ingredient['base_unit'])
     return render_template('_ingredient_item.html', ingredient=ingredient)
 
 @app.route('/delete_ingredient/<int:ing_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_ingredient(ing_id):
-    conn = get_db_connection()
     try:
-        # First, delete references in meal_ingredients
-        conn.execute("DELETE FROM meal_ingredients WHERE ingredient_id = ?", (ing_id,))
-        # Then, delete the ingredient itself
-        conn.execute("DELETE FROM ingredients WHERE id = ?", (ing_id,))
-        conn.commit()
+        with unit_of_work() as conn:
+            # First, delete references in meal_ingredients
+            conn.execute("DELETE FROM meal_ingredients WHERE ingredient_id = ?", (ing_id,))
+            # Then, delete the ingredient itself
+            conn.execute("DELETE FROM ingredients WHERE id = ?", (ing_id,))
+        forget_ingredients()
+        invalidate_ingredients([ing_id])
+        unindex_ingredient(ing_id)
     except Exception as e:
         print(f"Error deleting ingredient: {e}")
         # Optionally, handle the error in the UI
-    finally:
-        conn.close()
 
     return "" # Return an empty string as the element will be removed from the DOM
 
 @app.route('/search_for_converter', methods=['POST'])
+@query_budget(2)
+@cached_view('ingredients')
 def search_for_converter():
     query = request.form.get('ingredient_name', '').strip().lower()
-    conn = get_db_connection()
-    if query:
-        ingredients = conn.execute(
-            "SELECT * FROM ingredients WHERE name LIKE ? ORDER BY name LIMIT 5",
-            (query + '%',)
-        ).fetchall()
-    else:
-        ingredients = []
-    conn.close()
+    ingredients = search_ingredients(query)
     return render_template('_search_results_for_converter.html', ingredients=ingredients)
 
 @app.route('/calculate_conversion', methods=['POST'])
+@query_budget(3)
 def calculate_conversion():
     try:
         from_quantity = float(request.form['from_quantity'])
@@ -380,6 +501,7 @@ def calculate_conversion():
         return f"<p class='error'>An unexpected error occurred: {e}</p>"
 
 @app.route('/calculate_density', methods=['POST'])
+@query_budget(2)
 def calculate_density():
     try:
         vol_qty = float(request.form['vol_qty'])
@@ -388,29 +510,19 @@ def calculate_density():
         mass_unit = request.form['mass_unit']
 
         # To calculate density in g/ml, we need to convert both quantities to g and ml
-        # We can use our conversion functions, but we don't have an ingredient context.
-        # So we'll do it manually based on the unit_conversions table.
-        conn = get_db_connection()
+        # We don't have an ingredient context, so we use the standard unit conversions.
 
         # Convert volume to ml
-        vol_in_ml = vol_qty
-        if vol_unit != 'ml':
-            res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = 'ml'", (vol_unit,)).fetchone()
-            if not res:
-                conn.close()
-                raise ValueError(f"No conversion factor for {vol_unit} to ml")
-            vol_in_ml = vol_qty * res['factor']
+        factor = get_conversion_factor(vol_unit, 'ml')
+        if factor is None:
+            raise ValueError(f"No conversion factor for {vol_unit} to ml")
+        vol_in_ml = vol_qty * factor
 
         # Convert mass to g
-        mass_in_g = mass_qty
-        if mass_unit != 'g':
-            res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = 'g'", (mass_unit,)).fetchone()
-            if not res:
-                conn.close()
-                raise ValueError(f"No conversion factor for {mass_unit} to g")
-            mass_in_g = mass_qty * res['factor']
-
-        conn.close()
+        factor = get_conversion_factor(mass_unit, 'g')
+        if factor is None:
+            raise ValueError(f"No conversion factor for {mass_unit} to g")
+        mass_in_g = mass_qty * factor
 
         if vol_in_ml == 0:
             raise ValueError("Volume cannot be zero.")
@@ -445,28 +557,19 @@ def get_meal_ingredients(meal_id):
         ORDER BY i.name
     """, (meal_id,)).fetchall()
 
-    # Process the ingredients to add a "pretty" quantity
-    processed_ingredients = []
-    for item in meal_ingredients_raw:
-        item_dict = dict(item)
-        try:
-            # First, convert the recipe quantity (e.g., 1.5 cups) to the base unit (e.g., 180g)
-            base_quantity, base_unit, _ = convert_to_base(item['quantity'], item['unit'], item['ingredient_id'])
-            # Now, convert that base quantity into a nice format (e.g., "1 1/2 cups")
-            # We pass the original density to handle mass-to-volume conversions
-            pretty_quantity = convert_from_base(base_quantity, base_unit, item['density_g_ml'])
-            item_dict['pretty_quantity'] = pretty_quantity
-        except ValueError as e:
-            print(f"Could not create pretty quantity for {item['name']}: {e}")
+    # Convert every row to its base unit and a "pretty" quantity (e.g. "1 1/2 cups") in one pass
+    processed_ingredients, _ = convert_rows_to_base(meal_ingredients_raw, conn=conn)
+    for item in processed_ingredients:
+        if item['pretty_quantity'] is None:
             # Fallback to the original quantity and unit
-            item_dict['pretty_quantity'] = f"{format_fraction(item['quantity'])} {item['unit']}"
-
-        processed_ingredients.append(item_dict)
+            item['pretty_quantity'] = f"{format_fraction(item['quantity'])} {item['unit']}"
 
     conn.close()
     return processed_ingredients
 
 @app.route('/recipe/<int:meal_id>')
+@query_budget(5)
+@cached_view(*RECIPE_TABLES)
 def recipe_editor(meal_id):
     conn = get_db_connection()
     meal = conn.execute("SELECT * FROM meals WHERE id = ?", (meal_id,)).fetchone()
@@ -475,6 +578,7 @@ def recipe_editor(meal_id):
     return render_template('recipe_editor.html', meal=meal, meal_ingredients=meal_ingredients)
 
 @app.route('/add_ingredient_to_meal/<int:meal_id>', methods=['POST'])
+@query_budget(6)
 def add_ingredient_to_meal(meal_id):
     ingredient_name = request.form['q'].strip().lower()
     quantity = request.form['quantity']
@@ -484,29 +588,26 @@ def add_ingredient_to_meal(meal_id):
         # Handle error: all fields required
         return "All fields are required."
 
-    conn = get_db_connection()
-    try:
-        # Find ingredient by name
-        ingredient = conn.execute("SELECT id FROM ingredients WHERE name = ?", (ingredient_name,)).fetchone()
-        if not ingredient:
-            # Optionally, create the ingredient if it doesn't exist
-            return f"Ingredient '{ingredient_name}' not found in pantry."
+    # Find ingredient by name
+    ingredient = lookup_ingredient_by_name(ingredient_name)
+    if not ingredient:
+        # Optionally, create the ingredient if it doesn't exist
+        return f"Ingredient '{ingredient_name}' not found in pantry."
 
-        ingredient_id = ingredient['id']
-        try:
-            ingredient_quantity = float(quantity)
-        except ValueError:
-            return "Invalid quantity."
+    try:
+        ingredient_quantity = float(quantity)
+    except ValueError:
+        return "Invalid quantity."
 
-        conn.execute(
-            "INSERT INTO meal_ingredients (meal_id, ingredient_id, quantity, unit) VALUES (?, ?, ?, ?)",
-            (meal_id, ingredient_id, ingredient_quantity, unit)
-        )
-        conn.commit()
+    try:
+        with unit_of_work() as conn:
+            conn.execute(
+                "INSERT INTO meal_ingredients (meal_id, ingredient_id, quantity, unit) VALUES (?, ?, ?, ?)",
+                (meal_id, ingredient['id'], ingredient_quantity, unit)
+            )
+        invalidate_meals([meal_id])
     except Exception as e:
         print(f"Error adding ingredient to meal: {e}")
-    finally:
-        conn.close()
 
     conn = get_db_connection()
     meal = conn.execute("SELECT * FROM meals WHERE id = ?", (meal_id,)).fetchone()
@@ -514,39 +615,53 @@ def add_ingredient_to_meal(meal_id):
     meal_ingredients = get_meal_ingredients(meal_id)
     return render_template('_meal_ingredients_list.html', meal=meal, meal_ingredients=meal_ingredients)
 
+@app.route('/import_recipe/<int:meal_id>', methods=['POST'])
+@query_budget(8)
+def import_recipe(meal_id):
+    """Adds every line of a pasted ingredient list to one meal."""
+    conn = get_db_connection()
+    meal = conn.execute("SELECT * FROM meals WHERE id = ?", (meal_id,)).fetchone()
+    conn.close()
+    if meal is None:
+        return "Meal not found.", 404
+
+    lines = [line for line in request.form.get('recipe_text', '').splitlines() if line.strip()]
+    summary = import_recipes(((None, line) for line in lines), meal_id=meal_id)
+    meal_ingredients = get_meal_ingredients(meal_id)
+    return (
+        render_template('_meal_ingredients_list.html', meal=meal, meal_ingredients=meal_ingredients)
+        + render_template('_recipe_import_report.html', summary=summary)
+    )
+
 @app.route('/remove_ingredient_from_meal/<int:meal_id>/<int:meal_ingredient_id>', methods=['DELETE'])
+@query_budget(2)
 def remove_ingredient_from_meal(meal_id, meal_ingredient_id):
-    conn = get_db_connection()
     try:
-        conn.execute("DELETE FROM meal_ingredients WHERE id = ?", (meal_ingredient_id,))
-        conn.commit()
+        with unit_of_work() as conn:
+            conn.execute("DELETE FROM meal_ingredients WHERE id = ?", (meal_ingredient_id,))
+        invalidate_meals([meal_id])
     except Exception as e:
         print(f"Error removing ingredient from meal: {e}")
-    finally:
-        conn.close()
     return ""
 
 @app.route('/search_ingredients_for_recipe/<int:meal_id>', methods=['POST'])
+@query_budget(2)
+@cached_view('ingredients')
 def search_ingredients_for_recipe(meal_id):
     query = request.form.get('q', '').strip().lower()
-    conn = get_db_connection()
-    if query:
-        ingredients = conn.execute(
-            "SELECT * FROM ingredients WHERE name LIKE ? ORDER BY name LIMIT 5",
-            (query + '%',)
-        ).fetchall()
-    else:
-        ingredients = []
-    conn.close()
+    ingredients = search_ingredients(query)
     return render_template('_search_results_for_recipe.html', ingredients=ingredients, meal_id=meal_id)
 
 @app.route('/select_ingredient', methods=['POST'])
+@query_budget(0)
 def select_ingredient():
     ingredient_name = request.form['ingredient_name']
     meal_id = request.form['meal_id']
     return f'<input id="ingredient-search-input" type="search" name="q" value="{ingredient_name}" placeholder="Search for an ingredient to add..." hx-post="/search_ingredients_for_recipe/{meal_id}" hx-trigger="keyup changed delay:500ms, search" hx-target="#search-results-for-recipe" hx-swap="innerHTML">'
 
 @app.route('/meal/<int:meal_id>')
+@query_budget(5)
+@cached_view(*RECIPE_TABLES)
 def meal_page(meal_id):
     conn = get_db_connection()
     meal = conn.execute("SELECT * FROM meals WHERE id = ?", (meal_id,)).fetchone()
@@ -555,29 +670,23 @@ def meal_page(meal_id):
     return render_template('meal.html', meal=meal, meal_ingredients=meal_ingredients)
 
 @app.route('/search_ingredients_for_cooking', methods=['POST'])
+@query_budget(2)
+@cached_view('ingredients')
 def search_ingredients_for_cooking():
     query = request.form.get('q', '').strip().lower()
-    conn = get_db_connection()
-    if query:
-        ingredients = conn.execute(
-            "SELECT * FROM ingredients WHERE name LIKE ? ORDER BY name LIMIT 5",
-            (query + '%',)
-        ).fetchall()
-    else:
-        ingredients = []
-    conn.close()
+    ingredients = search_ingredients(query)
     return render_template('_search_results_for_cooking.html', ingredients=ingredients)
 
 @app.route('/add_ingredient_to_cooking_session', methods=['POST'])
+@query_budget(2)
 def add_ingredient_to_cooking_session():
     ingredient_id = request.form['ingredient_id']
     quantity = request.form['quantity']
-    conn = get_db_connection()
-    ingredient = conn.execute("SELECT * FROM ingredients WHERE id = ?", (ingredient_id,)).fetchone()
-    conn.close()
+    ingredient = lookup_ingredient(ingredient_id)
     return render_template('_cooking_session_ingredient.html', ingredient=ingredient, quantity=quantity)
 
 @app.route('/update_pantry', methods=['POST'])
+@query_budget(8)
 def update_pantry():
     # A list of strings like "ingredient_id_quantity_to_deduct"
     ingredients_used = request.form.getlist('ingredient_used')
@@ -585,57 +694,246 @@ def update_pantry():
     if not ingredients_used:
         return "Nothing to update."
 
-    conn = get_db_connection()
     try:
-        with conn: # Use a transaction
-            for item in ingredients_used:
-                ingredient_id, quantity_to_deduct = item.split('_')
-                conn.execute(
-                    "UPDATE ingredients SET quantity = quantity - ? WHERE id = ?",
-                    (float(quantity_to_deduct), int(ingredient_id))
-                )
-        return "<h4>Pantry updated successfully!</h4><p><a href='/'>Back to main page.</a></p>"
+        # The session's key makes a double-submitted form a no-op the second time
+        result = apply_deductions(
+            [parse_deduction(item) for item in ingredients_used],
+            idempotency_key=request.form.get('idempotency_key') or None,
+            prevent_negative=bool(request.form.get('prevent_negative'))
+        )
+    except InsufficientStock as e:
+        return render_template('_pantry_update_report.html', shortages=e.shortages)
     except Exception as e:
         print(f"Error updating pantry: {e}")
         return f"<h4>Error: {e}</h4><p>Could not update pantry.</p>"
-    finally:
-        if conn: conn.close()
+    return render_template('_pantry_update_report.html', result=result)
+
+@app.route('/pantry/deductions', methods=['POST'])
+@query_budget(8)
+def pantry_deductions():
+    """
+    Batch deduction API for machine clients. Takes JSON like
+    {"items": [{"ingredient_id": 1, "quantity": 250}, ...], "prevent_negative": true}
+    with an optional idempotency key in the Idempotency-Key header or an "idempotency_key"
+    field. Answers with the new quantities, or 409 listing the shortages.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'error': "Expected a JSON object"}), 400
+    try:
+        result = apply_deductions(
+            [(item['ingredient_id'], item['quantity']) for item in payload.get('items', [])],
+            idempotency_key=request.headers.get('Idempotency-Key') or payload.get('idempotency_key'),
+            prevent_negative=bool(payload.get('prevent_negative'))
+        )
+    except InsufficientStock as e:
+        return jsonify({'error': str(e), 'shortages': e.shortages}), 409
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'error': f"Invalid deductions: {e}"}), 400
+    return jsonify(result)
 
 @app.route('/recipes')
+@query_budget(3)
+@cached_view('meals')
 def recipes():
-    meals = get_all_meals()
-    return render_template('recipe_manager.html', meals=meals)
+    meals, next_after = get_page('meals')
+    return render_template('recipe_manager.html', meals=meals, next_after=next_after)
+
+@app.route('/meals_list')
+@query_budget(3)
+@cached_view('meals')
+def meals_list():
+    letter = get_letter(request.args.get('letter'))
+    meals, next_after = get_page('meals', letter=letter)
+    return render_template('_meals_list.html', meals=meals, next_after=next_after, letter=letter)
+
+@app.route('/meals_page')
+@query_budget(3)
+@cached_view('meals')
+def meals_page():
+    after = request.args.get('after')
+    letter = get_letter(request.args.get('letter'))
+    meals, next_after = get_page('meals', after, letter)
+    return render_template('_meals_page.html', meals=meals, next_after=next_after, letter=letter, after=after)
 
 @app.route('/add_meal', methods=['POST'])
+@query_budget(3)
 def add_meal():
     meal_name = request.form['meal_name'].strip().lower()
     if meal_name:
-        conn = get_db_connection()
         try:
-            conn.execute("INSERT INTO meals (name) VALUES (?)", (meal_name,))
-            conn.commit()
-        except conn.IntegrityError:
+            with unit_of_work() as conn:
+                cursor = conn.execute("INSERT INTO meals (name) VALUES (?)", (meal_name,))
+            invalidate_meals([cursor.lastrowid])
+        except sqlite3.IntegrityError:
             # Meal already exists
             pass
-        finally:
-            conn.close()
 
-    meals = get_all_meals()
-    return render_template('_meals_list.html', meals=meals)
+    meals, next_after = get_page('meals')
+    return render_template('_meals_list.html', meals=meals, next_after=next_after)
 
 @app.route('/delete_meal/<int:meal_id>', methods=['DELETE'])
+@query_budget(3)
 def delete_meal(meal_id):
-    conn = get_db_connection()
     try:
-        # First, delete references in meal_ingredients
-        conn.execute("DELETE FROM meal_ingredients WHERE meal_id = ?", (meal_id,))
-        # Then, delete the meal itself
-        conn.execute("DELETE FROM meals WHERE id = ?", (meal_id,))
-        conn.commit()
+        with unit_of_work() as conn:
+            # First, delete references in meal_ingredients
+            conn.execute("DELETE FROM meal_ingredients WHERE meal_id = ?", (meal_id,))
+            # Then, delete the meal itself
+            conn.execute("DELETE FROM meals WHERE id = ?", (meal_id,))
+        invalidate_meals([meal_id])
     except Exception as e:
         print(f"Error deleting meal: {e}")
         # Optionally, handle the error in the UI
-    finally:
-        conn.close()
 
     return "" # Return an empty string as the element will be removed from the DOM
+
+@app.route('/export/ingredients.<fmt>')
+def export_pantry(fmt):
+    if fmt not in FORMATS:
+        return f"Unsupported export format '{fmt}'.", 404
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(export_ingredients(fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=pantry.{fmt}'}
+    )
+
+# No query budget: statements grow with the size of the upload
+@app.route('/import/ingredients', methods=['POST'])
+def import_pantry():
+    """
+    Bulk upsert of ingredients from CSV or JSON Lines, either as a multipart 'file' upload
+    or as the raw request body (format taken from ?format= or the Content-Type).
+    """
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        fmt = request.form.get('format') or guess_format(upload.filename)
+    else:
+        stream = request.stream
+        fmt = request.args.get('format') or ('jsonl' if 'json' in request.mimetype else 'csv')
+
+    try:
+        summary = import_ingredients(io.TextIOWrapper(stream, encoding='utf-8', newline=''), fmt)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(summary)
+
+# No query budget: statements grow with the size of the upload
+@app.route('/import/recipes', methods=['POST'])
+def import_recipe_library():
+    """
+    Bulk import of a recipe library (txt, csv or jsonl; see read_recipe_records) as a
+    multipart 'file' upload or the raw request body. Missing meals are created.
+    """
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        fmt = request.form.get('format') or guess_format(upload.filename, default='txt')
+    else:
+        stream = request.stream
+        fmt = request.args.get('format', 'txt')
+
+    try:
+        summary = import_recipes(read_recipe_records(io.TextIOWrapper(stream, encoding='utf-8', newline=''), fmt))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(summary)
+
+@app.route('/planner')
+@query_budget(3)
+@cached_view('meals')
+def planner():
+    meals, next_after = get_page('meals')
+    return render_template('planner.html', meals=meals, next_after=next_after)
+
+@app.route('/planner_meals_page')
+@query_budget(3)
+@cached_view('meals')
+def planner_meals_page():
+    after = request.args.get('after')
+    meals, next_after = get_page('meals', after)
+    return render_template('_planner_meals_page.html', meals=meals, next_after=next_after, after=after)
+
+@app.route('/plan', methods=['POST'])
+@query_budget(3)
+def plan():
+    """
+    Shopping list for many meals at once. Accepts the planner form (portion-<meal_id> fields)
+    or JSON like {"meals": [{"meal_id": 1, "portion": 2}, ...]}, answered with JSON.
+    """
+    meal_portions = {}
+    try:
+        if request.is_json:
+            entries = [(item['meal_id'], item.get('portion', 1)) for item in request.get_json()['meals']]
+        else:
+            entries = [
+                (key[len('portion-'):], value) for key, value in request.form.items(multi=True)
+                if key.startswith('portion-') and value.strip()
+            ]
+        for meal_id, portion in entries:
+            meal_portions[int(meal_id)] = meal_portions.get(int(meal_id), 0) + float(portion)
+        # float() accepts 'inf' and 'nan', which the planner's JSON can't carry
+        if not all(math.isfinite(portion) for portion in meal_portions.values()):
+            raise ValueError("portions must be finite numbers")
+    except (KeyError, TypeError, ValueError) as e:
+        if request.is_json:
+            return jsonify({'error': f"Invalid plan: {e}"}), 400
+        return f"<p class='error'>Invalid plan: {e}</p>", 400
+
+    requirements, missing_conversions = plan_requirements(meal_portions)
+    if request.is_json:
+        # HTML formats amounts in the template; JSON clients get the same strings
+        for total in requirements:
+            total['required_display'] = convert_from_base(total['required'], total['base_unit'], total['density_g_ml'])
+            total['shortfall_display'] = convert_from_base(total['shortfall'], total['base_unit'], total['density_g_ml'])
+        return jsonify({'requirements': requirements, 'missing_conversions': missing_conversions})
+    return render_template('_shopping_list.html', requirements=requirements, missing_conversions=missing_conversions)
+
+@app.route('/cookable')
+@query_budget(6)
+def cookable():
+    """
+    How many portions of every meal the pantry supports right now, and what runs out first.
+    Answered with JSON when the client asks for it (Accept: application/json or ?format=json).
+    """
+    results = evaluate_feasibility()
+    if request.args.get('format') == 'json' or request.accept_mimetypes.best == 'application/json':
+        # JSON has no infinity: a meal without ingredients is reported with null portions,
+        # told apart from an uncomputable one by 'computable'
+        return jsonify({'meals': [
+            dict(result, max_portions=None if result['max_portions'] == math.inf else result['max_portions'])
+            for result in results
+        ]})
+    return render_template('cookable.html', results=results, inf=math.inf)
+
+@app.route('/pantry/as_of')
+@query_budget(3)
+def pantry_as_of_view():
+    """
+    Point-in-time pantry from the inventory ledger. ?at= takes Unix seconds or an ISO date/time;
+    with ?ingredient_id= only that ingredient's quantity is returned.
+    """
+    try:
+        at = parse_timestamp(request.args['at'])
+        ingredient_id = request.args.get('ingredient_id', type=int)
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f"Invalid request: {e}"}), 400
+    flush_pending()
+    if ingredient_id is not None:
+        return jsonify({'at': at, 'ingredient_id': ingredient_id, 'quantity': quantity_as_of(ingredient_id, at)})
+    return jsonify({'at': at, 'ingredients': pantry_as_of(at)})
+
+@app.route('/ingredient/<int:ing_id>/history')
+@query_budget(2)
+def ingredient_history_view(ing_id):
+    limit = min(request.args.get('limit', 50, type=int), 1000)
+    flush_pending()
+    return jsonify({'ingredient_id': ing_id, 'events': ingredient_history(ing_id, limit)})
+
+@app.route('/metrics')
+@query_budget(1)
+def metrics():
+    """Request, SQL and conversion metrics in the Prometheus text format."""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
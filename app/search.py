@@ -0,0 +1,90 @@
+import threading
+from bisect import bisect_left
+
+from app.database import get_db_connection, database_state, peek_database_state
+
+class _SearchIndex:
+    """
+    One database's ingredient names kept sorted, so a prefix search is a binary search
+    plus a short scan. entries runs parallel to names; names_by_id lets renames and
+    deletes find their slot. Everything is None until the first search loads it.
+    """
+    def __init__(self):
+        self.names = None
+        self.entries = None
+        self.names_by_id = None
+        self.lock = threading.Lock()
+
+    def ensure_loaded(self):
+        # Must be called with the lock held.
+        if self.names is None:
+            conn = get_db_connection()
+            rows = conn.execute("SELECT id, name, base_unit FROM ingredients ORDER BY name").fetchall()
+            conn.close()
+            self.names = [row['name'] for row in rows]
+            self.entries = [{'id': row['id'], 'name': row['name'], 'base_unit': row['base_unit']} for row in rows]
+            self.names_by_id = {row['id']: row['name'] for row in rows}
+
+    def remove(self, ingredient_id):
+        name = self.names_by_id.pop(ingredient_id, None)
+        if name is None:
+            return
+        position = bisect_left(self.names, name)
+        if position < len(self.names) and self.names[position] == name:
+            del self.names[position]
+            del self.entries[position]
+
+def _index():
+    return database_state('search_index', _SearchIndex)
+
+def search_ingredients(query, limit=5):
+    """
+    Returns up to `limit` ingredients whose name starts with `query`, ordered by name.
+    Each result is a dict with id, name and base_unit.
+    """
+    if not query:
+        return []
+    index = _index()
+    with index.lock:
+        index.ensure_loaded()
+        names = index.names
+        results = []
+        position = bisect_left(names, query)
+        while position < len(names) and len(results) < limit and names[position].startswith(query):
+            results.append(index.entries[position])
+            position += 1
+        return results
+
+def index_ingredient(ingredient_id, name, base_unit):
+    """
+    Adds an ingredient to the index, or updates it after a rename.
+    Call after the insert or update has been committed.
+    """
+    index = _index()
+    with index.lock:
+        if index.names is None:
+            # Nothing loaded yet; the first search will read the committed row.
+            return
+        index.remove(ingredient_id)
+        position = bisect_left(index.names, name)
+        index.names.insert(position, name)
+        index.entries.insert(position, {'id': ingredient_id, 'name': name, 'base_unit': base_unit})
+        index.names_by_id[ingredient_id] = name
+
+def unindex_ingredient(ingredient_id):
+    """
+    Removes a deleted ingredient from the index.
+    """
+    index = _index()
+    with index.lock:
+        if index.names is not None:
+            index.remove(ingredient_id)
+
+def invalidate_search_index():
+    """
+    Drops the index so it is rebuilt from the ingredients table on next use.
+    """
+    index = peek_database_state('search_index')
+    if index is not None:
+        with index.lock:
+            index.names = index.entries = index.names_by_id = None
@@ -0,0 +1,177 @@
+import random
+
+from app.database import get_db_connection, invalidate_caches, deferred_lookup_indexes
+
+# Ingredient kinds as (base_unit, base_unit_type, share of ingredients, density range in g/ml
+# or None, units recipes give it in).
+INGREDIENT_KINDS = (
+    ('g', 'mass', 0.45, (0.35, 1.3), ('g', 'kg', 'oz', 'lb', 'cup', 'tbsp', 'tsp')),
+    ('ml', 'volume', 0.35, (0.85, 1.4), ('ml', 'l', 'cup', 'tbsp', 'tsp')),
+    ('unit', 'count', 0.20, None, ('unit',)),
+)
+# Share of mass ingredients stored without a density; recipes give those by weight only.
+UNDENSE_MASS_SHARE = 0.2
+# Share of count ingredients with an ingredient-specific conversion from grams or cups,
+# so recipes can give them by weight ("200 g mushrooms") or volume ("1 cup cherry tomatoes").
+WEIGHED_COUNT_SHARE = 0.3
+MEASURED_COUNT_SHARE = 0.1
+# How many ingredients a meal has: (minimum, most common, maximum).
+DEFAULT_INGREDIENTS_PER_MEAL = (3, 8, 15)
+# Above this many meals the recipe indexes are rebuilt once rather than updated per row.
+BULK_INDEX_THRESHOLD = 10000
+
+# Typical recipe amounts per unit, as (low, high)
+RECIPE_AMOUNTS = {
+    'g': (5, 500), 'kg': (0.25, 2), 'oz': (1, 16), 'lb': (0.5, 3),
+    'ml': (10, 500), 'l': (0.25, 2), 'cup': (0.25, 3), 'tbsp': (0.5, 4), 'tsp': (0.25, 3),
+    'unit': (1, 6),
+}
+
+_ADJECTIVES = (
+    'smoked', 'dried', 'fresh', 'ground', 'roasted', 'wild', 'red', 'green', 'black', 'white',
+    'sweet', 'hot', 'toasted', 'pickled', 'organic', 'golden', 'baby', 'whole', 'crushed', 'brown',
+)
+_FOODS = (
+    'almond', 'apple', 'barley', 'basil', 'bean', 'beet', 'butter', 'cabbage', 'carrot', 'cashew',
+    'celery', 'cheese', 'chili', 'cocoa', 'coconut', 'corn', 'cream', 'cumin', 'date', 'fennel',
+    'garlic', 'ginger', 'honey', 'kale', 'leek', 'lentil', 'lime', 'maple', 'millet', 'mushroom',
+    'mustard', 'oat', 'olive', 'onion', 'paprika', 'pea', 'pepper', 'potato', 'quinoa', 'rice',
+    'rye', 'sage', 'sesame', 'spinach', 'squash', 'thyme', 'tomato', 'walnut', 'yogurt', 'zucchini',
+)
+_DISHES = ('soup', 'stew', 'salad', 'pie', 'bake', 'curry', 'bowl', 'tart', 'risotto', 'pancakes')
+
+def _unique_names(rng, count, word_lists, taken):
+    """
+    Yields `count` distinct names not in `taken`, made of one word from each list. Once every
+    combination is used they repeat with a number appended.
+    """
+    combinations = ['']
+    for words in word_lists:
+        combinations = [f"{prefix} {word}".strip() for prefix in combinations for word in words]
+    rng.shuffle(combinations)
+    produced = 0
+    number = 0
+    while produced < count:
+        name = combinations[number % len(combinations)]
+        rounds = number // len(combinations)
+        if rounds:
+            name = f"{name} {rounds}"
+        number += 1
+        if name not in taken:
+            produced += 1
+            yield name
+
+def _recipe_amount(random_fraction, unit):
+    low, high = RECIPE_AMOUNTS[unit]
+    amount = low + (high - low) * random_fraction
+    # Whole numbers of units, quarters of small measures and round gram/ml figures
+    if unit == 'unit':
+        return round(amount)
+    if high <= 16:
+        return max(round(amount * 4) / 4, 0.25)
+    return round(amount, -1) or low
+
+def generate_dataset(ingredients=1000, meals=100, ingredients_per_meal=DEFAULT_INGREDIENTS_PER_MEAL, seed=0):
+    """
+    Adds a synthetic but plausible dataset on top of whatever is already stored:
+
+    - `ingredients` ingredients with a mix of mass, volume and count base units, realistic
+      densities and stock levels;
+    - ingredient_conversions from grams or cups for some count ingredients;
+    - `meals` meals whose number of ingredients follows a triangular distribution over
+      `ingredients_per_meal` (minimum, most common, maximum), with recipe lines in units
+      that suit each ingredient.
+
+    The same arguments and seed always produce the same rows. Everything is streamed into
+    executemany calls inside one transaction. Returns the number of rows added per table.
+    """
+    rng = random.Random(seed)
+    low, mode, high = ingredients_per_meal
+    counts = {'ingredients': 0, 'ingredient_conversions': 0, 'meals': 0, 'meal_ingredients': 0}
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN")
+
+        # Ingredients, remembering which units recipes may give each one in
+        taken = {row['name'] for row in conn.execute("SELECT name FROM ingredients")}
+        ingredient_rows = []
+        ingredient_units = []
+        conversions = []
+        kind_weights = [kind[2] for kind in INGREDIENT_KINDS]
+        for name in _unique_names(rng, ingredients, (_ADJECTIVES, _FOODS), taken):
+            base_unit, base_unit_type, _, densities, units = rng.choices(INGREDIENT_KINDS, kind_weights)[0]
+            density = None
+            if densities:
+                density = round(rng.uniform(*densities), 3)
+            if base_unit_type == 'mass' and rng.random() < UNDENSE_MASS_SHARE:
+                density = None
+                units = ('g', 'kg', 'oz', 'lb')
+            elif base_unit_type == 'count':
+                share = rng.random()
+                if share < WEIGHED_COUNT_SHARE:
+                    units = ('unit', 'g')
+                    conversions.append((len(ingredient_rows), 'g', 'unit', round(1 / rng.uniform(20, 300), 6)))
+                elif share < WEIGHED_COUNT_SHARE + MEASURED_COUNT_SHARE:
+                    units = ('unit', 'cup')
+                    conversions.append((len(ingredient_rows), 'cup', 'unit', round(rng.uniform(2, 12), 1)))
+            stock = rng.randint(0, 48) if base_unit_type == 'count' else round(rng.uniform(0, 5000), 1)
+            ingredient_rows.append((name, stock, base_unit, base_unit_type, density))
+            ingredient_units.append(units)
+
+        first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM ingredients").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO ingredients (name, quantity, base_unit, base_unit_type, density_g_ml) VALUES (?, ?, ?, ?, ?)",
+            ingredient_rows
+        )
+        # Rows are inserted in order, so their ids follow the list
+        ingredient_ids = [row[0] for row in conn.execute("SELECT id FROM ingredients WHERE id >= ? ORDER BY id", (first_id,))]
+        conn.executemany(
+            "INSERT INTO ingredient_conversions (ingredient_id, from_unit, to_unit, factor) VALUES (?, ?, ?, ?)",
+            ((ingredient_ids[index], from_unit, to_unit, factor) for index, from_unit, to_unit, factor in conversions)
+        )
+        counts['ingredients'] = len(ingredient_ids)
+        counts['ingredient_conversions'] = len(conversions)
+
+        # Meals and their recipe lines
+        taken = {row['name'] for row in conn.execute("SELECT name FROM meals")}
+        first_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM meals").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO meals (name) VALUES (?)",
+            ((name,) for name in _unique_names(rng, meals, (_ADJECTIVES, _FOODS, _DISHES), taken))
+        )
+        meal_ids = [row[0] for row in conn.execute("SELECT id FROM meals WHERE id >= ? ORDER BY id", (first_id,))]
+        counts['meals'] = len(meal_ids)
+
+        def recipe_lines():
+            # The hot loop of a large dataset, so it draws from rng.random() directly
+            draw = rng.random
+            available = len(ingredient_ids)
+            for meal_id in meal_ids:
+                size = min(available, max(low, round(rng.triangular(low, high, mode))))
+                if size * 4 < available:
+                    chosen = {}
+                    while len(chosen) < size:
+                        chosen[int(draw() * available)] = None
+                else:
+                    chosen = rng.sample(range(available), size)
+                for index in chosen:
+                    units = ingredient_units[index]
+                    unit = units[int(draw() * len(units))]
+                    yield meal_id, ingredient_ids[index], _recipe_amount(draw(), unit), unit
+
+        insert_sql = "INSERT INTO meal_ingredients (meal_id, ingredient_id, quantity, unit) VALUES (?, ?, ?, ?)"
+        if len(meal_ids) >= BULK_INDEX_THRESHOLD:
+            with deferred_lookup_indexes(conn):
+                cursor = conn.executemany(insert_sql, recipe_lines())
+        else:
+            cursor = conn.executemany(insert_sql, recipe_lines())
+        counts['meal_ingredients'] = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    invalidate_caches()
+    return counts
@@ -0,0 +1,104 @@
+import os
+import re
+import threading
+
+from flask import request
+
+from app.database import init_db, seed_db, database_state, set_current_database, using_database
+
+# Households are named like DNS labels, which also keeps them safe as file names.
+TENANT_KEY_PATTERN = re.compile(r'^[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?$')
+DEFAULT_TENANT_HEADER = 'X-Pantry-Tenant'
+# Requests under /h/<household>/... are routed to that household with the prefix removed.
+TENANT_PATH_PREFIX = '/h/'
+# Endpoints that read no household's data: static files, and the metrics, which are
+# process-wide. They are served without a household, like with households disabled.
+TENANTLESS_ENDPOINTS = ('static', 'metrics')
+
+# Database files migrated (and seeded if new) by this process
+_prepared = set()
+_prepare_locks = {}
+_prepare_locks_lock = threading.Lock()
+
+class TenantPathMiddleware:
+    """
+    WSGI middleware that takes the household from a /h/<household>/ path prefix and
+    moves the prefix into SCRIPT_NAME, so routes see their usual paths. Only active
+    while households are enabled.
+    """
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if self.app.config.get('TENANT_DIRECTORY') and path.startswith(TENANT_PATH_PREFIX):
+            key, _, rest = path[len(TENANT_PATH_PREFIX):].partition('/')
+            environ['pantry.tenant'] = key
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + TENANT_PATH_PREFIX + key
+            environ['PATH_INFO'] = '/' + rest
+        return self.wsgi_app(environ, start_response)
+
+def tenant_key(config):
+    """
+    The household the current request is for: from the path prefix, then the tenant
+    header, then the subdomain of TENANT_DOMAIN. Returns None if none is given.
+    """
+    key = request.environ.get('pantry.tenant')
+    if not key:
+        key = request.headers.get(config.get('TENANT_HEADER', DEFAULT_TENANT_HEADER))
+    domain = config.get('TENANT_DOMAIN')
+    if not key and domain:
+        host = request.host.split(':')[0]
+        if host.endswith('.' + domain):
+            key = host[:-len(domain) - 1]
+    return key.strip().lower() if key else None
+
+def tenant_database(directory, key):
+    """The database file of a household, or None if `key` isn't a valid household name."""
+    if not key or not TENANT_KEY_PATTERN.match(key):
+        return None
+    return os.path.join(directory, f"{key}.db")
+
+def prepare_tenant(path):
+    """
+    Migrates a household's database, and seeds it if it is new, the first time this
+    process uses it. Households being prepared don't wait for each other.
+    """
+    if path in _prepared:
+        return
+    with _prepare_locks_lock:
+        lock = _prepare_locks.setdefault(path, threading.Lock())
+    with lock:
+        if path in _prepared:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with using_database(path):
+            if init_db():
+                seed_db()
+            # Registers the database for the background snapshot and checkpoint threads
+            database_state('tenant', lambda: path)
+        _prepared.add(path)
+
+def init_tenants(app):
+    """
+    Serves each household from its own SQLite file in app.config['TENANT_DIRECTORY'],
+    so their writes never contend on one lock. Off (a single DATABASE) when unset.
+    """
+    app.wsgi_app = TenantPathMiddleware(app, app.wsgi_app)
+
+    @app.before_request
+    def select_tenant():
+        directory = app.config.get('TENANT_DIRECTORY')
+        if not directory or request.endpoint in TENANTLESS_ENDPOINTS:
+            return None
+        path = tenant_database(directory, tenant_key(app.config))
+        if path is None:
+            return "Unknown household.", 404
+        prepare_tenant(path)
+        set_current_database(path)
+        return None
+
+    @app.teardown_request
+    def reset_tenant(exception=None):
+        set_current_database(None)
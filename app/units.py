@@ -1,4 +1,90 @@
-from app.database import get_db_connection
+import threading
+from bisect import bisect_left, bisect_right
+from collections import deque
+from functools import lru_cache
+
+from app.database import get_db_connection, database_state, peek_database_state
+from app.identity_map import lookup_ingredient
+from app.metrics import timed_conversion
+
+# The unit every quantity of a given type is normalised to.
+BASE_UNITS = {'mass': 'g', 'volume': 'ml', 'count': 'unit'}
+
+class _ConversionGraph:
+    """
+    One database's compiled conversion graph, {unit: (unit_type, factor_to_base)} built
+    from unit_conversions on first use, and the display tables derived from it.
+    """
+    def __init__(self):
+        self.graph = None
+        self.display_tables = None
+        self.lock = threading.Lock()
+
+def _build_conversion_graph(rows):
+    """
+    Turns (from_unit, to_unit, factor) rows into {unit: (unit_type, factor_to_base)}.
+    Each row is an edge usable in both directions; walking outward from each base
+    unit gives the transitive closure, so lb -> g -> oz works without a direct row.
+    """
+    edges = {}
+    for from_unit, to_unit, factor in rows:
+        if not factor:
+            continue
+        # 1 from_unit = factor to_unit
+        edges.setdefault(to_unit, []).append((from_unit, factor))
+        edges.setdefault(from_unit, []).append((to_unit, 1 / factor))
+
+    graph = {}
+    for unit_type, base_unit in BASE_UNITS.items():
+        graph[base_unit] = (unit_type, 1.0)
+        queue = deque([base_unit])
+        while queue:
+            unit = queue.popleft()
+            factor_to_base = graph[unit][1]
+            for neighbour, multiplier in edges.get(unit, ()):
+                if neighbour not in graph:
+                    graph[neighbour] = (unit_type, multiplier * factor_to_base)
+                    queue.append(neighbour)
+    return graph
+
+def get_conversion_graph():
+    """
+    Returns the compiled conversion graph, loading unit_conversions on first use.
+    """
+    cache = database_state('conversion_graph', _ConversionGraph)
+    graph = cache.graph
+    if graph is None:
+        with cache.lock:
+            if cache.graph is None:
+                conn = get_db_connection()
+                rows = conn.execute("SELECT from_unit, to_unit, factor FROM unit_conversions").fetchall()
+                conn.close()
+                cache.graph = _build_conversion_graph(rows)
+            graph = cache.graph
+    return graph
+
+def invalidate_conversion_graph():
+    """
+    Drops the compiled graph. Must be called whenever unit_conversions changes.
+    """
+    cache = peek_database_state('conversion_graph')
+    if cache is not None:
+        with cache.lock:
+            cache.graph = cache.display_tables = None
+
+def get_conversion_factor(from_unit, to_unit):
+    """
+    Returns the factor such that 1 from_unit = factor to_unit, or None if the
+    units are unknown or belong to different types (e.g. mass and volume).
+    """
+    if from_unit == to_unit:
+        return 1.0
+    graph = get_conversion_graph()
+    source = graph.get(from_unit)
+    target = graph.get(to_unit)
+    if not source or not target or source[0] != target[0]:
+        return None
+    return source[1] / target[1]
 
 def get_base_unit_type(unit):
     """
@@ -16,6 +102,33 @@ def get_base_unit_type(unit):
         return 'count'
     return None
 
+# Spellings accepted in free-text recipes, mapped to the units the app stores.
+# Case matters only for the single-letter 'T' (tablespoon) and 't' (teaspoon).
+UNIT_ALIASES = {
+    'T': 'tbsp', 't': 'tsp',
+    'g': 'g', 'gr': 'g', 'gram': 'g', 'grams': 'g', 'gramme': 'g', 'grammes': 'g',
+    'kg': 'kg', 'kgs': 'kg', 'kilo': 'kg', 'kilos': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz',
+    'ml': 'ml', 'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml',
+    'l': 'l', 'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l',
+    'cc': 'cc',
+    'cup': 'cup', 'cups': 'cup', 'c': 'cup',
+    'tbsp': 'tbsp', 'tbsps': 'tbsp', 'tbs': 'tbsp', 'tablespoon': 'tbsp', 'tablespoons': 'tbsp',
+    'tsp': 'tsp', 'tsps': 'tsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'gallon': 'gallon', 'gallons': 'gallon', 'gal': 'gallon',
+    'quart': 'quart', 'quarts': 'quart', 'qt': 'quart',
+    'pint': 'pint', 'pints': 'pint', 'pt': 'pint',
+    'unit': 'unit', 'units': 'unit', 'piece': 'unit', 'pieces': 'unit', 'whole': 'unit',
+}
+
+def canonical_unit(word):
+    """Maps a unit as written in a recipe ('Tablespoons', 'c.', 'T') to a stored unit, or None."""
+    word = word.strip().rstrip('.')
+    if word in UNIT_ALIASES:
+        return UNIT_ALIASES[word]
+    return UNIT_ALIASES.get(word.lower())
+
 def get_base_unit(unit_type):
     """Returns the base unit for a given type."""
     if unit_type == 'mass':
@@ -26,50 +139,34 @@ def get_base_unit(unit_type):
         return 'unit'
     return None
 
-def convert_to_base(quantity, unit, ingredient_id=None):
+def _convert_to_base_standard(quantity, unit, ingredient):
     """
-    Converts a given quantity and unit to its base unit quantity.
-    Returns (converted_quantity, base_unit, base_unit_type)
+    The I/O-free part of convert_to_base, using only the conversion graph and density.
+    `ingredient` is any mapping with name, base_unit, base_unit_type and density_g_ml, or None.
+    Returns (converted_quantity, base_unit, base_unit_type), or None when only an
+    ingredient-specific conversion could help.
     """
-    unit = unit.lower().strip()
-    conn = get_db_connection()
-
-    ingredient = None
-    if ingredient_id:
-        ingredient = conn.execute("SELECT * FROM ingredients WHERE id = ?", (ingredient_id,)).fetchone()
-
     source_unit_type = get_base_unit_type(unit)
     target_base_unit = ingredient['base_unit'] if ingredient else get_base_unit(source_unit_type)
     target_base_unit_type = ingredient['base_unit_type'] if ingredient else source_unit_type
 
     if not source_unit_type:
-        conn.close()
         raise ValueError(f"Unknown unit type for '{unit}'")
     if not target_base_unit_type:
-        conn.close()
         raise ValueError(f"Could not determine target unit type.")
 
     if unit == target_base_unit:
-        conn.close()
         return (quantity, target_base_unit, target_base_unit_type)
 
     # Case 1: Same unit type (e.g., mass to mass, volume to volume)
     if source_unit_type == target_base_unit_type:
-        # Direct conversion
-        res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = ?", (unit, target_base_unit)).fetchone()
-        if res:
-            conn.close()
-            return (quantity * res['factor'], target_base_unit, target_base_unit_type)
-        # Reverse conversion
-        res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = ?", (target_base_unit, unit)).fetchone()
-        if res:
-            conn.close()
-            return (quantity / res['factor'], target_base_unit, target_base_unit_type)
+        factor = get_conversion_factor(unit, target_base_unit)
+        if factor is not None:
+            return (quantity * factor, target_base_unit, target_base_unit_type)
 
     # Case 2: Different unit types (mass to volume or volume to mass)
     if source_unit_type != target_base_unit_type and {source_unit_type, target_base_unit_type} == {'mass', 'volume'}:
         if not ingredient or not ingredient['density_g_ml']:
-            conn.close()
             # This is the error that the user was seeing.
             raise ValueError(f"Cannot convert between mass and volume for '{ingredient['name'] if ingredient else 'this ingredient'}' without a density.")
 
@@ -80,61 +177,183 @@ def convert_to_base(quantity, unit, ingredient_id=None):
 
         # Step 1: Convert source unit to ml
         if source_unit_type == 'volume':
-            if unit == 'ml':
-                quantity_in_ml = quantity
-            else:
-                res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = 'ml'", (unit,)).fetchone()
-                if not res:
-                    conn.close()
-                    raise ValueError(f"No standard conversion factor found for '{unit}' to 'ml'")
-                quantity_in_ml = quantity * res['factor']
+            factor = get_conversion_factor(unit, 'ml')
+            if factor is None:
+                raise ValueError(f"No standard conversion factor found for '{unit}' to 'ml'")
+            quantity_in_ml = quantity * factor
         elif source_unit_type == 'mass': # We need to get to ml via g and density
-             # First convert to 'g'
-            quantity_in_g = 0
-            if unit == 'g':
-                quantity_in_g = quantity
-            else:
-                res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = 'g'", (unit,)).fetchone()
-                if not res:
-                    conn.close()
-                    raise ValueError(f"No standard conversion factor found for '{unit}' to 'g'")
-                quantity_in_g = quantity * res['factor']
-            quantity_in_ml = quantity_in_g / density
+            factor = get_conversion_factor(unit, 'g')
+            if factor is None:
+                raise ValueError(f"No standard conversion factor found for '{unit}' to 'g'")
+            quantity_in_ml = quantity * factor / density
 
         # At this point, we have quantity_in_ml. Now convert to the target base unit.
         if target_base_unit_type == 'volume': # Target is ml
-             conn.close()
-             return (quantity_in_ml, 'ml', 'volume')
+            return (quantity_in_ml, 'ml', 'volume')
         elif target_base_unit_type == 'mass': # Target is g
             quantity_in_g = quantity_in_ml * density
-            conn.close()
             return (quantity_in_g, 'g', 'mass')
 
+    return None
+
+def _convert_with_ingredient_factor(quantity, unit, base_unit, factors):
+    """
+    Applies an ingredient-specific conversion from `factors`, a dict of
+    {(from_unit, to_unit): factor}. Returns the base quantity or None.
+    """
+    factor = factors.get((unit, base_unit))
+    if factor:
+        return quantity * factor
+    factor = factors.get((base_unit, unit))
+    if factor:
+        return quantity / factor
+    return None
+
+@timed_conversion
+def convert_to_base(quantity, unit, ingredient_id=None):
+    """
+    Converts a given quantity and unit to its base unit quantity.
+    Returns (converted_quantity, base_unit, base_unit_type)
+    """
+    unit = unit.lower().strip()
+
+    ingredient = lookup_ingredient(ingredient_id) if ingredient_id else None
+
+    result = _convert_to_base_standard(quantity, unit, ingredient)
+    if result is not None:
+        return result
+
+    target_base_unit = ingredient['base_unit'] if ingredient else get_base_unit(get_base_unit_type(unit))
+    target_base_unit_type = ingredient['base_unit_type'] if ingredient else get_base_unit_type(unit)
+
     # Fallback for other cases, like ingredient-specific non-density conversions
     if ingredient_id:
-        res = conn.execute("SELECT factor FROM ingredient_conversions WHERE ingredient_id = ? AND from_unit = ? AND to_unit = ?", (ingredient_id, unit, target_base_unit)).fetchone()
-        if res:
-            conn.close()
-            return (quantity * res['factor'], target_base_unit, target_base_unit_type)
-        res = conn.execute("SELECT factor FROM ingredient_conversions WHERE ingredient_id = ? AND from_unit = ? AND to_unit = ?", (ingredient_id, target_base_unit, unit)).fetchone()
-        if res:
-            conn.close()
-            return (quantity / res['factor'], target_base_unit, target_base_unit_type)
+        conn = get_db_connection()
+        rows = conn.execute(
+            "SELECT from_unit, to_unit, factor FROM ingredient_conversions WHERE ingredient_id = ? AND from_unit IN (?, ?) AND to_unit IN (?, ?)",
+            (ingredient_id, unit, target_base_unit, unit, target_base_unit)
+        ).fetchall()
+        conn.close()
+        factors = {(row['from_unit'], row['to_unit']): row['factor'] for row in rows}
+        converted_quantity = _convert_with_ingredient_factor(quantity, unit, target_base_unit, factors)
+        if converted_quantity is not None:
+            return (converted_quantity, target_base_unit, target_base_unit_type)
 
-    conn.close()
     raise ValueError(f"No conversion factor found for '{unit}' to '{target_base_unit}'")
 
+@timed_conversion
+def normalize_quantity(quantity, unit, density_g_ml=None, stored=None):
+    """
+    Converts a quantity for a new ingredient to the base unit it would be stored in,
+    without touching the database. Like the density prompt, anything with a density
+    is stored in grams; without one, mass goes to 'g', volume to 'ml' and counts to 'unit'.
+
+    `stored` is the existing ingredient of that name, if any: a mapping with name,
+    base_unit, base_unit_type and density_g_ml. Its base unit is kept, and its density
+    used when `density_g_ml` isn't given; a quantity that can't be converted into that
+    unit raises ValueError.
+    Returns (converted_quantity, base_unit, base_unit_type)
+    """
+    unit = unit.lower().strip()
+    unit_type = get_base_unit_type(unit)
+    if not unit_type:
+        raise ValueError(f"Unknown unit type for '{unit}'")
+    if stored and stored['base_unit_type']:
+        target = {
+            'name': stored['name'],
+            'base_unit': stored['base_unit'],
+            'base_unit_type': stored['base_unit_type'],
+            'density_g_ml': density_g_ml or stored['density_g_ml']
+        }
+        result = _convert_to_base_standard(quantity, unit, target)
+        if result is None:
+            raise ValueError(f"No conversion factor found for '{unit}' to '{stored['base_unit']}'")
+        return result
+    if density_g_ml and unit_type in ('mass', 'volume'):
+        unit_type = 'mass'
+    target = {
+        'name': None,
+        'base_unit': get_base_unit(unit_type),
+        'base_unit_type': unit_type,
+        'density_g_ml': density_g_ml
+    }
+    result = _convert_to_base_standard(quantity, unit, target)
+    if result is None:
+        raise ValueError(f"No conversion factor found for '{unit}' to '{target['base_unit']}'")
+    return result
+
+@timed_conversion
+def convert_rows_to_base(rows, multiplier=1, conn=None):
+    """
+    Converts many joined meal_ingredients/ingredients rows to their base units in one pass.
+    Each row must provide ingredient_id, name, quantity, unit, base_unit, base_unit_type
+    and density_g_ml, so no ingredient has to be fetched again. `multiplier` scales every
+    quantity (e.g. the portion being cooked).
+
+    Returns (items, missing_conversions). `items` has one dict per row: the row's columns
+    plus base_quantity and pretty_quantity, both None when the row could not be converted.
+    `missing_conversions` lists the failed rows as {name, unit, base_unit}.
+    Ingredient-specific conversions are looked up with one query, and only if a row needs them.
+    """
+    items = []
+    pending = []
+    for row in rows:
+        item = dict(row)
+        item['base_quantity'] = None
+        item['pretty_quantity'] = None
+        items.append(item)
+        try:
+            result = _convert_to_base_standard(item['quantity'] * multiplier, item['unit'].lower().strip(), item)
+        except ValueError as e:
+            print(f"Could not convert {item['name']}: {e}")
+            continue
+        if result is None:
+            pending.append(item)
+        else:
+            item['base_quantity'] = result[0]
+
+    if pending:
+        ingredient_ids = sorted({item['ingredient_id'] for item in pending})
+        placeholders = ', '.join('?' for _ in ingredient_ids)
+        owns_connection = conn is None
+        if owns_connection:
+            conn = get_db_connection()
+        factor_rows = conn.execute(
+            f"SELECT ingredient_id, from_unit, to_unit, factor FROM ingredient_conversions WHERE ingredient_id IN ({placeholders})",
+            ingredient_ids
+        ).fetchall()
+        if owns_connection:
+            conn.close()
+        factors = {}
+        for row in factor_rows:
+            factors.setdefault(row['ingredient_id'], {})[(row['from_unit'], row['to_unit'])] = row['factor']
+        for item in pending:
+            item['base_quantity'] = _convert_with_ingredient_factor(
+                item['quantity'] * multiplier, item['unit'].lower().strip(), item['base_unit'],
+                factors.get(item['ingredient_id'], {})
+            )
+
+    missing_conversions = []
+    for item in items:
+        if item['base_quantity'] is None:
+            missing_conversions.append({
+                "name": item['name'],
+                "unit": item['unit'],
+                "base_unit": item['base_unit']
+            })
+        else:
+            item['pretty_quantity'] = convert_from_base(item['base_quantity'], item['base_unit'], item['density_g_ml'])
+
+    return items, missing_conversions
+
 def needs_conversion_prompt(unit, ingredient_id):
     """
     Checks if we need to prompt the user for a mass-to-volume conversion.
     This happens when a user enters a unit of a different type than the stored
     base unit type for an ingredient (e.g., adding 'cups' to 'flour' which is stored in 'g').
     """
-    conn = get_db_connection()
-    ingredient = conn.execute("SELECT * FROM ingredients WHERE id = ?", (ingredient_id,)).fetchone()
-
+    ingredient = lookup_ingredient(ingredient_id)
     if not ingredient:
-        conn.close()
         return False
 
     current_base_type = ingredient['base_unit_type']
@@ -144,6 +363,7 @@ def needs_conversion_prompt(unit, ingredient_id):
     if current_base_type != new_unit_type and {current_base_type, new_unit_type} == {'mass', 'volume'}:
         # Before prompting, check if a conversion already exists
         base_unit = ingredient['base_unit']
+        conn = get_db_connection()
         # Direct
         res = conn.execute(
             "SELECT factor FROM ingredient_conversions WHERE ingredient_id = ? AND from_unit = ? AND to_unit = ?",
@@ -164,7 +384,6 @@ def needs_conversion_prompt(unit, ingredient_id):
         conn.close()
         return True # Conversion needed
 
-    conn.close()
     return False
 
 def get_conversion_prompt_html(ingredient_id, original_quantity, original_unit, pending_quantity):
@@ -172,10 +391,7 @@ def get_conversion_prompt_html(ingredient_id, original_quantity, original_unit,
     Generates HTML for a conversion prompt.
     `pending_quantity` is the amount in the base unit that we couldn't convert.
     """
-    conn = get_db_connection()
-    ingredient = conn.execute("SELECT * FROM ingredients WHERE id = ?", (ingredient_id,)).fetchone()
-    conn.close()
-
+    ingredient = lookup_ingredient(ingredient_id)
     if not ingredient:
         return "Error: Ingredient not found."
 
@@ -183,7 +399,7 @@ def get_conversion_prompt_html(ingredient_id, original_quantity, original_unit,
     <div id="conversion-prompt" class="conversion-prompt">
         <h4>Conversion Needed</h4>
         <p>How many grams are in 1 {original_unit} of {ingredient['name']}?</p>
-        <form hx-post="/add_conversion" hx-target="#ingredient-list-container" hx-swap="innerHTML">
+        <form hx-post="/add_conversion" hx-target="#ingredient-list-container" hx-swap="innerHTML" hx-include="#ingredient-list-version, #ingredient-list-letter">
             <input type="hidden" name="ingredient_id" value="{ingredient_id}">
             <input type="hidden" name="from_unit" value="{original_unit}">
             <input type="hidden" name="to_unit" value="{ingredient['base_unit']}">
@@ -204,7 +420,7 @@ def get_new_ingredient_conversion_prompt_html(ingredient_name, original_quantity
     <div id="conversion-prompt" class="conversion-prompt">
         <h4>New Ingredient: Density Needed</h4>
         <p>To allow for conversions between mass and volume (e.g., cups to grams), please provide the density for <strong>{ingredient_name}</strong>.</p>
-        <form hx-post="/add_new_ingredient_with_density" hx-target="#ingredient-list-container" hx-swap="innerHTML" hx-on:htmx:after-request="this.closest('#conversion-prompt').remove()">
+        <form hx-post="/add_new_ingredient_with_density" hx-target="#ingredient-list-container" hx-swap="innerHTML" hx-include="#ingredient-list-version, #ingredient-list-letter" hx-on:htmx:after-request="this.closest('#conversion-prompt').remove()">
             <input type="hidden" name="ingredient_name" value="{ingredient_name}">
             <input type="hidden" name="original_quantity" value="{original_quantity}">
             <input type="hidden" name="original_unit" value="{original_unit}">
@@ -217,10 +433,17 @@ def get_new_ingredient_conversion_prompt_html(ingredient_name, original_quantity
     </div>
     """
 
+# Common cooking fractions, sorted by value, and how close a decimal part must be to one.
+_FRACTIONS = ((1/8, "1/8"), (1/4, "1/4"), (1/3, "1/3"), (1/2, "1/2"), (2/3, "2/3"), (3/4, "3/4"))
+_FRACTION_VALUES = [value for value, _ in _FRACTIONS]
+_FRACTION_TOLERANCE = 0.01
+
+@lru_cache(maxsize=4096)
 def format_fraction(num):
     """
     Converts a float to a string, including common cooking fractions.
     e.g., 1.5 -> "1 1/2", 0.25 -> "1/4"
+    Memoized: recipes repeat the same handful of amounts.
     """
     if num is None:
         return ""
@@ -230,21 +453,14 @@ def format_fraction(num):
     integer_part = int(num)
     decimal_part = num - integer_part
 
-    # Common fractions and their decimal equivalents
-    fractions = {
-        1/8: "1/8", 1/4: "1/4", 1/3: "1/3", 1/2: "1/2",
-        2/3: "2/3", 3/4: "3/4",
-    }
-
-    # Find the closest fraction within a small tolerance
+    # The fractions are further apart than twice the tolerance, so only the
+    # neighbours of the insertion point can be close enough
     closest_fraction = ""
-    min_diff = float('inf')
-    for frac_val, frac_str in fractions.items():
-        diff = abs(decimal_part - frac_val)
-        if diff < 0.01: # Tolerance for floating point inaccuracies
-            if diff < min_diff:
-                min_diff = diff
-                closest_fraction = frac_str
+    index = bisect_left(_FRACTION_VALUES, decimal_part)
+    for value, text in _FRACTIONS[max(index - 1, 0):index + 1]:
+        if abs(decimal_part - value) < _FRACTION_TOLERANCE:
+            closest_fraction = text
+            break
 
     # Format the final string
     integer_str = str(integer_part) if integer_part > 0 else ""
@@ -257,58 +473,72 @@ def format_fraction(num):
         # If no common fraction is found, round to 2 decimal places
         return f"{num:.2f}".rstrip('0').rstrip('.')
 
-
+# Units convert_from_base displays, per dimension, as (unit, smallest amount shown in
+# that unit). A quantity is shown in the unit with the largest threshold it reaches;
+# below every threshold it stays in the base unit. Cups cover 1/4 to 4 cups as well as
+# anything under a teaspoon, as recipes write them.
+DISPLAY_UNITS = {
+    'volume': (('cup', 0), ('tsp', 1), ('tbsp', 1), ('cup', 0.25), ('quart', 1), ('gallon', 1)),
+    'mass': (('oz', 1), ('lb', 1)),
+}
+
+def _build_display_tables(graph):
+    tables = {}
+    for dimension, units in DISPLAY_UNITS.items():
+        entries = []
+        for unit, threshold in units:
+            known = graph.get(unit)
+            if known and known[0] == dimension:
+                entries.append((threshold * known[1], unit, known[1]))
+        entries.sort()
+        tables[dimension] = ([entry[0] for entry in entries], [entry[1:] for entry in entries])
+    return tables
+
+def get_display_tables():
+    """
+    Returns the threshold tables for convert_from_base, rebuilt whenever the
+    conversion graph is.
+    """
+    graph = get_conversion_graph()
+    cache = database_state('conversion_graph', _ConversionGraph)
+    # (graph, {dimension: (thresholds in base units, [(unit, factor_to_base)])})
+    cached = cache.display_tables
+    if cached is None or cached[0] is not graph:
+        cached = cache.display_tables = (graph, _build_display_tables(graph))
+    return cached[1]
+
+@timed_conversion
 def convert_from_base(base_quantity, base_unit, density_g_ml=None):
     """
     Converts a quantity from its base unit (g, ml, unit) to a more
-    human-readable format for recipes.
+    human-readable format for recipes: volumes (and masses with a density)
+    in tsp/tbsp/cup/quart/gallon, other masses in oz/lb.
     """
     if base_unit == 'unit':
         return f"{format_fraction(base_quantity)} {base_unit}"
     if base_quantity == 0:
         return f"0 {base_unit}"
 
-    # Standard volume units from largest to smallest for intelligent selection
-    preferred_units = ['gallon', 'quart', 'pint', 'cup', 'tbsp', 'tsp']
-    quantity_in_ml = 0
-
     if base_unit == 'ml':
-        quantity_in_ml = base_quantity
+        dimension, quantity = 'volume', base_quantity
+    elif base_unit == 'g' and density_g_ml:
+        # Recipes measure most things by volume, so show it as one
+        dimension, quantity, base_unit = 'volume', base_quantity / density_g_ml, 'ml'
     elif base_unit == 'g':
-        if not density_g_ml or density_g_ml == 0:
-            # Cannot convert to volume, so return in grams
-            return f"{base_quantity:.2f} g".rstrip('0').rstrip('.')
-        quantity_in_ml = base_quantity / density_g_ml
+        dimension, quantity = 'mass', base_quantity
     else:
         return f"{base_quantity} {base_unit}" # Should not happen for mass/volume
 
-    conn = get_db_connection()
-    try:
-        # Special handling for cups, as it's very common in recipes
-        cup_factor = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = 'cup' AND to_unit = 'ml'").fetchone()['factor']
-        quantity_in_cups = quantity_in_ml / cup_factor
-        if 0.25 <= quantity_in_cups < 4:
-             return f"{format_fraction(quantity_in_cups)} cup"
-
-        # General handling for other units
-        for unit in preferred_units:
-            res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = 'ml'", (unit,)).fetchone()
-            if res:
-                factor = res['factor']
-                converted_quantity = quantity_in_ml / factor
-                if converted_quantity >= 1: # Use this unit if it's at least 1
-                    formatted_qty = format_fraction(converted_quantity)
-                    return f"{formatted_qty} {unit}"
-
-        # Fallback for very small quantities
-        if quantity_in_cups > 0:
-            return f"{format_fraction(quantity_in_cups)} cup"
-
-        # If the quantity is too small for even a tsp, return in ml
-        return f"{quantity_in_ml:.2f} ml".rstrip('0').rstrip('.')
-    finally:
-        conn.close()
+    thresholds, units = get_display_tables()[dimension]
+    index = bisect_right(thresholds, quantity) - 1
+    if index < 0:
+        # Too small (or negative) for any display unit
+        amount = f"{quantity:.2f}".rstrip('0').rstrip('.')
+        return f"{amount} {base_unit}"
+    unit, factor = units[index]
+    return f"{format_fraction(quantity / factor)} {unit}"
 
+@timed_conversion
 def convert_units(quantity, from_unit, to_unit, ingredient_id=None):
     """
     A general-purpose function to convert between any two units.
@@ -327,50 +557,34 @@ def convert_units(quantity, from_unit, to_unit, ingredient_id=None):
     if not to_unit_type:
         raise ValueError(f"Unknown unit type for '{to_unit}'")
 
-    conn = get_db_connection()
-    try:
-        # Case 1: Target unit is the same type as the base unit (e.g., g -> oz, ml -> cup)
-        if to_unit_type == base_unit_type:
-            if to_unit == base_unit:
-                return base_quantity
-            # Find a conversion factor
-            res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = ?", (base_unit, to_unit)).fetchone()
-            if res:
-                return base_quantity * res['factor']
-            res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = ?", (to_unit, base_unit)).fetchone()
-            if res:
-                return base_quantity / res['factor']
-
-        # Case 2: Target unit is a different type (mass <-> volume)
-        elif {to_unit_type, base_unit_type} == {'mass', 'volume'}:
-            ingredient = conn.execute("SELECT * FROM ingredients WHERE id = ?", (ingredient_id,)).fetchone()
-            if not ingredient or not ingredient['density_g_ml']:
-                raise ValueError(f"Density required to convert between {base_unit_type} and {to_unit_type} for this ingredient.")
-            density = ingredient['density_g_ml']
-
-            # Path: base_unit -> ml -> to_unit
-            quantity_in_ml = 0
-            if base_unit_type == 'volume': # base_unit is ml
-                quantity_in_ml = base_quantity
-            elif base_unit_type == 'mass': # base_unit is g
-                quantity_in_ml = base_quantity / density
-
-            # Now we have the quantity in ml, convert it to the to_unit
-            if to_unit_type == 'volume':
-                if to_unit == 'ml':
-                    return quantity_in_ml
-                res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = 'ml'", (to_unit,)).fetchone()
-                if res:
-                    return quantity_in_ml / res['factor']
-            elif to_unit_type == 'mass':
-                quantity_in_g = quantity_in_ml * density
-                if to_unit == 'g':
-                    return quantity_in_g
-                res = conn.execute("SELECT factor FROM unit_conversions WHERE from_unit = ? AND to_unit = 'g'", (to_unit,)).fetchone()
-                if res:
-                    return quantity_in_g / res['factor']
-
-        raise ValueError(f"Could not find a conversion path from '{from_unit}' to '{to_unit}'")
-
-    finally:
-        conn.close()
+    # Case 1: Target unit is the same type as the base unit (e.g., g -> oz, ml -> cup)
+    if to_unit_type == base_unit_type:
+        factor = get_conversion_factor(to_unit, base_unit)
+        if factor is not None:
+            return base_quantity / factor
+
+    # Case 2: Target unit is a different type (mass <-> volume)
+    elif {to_unit_type, base_unit_type} == {'mass', 'volume'}:
+        ingredient = lookup_ingredient(ingredient_id)
+        if not ingredient or not ingredient['density_g_ml']:
+            raise ValueError(f"Density required to convert between {base_unit_type} and {to_unit_type} for this ingredient.")
+        density = ingredient['density_g_ml']
+
+        # Path: base_unit -> ml -> to_unit
+        quantity_in_ml = 0
+        if base_unit_type == 'volume': # base_unit is ml
+            quantity_in_ml = base_quantity
+        elif base_unit_type == 'mass': # base_unit is g
+            quantity_in_ml = base_quantity / density
+
+        # Now we have the quantity in ml, convert it to the to_unit
+        if to_unit_type == 'volume':
+            factor = get_conversion_factor(to_unit, 'ml')
+            if factor is not None:
+                return quantity_in_ml / factor
+        elif to_unit_type == 'mass':
+            factor = get_conversion_factor(to_unit, 'g')
+            if factor is not None:
+                return quantity_in_ml * density / factor
+
+    raise ValueError(f"Could not find a conversion path from '{from_unit}' to '{to_unit}'")
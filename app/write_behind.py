@@ -0,0 +1,210 @@
+import atexit
+import threading
+
+from app.database import (
+    get_db_connection, current_database, using_database, database_state, peek_database_state,
+    pop_database_state, known_databases
+)
+
+# Longest a quantity change may stay in memory before it is written, in seconds.
+# This bounds how much is lost if the process dies without draining the queue.
+DEFAULT_FLUSH_INTERVAL = 0.5
+# Flush early once this many ingredients have changes waiting.
+DEFAULT_MAX_PENDING = 500
+
+class WriteBehindQueue:
+    """
+    Coalesces quantity changes per ingredient in memory and writes them out in one
+    transaction every `flush_interval` seconds (or sooner once `max_pending` ingredients
+    are waiting), so a burst of +/- clicks costs one commit instead of one each.
+
+    Changes are additive, so they can be merged and applied in any order. Changes taken
+    for a flush stay visible through pending() until that flush has committed. Each
+    database file has its own queue, written to `database`.
+    """
+    def __init__(self, flush_interval=DEFAULT_FLUSH_INTERVAL, max_pending=DEFAULT_MAX_PENDING, database=None):
+        self.database = database or current_database()
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.generation = 0
+        self.flushes = 0
+        self._pending = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def add(self, ingredient_id, change):
+        """Queues `change` to be added to the ingredient's quantity."""
+        with self._lock:
+            ingredient_id = int(ingredient_id)
+            self._pending[ingredient_id] = self._pending.get(ingredient_id, 0) + change
+            self.generation += 1
+            if len(self._pending) >= self.max_pending:
+                self._wake.set()
+
+    def pending(self):
+        """Returns {ingredient_id: change} for everything not yet committed."""
+        with self._lock:
+            merged = dict(self._in_flight)
+            for ingredient_id, change in self._pending.items():
+                merged[ingredient_id] = merged.get(ingredient_id, 0) + change
+            return merged
+
+    def flush(self):
+        """Writes every queued change in a single transaction. Returns how many rows it touched."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._in_flight, self._pending = self._pending, {}
+                batch = list(self._in_flight.items())
+
+            with using_database(self.database):
+                conn = get_db_connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "UPDATE ingredients SET quantity = quantity + ? WHERE id = ?",
+                    [(change, ingredient_id) for ingredient_id, change in batch]
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                # Put the changes back so the next flush retries them
+                with self._lock:
+                    for ingredient_id, change in self._in_flight.items():
+                        self._pending[ingredient_id] = self._pending.get(ingredient_id, 0) + change
+                    self._in_flight = {}
+                raise
+            finally:
+                conn.close()
+
+            with self._lock:
+                self._in_flight = {}
+                self.flushes += 1
+            return len(batch)
+
+    def stop(self):
+        """Stops the flusher thread and drains whatever is still queued."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def close(self):
+        # Called when the database's state is dropped from the LRU
+        self.stop()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error flushing quantity changes: {e}")
+
+# (flush_interval, max_pending) while write-behind is enabled, else None
+_settings = None
+
+def enable_write_behind(flush_interval=DEFAULT_FLUSH_INTERVAL, max_pending=DEFAULT_MAX_PENDING):
+    """
+    Switches quantity adjustments to write-behind mode. Every database gets its own
+    queue on first use. The queues are drained by disable_write_behind(), and at
+    interpreter exit as a fallback.
+    """
+    global _settings
+    if _settings is None:
+        _settings = (flush_interval, max_pending)
+        atexit.register(disable_write_behind)
+    return get_write_behind()
+
+def disable_write_behind():
+    """Drains every queue and goes back to writing every change immediately."""
+    global _settings
+    _settings = None
+    for path in known_databases():
+        queue = pop_database_state('write_behind', path)
+        if queue is not None:
+            queue.stop()
+
+def _start_queue():
+    queue = WriteBehindQueue(*_settings)
+    queue.start()
+    return queue
+
+def get_write_behind():
+    """
+    Returns the current database's queue, starting it if needed, or None when changes
+    are written immediately.
+    """
+    if _settings is None:
+        return None
+    return database_state('write_behind', _start_queue)
+
+def peek_write_behind(path=None):
+    """
+    Returns the queue of the current database (or of `path`) if one is running, else None.
+    Unlike get_write_behind it never starts one, so reads and metrics scrapes can use it.
+    """
+    if _settings is None:
+        return None
+    return peek_database_state('write_behind', path)
+
+def adjust_quantity(ingredient_id, change):
+    """
+    Adds `change` to an ingredient's quantity, through the queue when write-behind is
+    enabled and with an immediate commit otherwise.
+    """
+    queue = get_write_behind()
+    if queue is not None:
+        queue.add(ingredient_id, change)
+        return
+    conn = get_db_connection()
+    conn.execute("UPDATE ingredients SET quantity = quantity + ? WHERE id = ?", (change, ingredient_id))
+    conn.commit()
+    conn.close()
+
+def flush_pending():
+    """
+    Writes queued changes now. Call this before anything that sets quantities outright
+    or needs exact stock levels, so queued deltas don't land on top of it later.
+    """
+    queue = peek_write_behind()
+    if queue is not None:
+        queue.flush()
+
+def pending_changes():
+    """Returns {ingredient_id: change} not yet written; empty when write-behind is off."""
+    queue = peek_write_behind()
+    return queue.pending() if queue is not None else {}
+
+def pending_generation():
+    """A counter that moves whenever a change is queued, for cache keys."""
+    queue = peek_write_behind()
+    return queue.generation if queue is not None else 0
+
+def with_pending(rows):
+    """
+    Returns ingredient rows as dicts with queued changes added to their quantity.
+    Rows are passed through unchanged when nothing is queued.
+    """
+    changes = pending_changes()
+    if not changes:
+        return rows
+    adjusted = []
+    for row in rows:
+        if row is not None and row['id'] in changes:
+            row = dict(row)
+            row['quantity'] += changes[row['id']]
+        adjusted.append(row)
+    return adjusted
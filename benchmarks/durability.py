@@ -0,0 +1,63 @@
+"""
+Write throughput of /update_pantry under each durability profile.
+
+Runs the HTTP load test once per profile with only the update action (bursts of
+/update_pantry posts, each one transaction with one commit) and prints the profiles
+side by side. Everything else is the same between runs, so the difference is what the
+commits cost the disk.
+
+    python benchmarks/durability.py --clients 8 --duration 10
+    python benchmarks/durability.py --profiles strict,fast --output durability.json
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_test
+from load_test import DURABILITY_PROFILES
+
+def parse_profiles(value):
+    profiles = value.split(',')
+    for profile in profiles:
+        if profile not in DURABILITY_PROFILES:
+            raise argparse.ArgumentTypeError(f"Unknown profile '{profile}'")
+    return profiles
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare /update_pantry throughput across durability profiles.")
+    parser.add_argument('--profiles', type=parse_profiles, default=list(DURABILITY_PROFILES))
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument('--meals', type=int, default=100)
+    parser.add_argument('--threads', type=int, default=8, help="Waitress worker threads.")
+    parser.add_argument('--output', help="Write the results per profile as JSON to this file.")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for profile in args.profiles:
+        print(f"--- {profile} ---")
+        results[profile] = load_test.main([
+            '--mix', 'update=1', '--durability', profile, '--clients', str(args.clients),
+            '--duration', str(args.duration), '--warmup', str(args.warmup), '--threads', str(args.threads),
+            '--ingredients', str(args.ingredients), '--meals', str(args.meals),
+        ])
+
+    print()
+    print(f"{'profile':<10}{'synchronous':>12}{'updates/s':>12}{'p50_ms':>10}{'p99_ms':>10}{'errors':>8}")
+    for profile, result in results.items():
+        stats = result['actions']['update']
+        print(
+            f"{profile:<10}{DURABILITY_PROFILES[profile]['synchronous']:>12}{stats['throughput_rps']:>12.1f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['errors']:>8}"
+        )
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
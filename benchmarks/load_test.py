@@ -0,0 +1,294 @@
+"""
+HTTP load test for the pantry app.
+
+Builds a synthetic database in a temporary directory, serves the app from it with
+waitress on localhost in a separate process, and replays a weighted mix of user
+actions from many concurrent clients:
+
+    search       type-ahead: one /search request per keystroke of an ingredient name
+    pantry       the pantry page followed by the next page of the list
+    cooking      a cooking session for a random meal
+    update       a burst of /update_pantry posts, including double submits
+
+Reports throughput, p50/p95/p99 latency and SQL statements per request (read from
+the X-Query-Count header the app adds when QUERY_COUNT_HEADER is set), overall and per
+action. Everything runs offline with the standard library plus the app's own
+dependencies.
+
+    python benchmarks/load_test.py --clients 16 --duration 20 --output results.json
+    python benchmarks/load_test.py --output new.json --compare results.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.database import DURABILITY_PROFILES, DEFAULT_DURABILITY
+
+DEFAULT_MIX = {'search': 40, 'pantry': 25, 'cooking': 20, 'update': 15}
+# Posts per update_pantry burst, and how often a post is sent twice (a double click).
+UPDATE_BURST = 5
+DOUBLE_SUBMIT_RATE = 0.2
+
+# --- Server side -----------------------------------------------------------------
+
+def build_database(path, ingredients, meals, seed):
+    """Creates the schema and sample data, then adds a synthetic dataset of the requested size."""
+    from app import database
+    from app.synthetic import generate_dataset
+    database.DATABASE = path
+    if database.init_db():
+        database.seed_db()
+    generate_dataset(ingredients=ingredients, meals=meals, seed=seed)
+
+def serve_app(args):
+    from app import app
+    from app.database import set_durability_profile, close_db_connections
+    from app.prefork import serve
+    app.config['QUERY_COUNT_HEADER'] = True
+    set_durability_profile(args.durability)
+    build_database(args.database, args.ingredients, args.meals, args.seed)
+    if args.workers > 1:
+        app.config['CACHE_SYNC'] = True
+    close_db_connections()
+
+    def start_worker():
+        if args.write_behind:
+            from app.write_behind import enable_write_behind
+            enable_write_behind(flush_interval=args.write_behind)
+
+    serve(app, host='127.0.0.1', port=args.port, workers=args.workers, threads=args.threads, on_worker_start=start_worker)
+
+# --- Client side -----------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_server(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not start within {timeout}s")
+
+def load_fixtures(path):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    fixtures = {
+        'ingredients': [row for row in conn.execute("SELECT id, name FROM ingredients")],
+        'meal_ids': [row[0] for row in conn.execute("SELECT id FROM meals")],
+    }
+    conn.close()
+    return fixtures
+
+class Client:
+    """One simulated user with its own keep-alive connection."""
+    def __init__(self, port, fixtures, rng):
+        self.port = port
+        self.fixtures = fixtures
+        self.rng = rng
+        self.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        self.samples = []
+
+    def request(self, action, method, path, form=None):
+        body = urlencode(form, doseq=True) if form is not None else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form is not None else {}
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+            status = response.status
+            queries = int(response.getheader('X-Query-Count', 0))
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            status, queries = 0, 0
+        self.samples.append((action, time.perf_counter() - started, status, queries))
+
+    def search(self):
+        _, name = self.rng.choice(self.fixtures['ingredients'])
+        for length in range(1, min(len(name), 6) + 1):
+            self.request('search', 'GET', '/search?' + urlencode({'q': name[:length]}))
+
+    def pantry(self):
+        self.request('pantry', 'GET', '/pantry')
+        _, name = self.rng.choice(self.fixtures['ingredients'])
+        self.request('pantry', 'GET', '/ingredients_page?' + urlencode({'after': name, 'edit': 1}))
+
+    def cooking(self):
+        self.request('cooking', 'POST', '/start_cooking_session', {
+            'meal_id': self.rng.choice(self.fixtures['meal_ids']), 'portion': self.rng.choice([0.5, 1, 2])
+        })
+
+    def update(self):
+        for _ in range(UPDATE_BURST):
+            items = self.rng.sample(self.fixtures['ingredients'], min(len(self.fixtures['ingredients']), 8))
+            form = {
+                'ingredient_used': [f"{ingredient_id}_0.01" for ingredient_id, _ in items],
+                'idempotency_key': uuid.UUID(int=self.rng.getrandbits(128)).hex,
+            }
+            self.request('update', 'POST', '/update_pantry', form)
+            if self.rng.random() < DOUBLE_SUBMIT_RATE:
+                self.request('update', 'POST', '/update_pantry', form)
+
+def run_client(port, fixtures, mix, seed, stop_at, record_from):
+    rng = random.Random(seed)
+    client = Client(port, fixtures, rng)
+    actions, weights = zip(*mix.items())
+    while time.monotonic() < stop_at:
+        getattr(client, rng.choices(actions, weights)[0])()
+        if time.monotonic() < record_from:
+            # Still warming up: discard what was measured so far
+            client.samples.clear()
+    client.connection.close()
+    return client.samples
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(samples, elapsed):
+    latencies = sorted(sample[1] for sample in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if not 200 <= sample[2] < 400),
+        'throughput_rps': len(samples) / elapsed if elapsed else 0,
+        'p50_ms': (percentile(latencies, 0.50) or 0) * 1000,
+        'p95_ms': (percentile(latencies, 0.95) or 0) * 1000,
+        'p99_ms': (percentile(latencies, 0.99) or 0) * 1000,
+        'queries_per_request': sum(sample[3] for sample in samples) / len(samples) if samples else 0,
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(results, baseline=None):
+    columns = ('requests', 'errors', 'throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+    print(f"{'action':<10}" + ''.join(f"{column:>21}" for column in columns))
+    for action, stats in results['actions'].items():
+        cells = []
+        for column in columns:
+            cell = f"{stats[column]:.1f}" if isinstance(stats[column], float) else str(stats[column])
+            before = (baseline or {}).get('actions', {}).get(action, {}).get(column)
+            if before:
+                cell += f" ({(stats[column] - before) / before * 100:+.0f}%)"
+            cells.append(f"{cell:>21}")
+        print(f"{action:<10}" + ''.join(cells))
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        action, _, weight = part.partition('=')
+        if action not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown action '{action}'")
+        mix[action] = float(weight)
+    return mix
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the pantry app over HTTP.")
+    parser.add_argument('--clients', type=int, default=16, help="Concurrent simulated users.")
+    parser.add_argument('--duration', type=float, default=20, help="Measured seconds.")
+    parser.add_argument('--warmup', type=float, default=3, help="Unmeasured seconds before that.")
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help="e.g. search=40,pantry=25,cooking=20,update=15")
+    parser.add_argument('--ingredients', type=int, default=5000)
+    parser.add_argument('--meals', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8, help="Waitress worker threads.")
+    parser.add_argument('--workers', type=int, default=1, help="Server processes, each with --threads threads.")
+    parser.add_argument('--write-behind', type=float, help="Enable write-behind with this flush interval.")
+    parser.add_argument('--durability', choices=DURABILITY_PROFILES, default=DEFAULT_DURABILITY)
+    parser.add_argument('--output', help="Write results as JSON to this file.")
+    parser.add_argument('--compare', help="Results JSON from an earlier run to compare against.")
+    # Internal: run as the server process
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--database', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve_app(args)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        args.database = os.path.join(directory, 'pantry.db')
+        args.port = free_port()
+        command = [
+            sys.executable, os.path.abspath(__file__), '--serve', '--database', args.database,
+            '--port', str(args.port), '--ingredients', str(args.ingredients), '--meals', str(args.meals),
+            '--seed', str(args.seed), '--threads', str(args.threads), '--workers', str(args.workers),
+            '--durability', args.durability,
+        ]
+        if args.write_behind:
+            command += ['--write-behind', str(args.write_behind)]
+        server = subprocess.Popen(command, cwd=ROOT)
+        try:
+            wait_for_server(args.port, timeout=300)
+            fixtures = load_fixtures(args.database)
+            started = time.monotonic()
+            record_from = started + args.warmup
+            stop_at = record_from + args.duration
+            with ThreadPoolExecutor(max_workers=args.clients) as executor:
+                futures = [
+                    executor.submit(run_client, args.port, fixtures, args.mix, args.seed * 1000 + number, stop_at, record_from)
+                    for number in range(args.clients)
+                ]
+                samples = [sample for future in futures for sample in future.result()]
+            elapsed = time.monotonic() - record_from
+        finally:
+            server.terminate()
+            server.wait()
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'parameters': {
+            key: getattr(args, key)
+            for key in (
+                'clients', 'duration', 'warmup', 'mix', 'ingredients', 'meals', 'seed', 'threads', 'workers',
+                'write_behind', 'durability'
+            )
+        },
+        'actions': {'overall': summarize(samples, elapsed)},
+    }
+    for action in args.mix:
+        results['actions'][action] = summarize([sample for sample in samples if sample[0] == action], elapsed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+if __name__ == '__main__':
+    main()
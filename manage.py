@@ -0,0 +1,109 @@
+import argparse
+import sys
+
+from app.database import init_db, seed_db, close_db_connections
+from app.bulk import import_ingredients, export_ingredients, guess_format, FORMATS
+from app.recipe_import import import_recipes, read_recipe_records
+from app.ledger import take_snapshot, pantry_as_of, parse_timestamp
+from app.synthetic import generate_dataset, DEFAULT_INGREDIENTS_PER_MEAL
+
+def cmd_import_ingredients(args):
+    fmt = args.format or guess_format(args.file)
+    with open(args.file, encoding='utf-8', newline='') as f:
+        summary = import_ingredients(f, fmt)
+    print(f"Imported {summary['imported']} ingredients, {summary['failed']} failed.")
+    for error in summary['errors']:
+        print(f"  {error}")
+
+def cmd_export_ingredients(args):
+    fmt = args.format or guess_format(args.file)
+    out = open(args.file, 'w', encoding='utf-8', newline='') if args.file else sys.stdout
+    try:
+        for chunk in export_ingredients(fmt):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def cmd_import_recipes(args):
+    fmt = args.format or guess_format(args.file, default='txt')
+    with open(args.file, encoding='utf-8', newline='') as f:
+        summary = import_recipes(read_recipe_records(f, fmt))
+    print(f"Imported {summary['imported']} ingredient lines into {summary['meals']} meals.")
+    for label, key in (
+        ("Unresolved ingredients", 'unresolved_ingredients'),
+        ("Unknown units", 'unknown_units'),
+        ("Unresolved meals", 'unresolved_meals'),
+        ("Unparsed lines", 'unparsed'),
+    ):
+        if summary[key]:
+            print(f"{label} ({len(summary[key])}): {', '.join(summary[key][:20])}")
+
+def cmd_snapshot(args):
+    snapshot_id = take_snapshot(force=not args.if_needed)
+    print(f"Took snapshot {snapshot_id}." if snapshot_id else "No snapshot needed.")
+
+def cmd_pantry_as_of(args):
+    for row in pantry_as_of(parse_timestamp(args.at)):
+        print(f"{row['name'] or '(deleted #' + str(row['ingredient_id']) + ')'}\t{row['quantity']:g}\t{row['base_unit'] or ''}")
+
+def cmd_generate(args):
+    counts = generate_dataset(args.ingredients, args.meals, args.ingredients_per_meal, args.seed)
+    print(', '.join(f"{count} {table}" for table, count in counts.items()) + " added.")
+
+def ingredients_per_meal(value):
+    try:
+        low, mode, high = (int(part) for part in value.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected MIN:MODE:MAX, e.g. 3:8:15")
+    if not 1 <= low <= mode <= high:
+        raise argparse.ArgumentTypeError("expected 1 <= MIN <= MODE <= MAX")
+    return low, mode, high
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pantry maintenance commands.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_import = subparsers.add_parser('import-ingredients', help="Upsert ingredients from a CSV or JSON Lines file.")
+    parser_import.add_argument('file')
+    parser_import.add_argument('--format', choices=FORMATS)
+    parser_import.set_defaults(func=cmd_import_ingredients)
+
+    parser_export = subparsers.add_parser('export-ingredients', help="Write the pantry as CSV or JSON Lines.")
+    parser_export.add_argument('file', nargs='?', help="Output file; defaults to stdout.")
+    parser_export.add_argument('--format', choices=FORMATS)
+    parser_export.set_defaults(func=cmd_export_ingredients)
+
+    parser_recipes = subparsers.add_parser('import-recipes', help="Add meals and their ingredients from a recipe library.")
+    parser_recipes.add_argument('file')
+    parser_recipes.add_argument('--format', choices=('txt', 'csv', 'jsonl'))
+    parser_recipes.set_defaults(func=cmd_import_recipes)
+
+    parser_snapshot = subparsers.add_parser('snapshot', help="Record current balances as an inventory snapshot.")
+    parser_snapshot.add_argument('--if-needed', action='store_true', help="Only if enough ledger events accumulated.")
+    parser_snapshot.set_defaults(func=cmd_snapshot)
+
+    parser_as_of = subparsers.add_parser('pantry-as-of', help="Print the pantry as it was at a point in time.")
+    parser_as_of.add_argument('at', help="Unix seconds or an ISO 8601 date/time.")
+    parser_as_of.set_defaults(func=cmd_pantry_as_of)
+
+    parser_generate = subparsers.add_parser('generate', help="Add a deterministic synthetic dataset.")
+    parser_generate.add_argument('--ingredients', type=int, default=1000)
+    parser_generate.add_argument('--meals', type=int, default=100)
+    parser_generate.add_argument(
+        '--ingredients-per-meal', type=ingredients_per_meal, default=DEFAULT_INGREDIENTS_PER_MEAL,
+        metavar='MIN:MODE:MAX'
+    )
+    parser_generate.add_argument('--seed', type=int, default=0)
+    parser_generate.set_defaults(func=cmd_generate)
+
+    args = parser.parse_args(argv)
+    if init_db():
+        seed_db()
+    try:
+        args.func(args)
+    finally:
+        close_db_connections()
+
+if __name__ == '__main__':
+    main()
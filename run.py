@@ -1,9 +1,72 @@
-from waitress import serve
+import os
+
 from app import app
-from app.database import init_db, seed_db
+from app.database import (
+    init_db, seed_db, close_db_connections, set_durability_profile, start_checkpoint_thread,
+    stop_checkpoint_thread, DEFAULT_DURABILITY
+)
+from app.write_behind import enable_write_behind, disable_write_behind
+from app.ledger import start_snapshot_thread, stop_snapshot_thread
+from app.prefork import serve, worker_count
+
+# PANTRY_DURABILITY=strict|balanced|fast trades commit speed against what a crash can
+# lose; see DURABILITY_PROFILES in app/database.py. Must be chosen before any connection opens.
+set_durability_profile(os.environ.get('PANTRY_DURABILITY', DEFAULT_DURABILITY))
+
+# PANTRY_TENANT_DIR=<directory> serves every household from its own <household>.db there,
+# chosen by the /h/<household>/ path prefix, the X-Pantry-Tenant header or, with
+# PANTRY_TENANT_DOMAIN=pantry.example.com, the subdomain. Each is migrated on first use.
+if os.environ.get('PANTRY_TENANT_DIR'):
+    app.config['TENANT_DIRECTORY'] = os.environ['PANTRY_TENANT_DIR']
+    app.config['TENANT_DOMAIN'] = os.environ.get('PANTRY_TENANT_DOMAIN')
+elif init_db():
+    # Apply pending migrations; a brand new database also gets the sample data
+    seed_db()
+
+# PANTRY_QUERY_GUARD=warn prints requests that exceed their route's query budget or
+# repeat a statement in a loop; =raise turns them into errors (for development).
+if os.environ.get('PANTRY_QUERY_GUARD'):
+    app.config['QUERY_GUARD'] = os.environ['PANTRY_QUERY_GUARD']
+
+# PANTRY_WORKERS=<n>|auto serves from that many processes (auto: one per CPU core) sharing
+# the port, each with PANTRY_THREADS threads. The master process restarts a worker that
+# dies or misses its heartbeats for PANTRY_WORKER_TIMEOUT seconds; SIGHUP replaces them
+# all without dropping connections and SIGTERM lets them finish their requests first.
+workers = worker_count(os.environ.get('PANTRY_WORKERS', 1))
+if workers > 1:
+    # Each process has its own caches; check the database for other processes' writes
+    app.config['CACHE_SYNC'] = True
+# Nothing below may keep a connection open across the fork into the workers
+close_db_connections()
+
+def start_worker():
+    # PANTRY_WRITE_BEHIND=<seconds> merges +/- quantity clicks in memory and writes them
+    # at most that long afterwards, e.g. 0.5. Unset, every click is committed at once.
+    # With several workers each keeps its own queue.
+    if os.environ.get('PANTRY_WRITE_BEHIND'):
+        enable_write_behind(flush_interval=float(os.environ['PANTRY_WRITE_BEHIND']))
+    # Keeps point-in-time pantry reads short as the inventory ledger grows
+    start_snapshot_thread()
+    # Folds the WAL back into the database on the profile's schedule
+    start_checkpoint_thread()
 
-# Initialize and seed the database
-init_db()
-seed_db()
+def stop_worker():
+    # Drain queued quantity changes before the connections go away
+    disable_write_behind()
+    stop_snapshot_thread()
+    stop_checkpoint_thread()
+    close_db_connections()
 
-serve(app, host="0.0.0.0", port=5000)
+serve(
+    app,
+    host=os.environ.get('PANTRY_HOST', '0.0.0.0'),
+    port=int(os.environ.get('PANTRY_PORT', 5000)),
+    workers=workers,
+    threads=int(os.environ.get('PANTRY_THREADS', 4)),
+    connection_limit=int(os.environ.get('PANTRY_CONNECTION_LIMIT', 100)),
+    backlog=int(os.environ.get('PANTRY_BACKLOG', 1024)),
+    timeout=float(os.environ.get('PANTRY_WORKER_TIMEOUT', 30)),
+    graceful_timeout=float(os.environ.get('PANTRY_GRACEFUL_TIMEOUT', 30)),
+    on_worker_start=start_worker,
+    on_worker_exit=stop_worker,
+)
@@ -0,0 +1,22 @@
+import pytest
+
+from app import app, database
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """A test client on a freshly migrated and seeded database of its own."""
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'pantry.db'))
+    monkeypatch.setattr(app, 'testing', True)
+    database.close_db_connections()
+    if database.init_db():
+        database.seed_db()
+    yield app.test_client()
+    database.close_db_connections()
+
+def quantity_of(ingredient_id):
+    """The stored quantity of one ingredient, read straight from the database."""
+    conn = database.get_db_connection()
+    try:
+        return conn.execute("SELECT quantity FROM ingredients WHERE id = ?", (ingredient_id,)).fetchone()['quantity']
+    finally:
+        conn.close()
@@ -0,0 +1,50 @@
+EGGS = 3
+
+def cookable(client):
+    return {meal['name']: meal for meal in client.get('/cookable?format=json').get_json()['meals']}
+
+def add_meal(client, name, *lines):
+    client.post('/add_meal', data={'meal_name': name})
+    meal_id = next(meal['meal_id'] for meal in cookable(client).values() if meal['name'] == name)
+    for ingredient, quantity, unit in lines:
+        client.post(f'/add_ingredient_to_meal/{meal_id}', data={'q': ingredient, 'quantity': quantity, 'unit': unit})
+    return meal_id
+
+def test_reports_meals_with_unconvertible_lines(client):
+    add_meal(client, 'omelette', ('eggs', 1, 'cup'), ('butter', 1, 'tbsp'))
+    omelette = cookable(client)['omelette']
+    assert omelette['computable'] is False
+    assert omelette['unconvertible'] == ['eggs']
+    assert omelette['max_portions'] is None
+    assert cookable(client)['pancakes']['computable'] is True
+
+def test_new_conversion_refreshes_unconvertible_meals(client):
+    add_meal(client, 'omelette', ('eggs', 1, 'cup'))
+    assert cookable(client)['omelette']['computable'] is False
+
+    client.post('/add_conversion', data={
+        'ingredient_id': EGGS, 'from_unit': 'cup', 'to_unit': 'unit', 'factor': 4,
+        'quantity_to_add': 1, 'unit_to_add': 'cup'
+    })
+    omelette = cookable(client)['omelette']
+    assert omelette['computable'] is True
+    # 12 eggs + the 4 just added, 4 per portion
+    assert omelette['max_portions'] == 4
+    assert omelette['bottleneck'] == 'eggs'
+
+def test_deleted_ingredient_leaves_unconvertible_meals(client):
+    add_meal(client, 'omelette', ('eggs', 1, 'cup'), ('butter', 10, 'g'))
+    assert cookable(client)['omelette']['unconvertible'] == ['eggs']
+
+    client.delete(f'/delete_ingredient/{EGGS}')
+    omelette = cookable(client)['omelette']
+    assert omelette['computable'] is True
+    assert omelette['unconvertible'] == []
+    assert omelette['max_portions'] == 50
+
+def test_renamed_ingredient_is_reported_by_its_new_name(client):
+    add_meal(client, 'omelette', ('eggs', 1, 'cup'))
+    assert cookable(client)['omelette']['unconvertible'] == ['eggs']
+
+    client.post(f'/edit_ingredient/{EGGS}', data={'name': 'hen eggs', 'quantity': 12})
+    assert cookable(client)['omelette']['unconvertible'] == ['hen eggs']
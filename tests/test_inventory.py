@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import quantity_of
+
+FLOUR, SUGAR = 1, 2
+
+def deduct(client, items, **headers):
+    return client.post('/pantry/deductions', json={'items': items}, headers=headers)
+
+def test_deducts_a_batch(client):
+    response = deduct(client, [
+        {'ingredient_id': FLOUR, 'quantity': 100}, {'ingredient_id': FLOUR, 'quantity': 50},
+        {'ingredient_id': SUGAR, 'quantity': 10}, {'ingredient_id': 999, 'quantity': 1},
+    ])
+    assert response.status_code == 200
+    result = response.get_json()
+    assert {item['name']: item['quantity'] for item in result['items']} == {'flour': 850, 'sugar': 990}
+    assert result['unknown'] == [999]
+    assert quantity_of(FLOUR) == 850
+
+def test_same_idempotency_key_deducts_once(client):
+    first = deduct(client, [{'ingredient_id': FLOUR, 'quantity': 100}], **{'Idempotency-Key': 'cook-1'})
+    again = deduct(client, [{'ingredient_id': FLOUR, 'quantity': 100}], **{'Idempotency-Key': 'cook-1'})
+    assert first.get_json()['replayed'] is False
+    assert again.get_json()['replayed'] is True
+    assert again.get_json()['items'] == first.get_json()['items']
+    assert quantity_of(FLOUR) == 900
+
+    other = deduct(client, [{'ingredient_id': FLOUR, 'quantity': 100}], **{'Idempotency-Key': 'cook-2'})
+    assert other.get_json()['replayed'] is False
+    assert quantity_of(FLOUR) == 800
+
+def test_resubmitted_cooking_form_deducts_once(client):
+    form = {'ingredient_used': ['1_100', '2_10'], 'idempotency_key': 'session-1'}
+    assert client.post('/update_pantry', data=form).status_code < 400
+    assert client.post('/update_pantry', data=form).status_code < 400
+    assert (quantity_of(FLOUR), quantity_of(SUGAR)) == (900, 990)
+
+def test_prevent_negative_refuses_the_whole_batch(client):
+    response = client.post('/pantry/deductions', json={
+        'items': [{'ingredient_id': FLOUR, 'quantity': 10}, {'ingredient_id': SUGAR, 'quantity': 5000}],
+        'prevent_negative': True,
+    })
+    assert response.status_code == 409
+    assert [shortage['name'] for shortage in response.get_json()['shortages']] == ['sugar']
+    assert quantity_of(FLOUR) == 1000
+
+# Raw bodies, as Python's json module reads Infinity and NaN
+@pytest.mark.parametrize('items', [
+    '[{"ingredient_id": 1, "quantity": Infinity}]',
+    '[{"ingredient_id": 1, "quantity": NaN}]',
+    '[{"ingredient_id": 1, "quantity": -1}]',
+    '[{"ingredient_id": 1, "quantity": 1e308}, {"ingredient_id": 1, "quantity": 1e308}]',
+])
+def test_rejects_invalid_quantities(client, items):
+    response = client.post('/pantry/deductions', data=f'{{"items": {items}}}', content_type='application/json')
+    assert response.status_code == 400
+    assert quantity_of(FLOUR) == 1000
@@ -0,0 +1,59 @@
+import time
+
+from app import database
+from app.ledger import take_snapshot, quantity_as_of, pantry_as_of
+from conftest import quantity_of
+
+FLOUR, SUGAR, EGGS = 1, 2, 3
+
+def live_quantities():
+    conn = database.get_db_connection()
+    try:
+        return {row['id']: row['quantity'] for row in conn.execute("SELECT id, quantity FROM ingredients")}
+    finally:
+        conn.close()
+
+def change_stock(client):
+    client.post('/pantry/deductions', json={'items': [{'ingredient_id': FLOUR, 'quantity': 250}]})
+    client.post('/update_quantity', data={'id': EGGS, 'change': -2})
+    client.post(f'/edit_ingredient/{SUGAR}', data={'name': 'sugar', 'quantity': 400})
+
+def test_as_of_now_matches_live_quantities_after_snapshot_and_tail(client):
+    change_stock(client)
+    assert take_snapshot() is not None
+    # The tail replayed on top of the snapshot
+    change_stock(client)
+    client.delete('/delete_ingredient/9')
+
+    now = time.time() + 1
+    live = live_quantities()
+    assert {ingredient_id: quantity_as_of(ingredient_id, now) for ingredient_id in live} == live
+    assert quantity_as_of(9, now) == 0
+    assert {row['ingredient_id']: row['quantity'] for row in pantry_as_of(now)} == {
+        ingredient_id: quantity for ingredient_id, quantity in live.items() if quantity
+    }
+
+def test_as_of_a_past_time_ignores_later_changes_and_snapshots(client):
+    change_stock(client)
+    time.sleep(0.05)
+    before = time.time()
+    time.sleep(0.05)
+    change_stock(client)
+    take_snapshot()
+
+    assert quantity_of(FLOUR) == 500
+    assert quantity_as_of(FLOUR, before) == 750
+    assert quantity_as_of(EGGS, before) == 10
+    assert quantity_as_of(SUGAR, before) == 400
+
+def test_snapshot_only_when_enough_events_or_forced(client):
+    assert take_snapshot(force=False) is None
+    assert take_snapshot() is not None
+    # Nothing happened since
+    assert take_snapshot() is None
+
+def test_as_of_route(client):
+    change_stock(client)
+    response = client.get(f'/pantry/as_of?at={time.time() + 1}&ingredient_id={FLOUR}')
+    assert response.get_json()['quantity'] == 750
+    assert client.get('/pantry/as_of?at=yesterday').status_code == 400
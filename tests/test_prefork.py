@@ -0,0 +1,88 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import textwrap
+import time
+import urllib.request
+
+import pytest
+
+from app.prefork import worker_count
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Serves a WSGI app answering with its process id; each serving process leaves an
+# exit-<pid> file in the working directory once its on_worker_exit hook has run.
+SERVER = textwrap.dedent('''
+    import os, sys
+    from app.prefork import serve
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [str(os.getpid()).encode()]
+
+    def on_worker_exit():
+        open(f'exit-{os.getpid()}', 'w').close()
+
+    serve(app, host='127.0.0.1', port=int(sys.argv[1]), workers=int(sys.argv[2]), threads=2,
+          timeout=5, graceful_timeout=2, on_worker_exit=on_worker_exit)
+''')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(directory, workers):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVER, str(port), str(workers)], cwd=directory,
+        env=dict(os.environ, PYTHONPATH=ROOT)
+    )
+    deadline = time.monotonic() + 15
+    while True:
+        try:
+            return process, port, get_pid(port)
+        except OSError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                raise
+            time.sleep(0.1)
+
+def get_pid(port):
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as response:
+        return int(response.read())
+
+def exited(directory):
+    return sorted(int(name[len('exit-'):]) for name in os.listdir(directory) if name.startswith('exit-'))
+
+@pytest.mark.parametrize('value, count', [('1', 1), ('3', 3), ('0', 1), ('auto', os.cpu_count() or 1), (' Auto ', os.cpu_count() or 1)])
+def test_worker_count(value, count):
+    assert worker_count(value) == count
+
+def test_single_process_runs_exit_hook_on_sigterm(tmp_path):
+    process, port, pid = start_server(tmp_path, workers=1)
+    assert pid == process.pid
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=10) == 0
+    assert exited(tmp_path) == [process.pid]
+
+def test_prefork_replaces_a_dead_worker_and_stops_all_on_sigterm(tmp_path):
+    process, port, pid = start_server(tmp_path, workers=2)
+    try:
+        assert pid != process.pid
+        os.kill(pid, signal.SIGKILL)
+        # Long enough for the master to notice and for the replacement to start serving
+        time.sleep(2)
+        assert get_pid(port) != pid
+    finally:
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=15) == 0
+    workers = exited(tmp_path)
+    # The surviving worker and the replacement ran their exit hooks; the killed one couldn't
+    assert len(workers) == 2
+    assert pid not in workers and process.pid not in workers
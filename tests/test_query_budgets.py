@@ -0,0 +1,113 @@
+"""
+Runs every route that declares a @query_budget against a freshly seeded database, with
+the query guard raising, so a change that adds statements to a route or puts a query
+in a loop fails here instead of in production.
+
+    python -m pytest tests
+"""
+import pytest
+
+from app import app, database
+from app.query_guard import BUDGETS, QueryGuardError, assert_queries
+from conftest import quantity_of
+
+# (method, path, form data or JSON) for one representative request per budgeted route.
+# Ids refer to the seed data: ingredient 1 is flour, meal 1 is pancakes.
+REQUESTS = [
+    ('GET', '/', None),
+    ('GET', '/pantry', None),
+    ('GET', '/ingredients_list', None),
+    ('GET', '/ingredients_page?letter=f', None),
+    ('POST', '/add_ingredient', {'ingredient_name': 'flour', 'quantity': 1, 'unit': 'lb'}),
+    ('GET', '/search?q=f', None),
+    ('POST', '/update_quantity', {'id': 3, 'change': 1}),
+    ('POST', '/add_conversion', {
+        'ingredient_id': 3, 'from_unit': 'cup', 'to_unit': 'unit', 'factor': 4,
+        'quantity_to_add': 1, 'unit_to_add': 'cup'
+    }),
+    ('POST', '/add_new_ingredient_with_density', {
+        'ingredient_name': 'oats', 'original_quantity': 1, 'original_unit': 'cup', 'density_g_ml': 0.4
+    }),
+    ('POST', '/start_cooking_session', {'meal_id': 1, 'portion': 2}),
+    ('GET', '/ingredient/1', None),
+    ('GET', '/edit_ingredient_form/1', None),
+    ('POST', '/edit_ingredient/3', {'name': 'egg', 'quantity': 10}),
+    ('DELETE', '/delete_ingredient/9', None),
+    ('POST', '/search_for_converter', {'ingredient_name': 'f'}),
+    ('POST', '/calculate_conversion', {'from_quantity': 1, 'from_unit': 'cup', 'to_unit': 'g', 'ingredient_id': 1}),
+    ('POST', '/calculate_density', {'vol_qty': 1, 'vol_unit': 'cup', 'mass_qty': 120, 'mass_unit': 'g'}),
+    ('GET', '/recipe/1', None),
+    ('POST', '/add_ingredient_to_meal/1', {'q': 'sugar', 'quantity': 2, 'unit': 'tbsp'}),
+    ('POST', '/import_recipe/1', {'recipe_text': '2 cups flour\n1 tsp salt\n3 eggs'}),
+    ('DELETE', '/remove_ingredient_from_meal/1/1', None),
+    ('POST', '/search_ingredients_for_recipe/1', {'q': 'f'}),
+    ('POST', '/select_ingredient', {'ingredient_name': 'flour', 'meal_id': 1}),
+    ('GET', '/meal/1', None),
+    ('POST', '/search_ingredients_for_cooking', {'q': 'f'}),
+    ('POST', '/add_ingredient_to_cooking_session', {'ingredient_id': 1, 'quantity': 100}),
+    ('POST', '/update_pantry', {'ingredient_used': ['1_10', '2_5', '3_1']}),
+    ('POST', '/pantry/deductions', {'items': [{'ingredient_id': 1, 'quantity': 10}, {'ingredient_id': 2, 'quantity': 5}]}),
+    ('GET', '/recipes', None),
+    ('GET', '/meals_list', None),
+    ('GET', '/meals_page', None),
+    ('POST', '/add_meal', {'meal_name': 'toast'}),
+    ('DELETE', '/delete_meal/1', None),
+    ('GET', '/planner', None),
+    ('GET', '/planner_meals_page', None),
+    ('POST', '/plan', {'portion-1': 2}),
+    ('GET', '/cookable', None),
+    ('GET', '/pantry/as_of?at=2100-01-01', None),
+    ('GET', '/ingredient/1/history', None),
+    ('GET', '/metrics', None),
+]
+
+# What the requests that change stock leave behind, as {path: (ingredient id, quantity)},
+# so their budgets are checked on the path that does the write rather than an error path.
+EXPECTED_QUANTITIES = {
+    '/add_ingredient': (1, 1000 + 453.592),
+    '/update_quantity': (3, 13),
+    '/add_conversion': (3, 12 + 4),
+    '/edit_ingredient/3': (3, 10),
+    '/update_pantry': (1, 990),
+    '/pantry/deductions': (1, 990),
+}
+
+def endpoint_of(method, path):
+    return app.url_map.bind('localhost').match(path.split('?')[0], method)[0]
+
+@pytest.fixture(autouse=True)
+def raising_guard(monkeypatch):
+    monkeypatch.setitem(app.config, 'QUERY_GUARD', 'raise')
+
+def test_every_budgeted_route_is_exercised():
+    exercised = {endpoint_of(method, path) for method, path, _ in REQUESTS}
+    assert set(BUDGETS) - exercised == set()
+
+@pytest.mark.parametrize('method, path, data', REQUESTS, ids=[f"{method} {path}" for method, path, _ in REQUESTS])
+def test_route_stays_within_its_budget(client, method, path, data):
+    budget = BUDGETS[endpoint_of(method, path)]
+    kwargs = {'json': data} if path == '/pantry/deductions' else {'data': data}
+    # The app's own guard raises on an N+1 pattern; assert_queries checks the whole request
+    with assert_queries(max_statements=budget) as statements:
+        response = client.open(path, method=method, **kwargs)
+    assert response.status_code < 400, response.get_data(as_text=True)
+    assert len(statements) <= budget
+    if path in EXPECTED_QUANTITIES:
+        ingredient_id, quantity = EXPECTED_QUANTITIES[path]
+        assert quantity_of(ingredient_id) == pytest.approx(quantity)
+
+def test_guard_fails_on_n_plus_one(client):
+    with pytest.raises(QueryGuardError, match="N\\+1"):
+        with assert_queries():
+            conn = database.get_db_connection()
+            for ingredient_id in (1, 2, 3):
+                conn.execute("SELECT name FROM ingredients WHERE id = ?", (ingredient_id,)).fetchone()
+            conn.close()
+
+def test_guard_fails_over_budget(client):
+    with pytest.raises(QueryGuardError, match="budget is 1"):
+        with assert_queries(max_statements=1):
+            conn = database.get_db_connection()
+            conn.execute("SELECT COUNT(*) FROM ingredients").fetchone()
+            conn.execute("SELECT COUNT(*) FROM meals").fetchone()
+            conn.close()
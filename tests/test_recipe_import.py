@@ -0,0 +1,22 @@
+def test_library_import_reports_unreadable_jsonl_lines(client):
+    body = '\n'.join([
+        '{"meal": "toast", "ingredients": ["2 tbsp butter", {"quantity": 1, "unit": "tsp", "ingredient": "sugar"}]}',
+        '[1, 2]',
+        '{"meal": broken',
+        '{"meal": "crepes", "ingredients": "1 cup flour"}',
+    ])
+    response = client.post('/import/recipes?format=jsonl', data=body)
+    assert response.status_code == 200
+    summary = response.get_json()
+    assert summary['imported'] == 2
+    assert summary['meals'] == 1
+    assert summary['unparsed'] == ['[1, 2]', '{"meal": broken', '{"meal": "crepes", "ingredients": "1 cup flour"}']
+
+def test_meal_import_reports_unknown_units_and_404s_for_a_missing_meal(client):
+    response = client.post('/import_recipe/1', data={'recipe_text': '1 cup sugar\n2 pinches salt\nno quantity'})
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'pinches' in text
+    assert 'no quantity' in text
+
+    assert client.post('/import_recipe/999', data={'recipe_text': '1 cup sugar'}).status_code == 404
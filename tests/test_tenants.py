@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from app import app, database
+from app.tenants import tenant_database
+
+@pytest.fixture
+def households(tmp_path, monkeypatch):
+    directory = tmp_path / 'households'
+    monkeypatch.setattr(database, 'DATABASE', str(tmp_path / 'shared.db'))
+    monkeypatch.setitem(app.config, 'TENANT_DIRECTORY', str(directory))
+    monkeypatch.setitem(app.config, 'TENANT_DOMAIN', 'pantry.test')
+    monkeypatch.setattr(app, 'testing', True)
+    yield directory
+    database.close_db_connections()
+
+def flour(client, **kwargs):
+    html = client.get('/ingredient/1', **kwargs)
+    assert html.status_code == 200
+    return html.get_data(as_text=True)
+
+@pytest.mark.parametrize('key', ['home', 'cabin-2', 'a', 'x' * 63])
+def test_valid_household_names(tmp_path, key):
+    assert tenant_database(str(tmp_path), key) == os.path.join(str(tmp_path), f"{key}.db")
+
+@pytest.mark.parametrize('key', [None, '', '../home', 'home/..', 'a.b', '-home', 'home-', 'x' * 64, 'Home'])
+def test_invalid_household_names(tmp_path, key):
+    assert tenant_database(str(tmp_path), key) is None
+
+@pytest.mark.parametrize('headers', [{}, {'X-Pantry-Tenant': '../shared'}, {'X-Pantry-Tenant': 'a_b'}])
+def test_requests_without_a_valid_household_are_refused(households, headers):
+    client = app.test_client()
+    assert client.get('/pantry', headers=headers).status_code == 404
+    assert not households.exists() or os.listdir(households) == []
+    assert not os.path.exists(database.DATABASE)
+
+def test_households_are_isolated(households):
+    client = app.test_client()
+    home = {'X-Pantry-Tenant': 'home'}
+    client.post('/pantry/deductions', json={'items': [{'ingredient_id': 1, 'quantity': 400}]}, headers=home)
+
+    # The same household by header, path prefix and subdomain
+    assert '<strong>600.00</strong>' in flour(client, headers=home)
+    assert '<strong>600.00</strong>' in flour(client, headers={'X-Pantry-Tenant': 'HOME'})
+    assert '<strong>600.00</strong>' in client.get('/h/home/ingredient/1').get_data(as_text=True)
+    assert '<strong>600.00</strong>' in flour(client, base_url='http://home.pantry.test')
+
+    assert '<strong>1000.00</strong>' in flour(client, headers={'X-Pantry-Tenant': 'cabin'})
+    assert sorted(name for name in os.listdir(households) if name.endswith('.db')) == ['cabin.db', 'home.db']
+
+def test_metrics_and_static_files_need_no_household(households):
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 200
+    stylesheet = os.listdir(os.path.join(app.static_folder, 'css'))[0]
+    assert client.get(f'/static/css/{stylesheet}').status_code == 200
@@ -0,0 +1,56 @@
+import pytest
+
+from app.write_behind import enable_write_behind, disable_write_behind, pending_changes
+from conftest import quantity_of
+
+EGGS = 3
+
+@pytest.fixture
+def write_behind(client):
+    # Never flushes on its own during a test; only what the code under test flushes lands
+    enable_write_behind(flush_interval=3600)
+    yield
+    disable_write_behind()
+
+def click(client, ingredient_id, change):
+    assert client.post('/update_quantity', data={'id': ingredient_id, 'change': change}).status_code == 200
+
+def test_edit_form_shows_queued_changes(client, write_behind):
+    click(client, EGGS, 1)
+    click(client, EGGS, 2)
+    assert quantity_of(EGGS) == 12
+    assert 'value="15.00"' in client.get(f'/edit_ingredient_form/{EGGS}').get_data(as_text=True)
+
+def test_changes_are_queued_and_merged(client, write_behind):
+    click(client, EGGS, 1)
+    click(client, EGGS, -3)
+    assert quantity_of(EGGS) == 12
+    assert pending_changes() == {EGGS: -2}
+    # Views show the queued changes
+    assert 'value="10.00"' in client.get(f'/edit_ingredient_form/{EGGS}').get_data(as_text=True)
+
+def test_import_lands_on_top_of_flushed_changes(client, write_behind):
+    click(client, EGGS, 5)
+    response = client.post('/import/ingredients?format=jsonl', data='{"name": "eggs", "quantity": 20, "unit": "unit"}\n')
+    assert response.get_json()['imported'] == 1
+    assert pending_changes() == {}
+    disable_write_behind()
+    assert quantity_of(EGGS) == 20
+
+def test_edit_lands_on_top_of_flushed_changes(client, write_behind):
+    click(client, EGGS, 5)
+    client.post(f'/edit_ingredient/{EGGS}', data={'name': 'eggs', 'quantity': 7})
+    assert pending_changes() == {}
+    disable_write_behind()
+    assert quantity_of(EGGS) == 7
+
+def test_export_includes_queued_changes(client, write_behind):
+    click(client, EGGS, 2)
+    exported = client.get('/export/ingredients.csv').get_data(as_text=True)
+    assert any(line.startswith('eggs,14') for line in exported.splitlines())
+    assert quantity_of(EGGS) == 14
+
+def test_disabling_drains_the_queue(client, write_behind):
+    click(client, EGGS, 4)
+    disable_write_behind()
+    assert quantity_of(EGGS) == 16